@@ -0,0 +1,559 @@
+"""User-defined rate alerts, evaluated on every saved snapshot.
+
+An alert watches one value per currency and fires when that value crosses
+its threshold between two snapshots:
+
+* ``level``: the TWD rate itself, e.g. USD above 32.5
+* ``change``: percent change of the rate over a look-back window
+* ``volatility``: standard deviation of the rate over a window, the same
+  measure the statistics tab shows
+
+Alerts live in the ``rate_alerts`` table. The last value of each watched
+series is kept in ``rate_alert_state``, so crossings are detected across
+processes and across one-shot ``cli.py collect`` runs. Fired alerts are
+recorded in ``rate_alert_events``.
+
+Thresholds are indexed per (currency, kind, window, direction) as sorted
+lists. On each tick a value moving from ``prev`` to ``value`` fires exactly
+the thresholds between the two, found with two bisects, so the work per
+tick grows with the number of series and fired alerts, not with the number
+of alerts.
+
+Notifications go to sinks: callables taking one fired-alert dictionary.
+The tracker always routes them to its notify hook; TRACKER_ALERT_SINKS adds
+more, e.g. ``file:alerts.jsonl,webhook:https://example.com/hook``.
+
+:func:`backtest` replays stored history through candidate rules with the
+same crossing semantics, vectorised with NumPy, to show how often they
+would have fired.
+"""
+import json
+import logging
+import os
+import sqlite3
+import statistics
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("level", "change", "volatility")
+DIRECTIONS = ("above", "below")
+
+# Look-back used by change and volatility alerts created without a window
+DEFAULT_WINDOW_SECONDS = 86400
+
+VERSION_KEY = "alerts_version"
+
+ALERT_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS rate_alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        currency TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        direction TEXT NOT NULL,
+        threshold REAL NOT NULL,
+        window_seconds INTEGER NOT NULL DEFAULT 0,
+        note TEXT,
+        active INTEGER NOT NULL DEFAULT 1,
+        created_at DATETIME,
+        last_triggered_at DATETIME,
+        trigger_count INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS rate_alert_state (
+        series TEXT PRIMARY KEY,
+        value REAL,
+        updated_at DATETIME
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS rate_alert_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        alert_id INTEGER,
+        currency TEXT,
+        kind TEXT,
+        direction TEXT,
+        threshold REAL,
+        previous REAL,
+        value REAL,
+        triggered_at DATETIME
+    )
+    ''',
+)
+
+Sink = Callable[[Dict], None]
+SeriesKey = Tuple[str, str, int]
+
+
+def parse_window(text: str) -> int:
+    """Parse a window such as ``90m``, ``24h`` or ``7d`` (bare numbers are days) into seconds"""
+    text = text.strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(float(text) * 86400)
+
+
+def format_window(seconds: int) -> str:
+    """Inverse of parse_window for display"""
+    for unit, size in (("w", 604800), ("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds and seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+
+def describe(alert: Dict) -> str:
+    """One-line description of an alert, e.g. ``USD change(24h) above +1.5%``"""
+    if alert["kind"] == "level":
+        return f"{alert['currency']} {alert['direction']} {alert['threshold']:.4f}"
+    window = format_window(alert["window_seconds"])
+    if alert["kind"] == "change":
+        return f"{alert['currency']} change({window}) {alert['direction']} {alert['threshold']:+.2f}%"
+    return f"{alert['currency']} volatility({window}) {alert['direction']} {alert['threshold']:.4f}"
+
+
+def _series_name(key: SeriesKey) -> str:
+    currency, kind, window = key
+    return f"{currency}:{kind}:{window}"
+
+
+def ensure_tables(conn: sqlite3.Connection):
+    # maintenance imports tracker, which imports this module
+    import maintenance
+
+    for statement in ALERT_SCHEMA:
+        conn.execute(statement)
+    maintenance._ensure_meta_table(conn)
+
+
+def _bump_version(conn: sqlite3.Connection):
+    """Tell every engine that the alert set changed; must run inside the writing transaction"""
+    import maintenance
+
+    version = int(maintenance._get_meta(conn, VERSION_KEY) or 0)
+    maintenance._set_meta(conn, VERSION_KEY, str(version + 1))
+
+
+def _version(conn: sqlite3.Connection) -> Tuple[int, Optional[str]]:
+    """The alert set's version, plus the history generation
+
+    A restore or reset can bring back a database whose alert version matches
+    the cached one but whose alerts differ; the generation changes on both.
+    """
+    import maintenance
+
+    return int(maintenance._get_meta(conn, VERSION_KEY) or 0), maintenance.history_generation(conn)
+
+
+def add_alert(db_file: str, currency: str, kind: str, direction: str, threshold: float,
+              window_seconds: Optional[int] = None, note: Optional[str] = None) -> int:
+    """Store a new alert and return its id"""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown alert kind {kind!r}, expected one of {KINDS}")
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Unknown direction {direction!r}, expected one of {DIRECTIONS}")
+    if kind == "level":
+        window_seconds = 0
+    elif not window_seconds:
+        window_seconds = DEFAULT_WINDOW_SECONDS
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        ensure_tables(conn)
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO rate_alerts (currency, kind, direction, threshold, window_seconds, note, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (currency.upper(), kind, direction, float(threshold), int(window_seconds), note,
+                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            _bump_version(conn)
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def remove_alert(db_file: str, alert_id: int) -> bool:
+    """Deactivate an alert; its past events are kept"""
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        ensure_tables(conn)
+        with conn:
+            changed = conn.execute("UPDATE rate_alerts SET active = 0 WHERE id = ? AND active = 1",
+                                   (alert_id,)).rowcount
+            if changed:
+                _bump_version(conn)
+        return bool(changed)
+    finally:
+        conn.close()
+
+
+def list_alerts(db_file: str, include_inactive: bool = False) -> List[Dict]:
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        ensure_tables(conn)
+        where = "" if include_inactive else "WHERE active = 1"
+        return [dict(row) for row in conn.execute(f"SELECT * FROM rate_alerts {where} ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def recent_events(db_file: str, limit: int = 50) -> List[Dict]:
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        ensure_tables(conn)
+        return [dict(row) for row in conn.execute(
+            "SELECT * FROM rate_alert_events ORDER BY id DESC LIMIT ?", (limit,)
+        )]
+    finally:
+        conn.close()
+
+
+class ThresholdIndex:
+    """Active alerts grouped by series, with sorted thresholds per direction"""
+
+    def __init__(self, alerts: Sequence[Dict]):
+        groups: Dict[Tuple[SeriesKey, str], List[Tuple[float, int]]] = {}
+        self.alerts = {alert["id"]: alert for alert in alerts}
+        for alert in alerts:
+            key = (alert["currency"], alert["kind"], alert["window_seconds"])
+            groups.setdefault((key, alert["direction"]), []).append((alert["threshold"], alert["id"]))
+        self.thresholds: Dict[Tuple[SeriesKey, str], List[float]] = {}
+        self.ids: Dict[Tuple[SeriesKey, str], List[int]] = {}
+        for group, entries in groups.items():
+            entries.sort()
+            self.thresholds[group] = [threshold for threshold, _ in entries]
+            self.ids[group] = [alert_id for _, alert_id in entries]
+        self.series: Dict[str, List[SeriesKey]] = {}
+        for key, _ in groups:
+            if key not in self.series.setdefault(key[0], []):
+                self.series[key[0]].append(key)
+
+    def crossed(self, key: SeriesKey, previous: float, value: float) -> List[int]:
+        """Ids of alerts whose threshold lies between ``previous`` and ``value``"""
+        if value > previous:
+            thresholds = self.thresholds.get((key, "above"))
+            if thresholds:
+                # previous < threshold <= value
+                return self.ids[(key, "above")][bisect_right(thresholds, previous):bisect_right(thresholds, value)]
+        elif value < previous:
+            thresholds = self.thresholds.get((key, "below"))
+            if thresholds:
+                # value <= threshold < previous
+                return self.ids[(key, "below")][bisect_left(thresholds, value):bisect_left(thresholds, previous)]
+        return []
+
+
+# Indexes are rebuilt only when the alert set changes; keyed by database file
+_INDEX_CACHE: Dict[str, Tuple[Tuple[int, Optional[str]], ThresholdIndex]] = {}
+_INDEX_LOCK = threading.Lock()
+
+
+def _load_index(conn: sqlite3.Connection, db_file: str) -> ThresholdIndex:
+    version = _version(conn)
+    key = os.path.abspath(db_file)
+    with _INDEX_LOCK:
+        cached = _INDEX_CACHE.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = [dict(row) for row in conn.execute(
+            "SELECT id, currency, kind, direction, threshold, window_seconds, note FROM rate_alerts WHERE active = 1"
+        )]
+    finally:
+        conn.row_factory = None
+    index = ThresholdIndex(rows)
+    with _INDEX_LOCK:
+        _INDEX_CACHE[key] = (version, index)
+    return index
+
+
+def _metric(conn: sqlite3.Connection, key: SeriesKey, rate: float, now: datetime) -> Optional[float]:
+    """Current value of a series given the newest rate; None when there is not enough history"""
+    currency, kind, window = key
+    if kind == "level":
+        return rate
+    since = (now - timedelta(seconds=window)).strftime("%Y-%m-%d %H:%M:%S")
+    if kind == "change":
+        row = conn.execute(
+            "SELECT rate FROM twd_exchange_rates WHERE currency = ? AND timestamp <= ? "
+            "ORDER BY timestamp DESC LIMIT 1",
+            (currency, since)
+        ).fetchone()
+        if not row or not row[0]:
+            return None
+        return (rate - row[0]) / row[0] * 100
+    rates = [row[0] for row in conn.execute(
+        "SELECT rate FROM twd_exchange_rates WHERE currency = ? AND timestamp >= ?", (currency, since)
+    )]
+    # Sample standard deviation, like calculate_statistics
+    return statistics.stdev(rates) if len(rates) > 1 else None
+
+
+class AlertEngine:
+    """Evaluates the stored alerts against new snapshots and notifies the sinks"""
+
+    def __init__(self, db_file: str, sinks: Optional[Sequence[Sink]] = None):
+        self.db_file = db_file
+        self.sinks = list(sinks or [])
+
+    def evaluate(self, rates: Dict[str, float], timestamp: Optional[str] = None) -> List[Dict]:
+        """Check one snapshot of TWD rates; returns the alerts that fired"""
+        if not rates:
+            return []
+        now = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S") if timestamp else datetime.now()
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        started = time.perf_counter()
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        try:
+            ensure_tables(conn)
+            index = _load_index(conn, self.db_file)
+            watched = [(currency, key) for currency in rates if currency in index.series
+                       for key in index.series[currency]]
+            if not watched:
+                return []
+            fired = []
+            # Read and advance the series state in one write transaction, so two
+            # sessions saving snapshots at once never both report the same crossing
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                names = [_series_name(key) for _, key in watched]
+                previous = dict(conn.execute(
+                    f"SELECT series, value FROM rate_alert_state WHERE series IN ({','.join('?' * len(names))})",
+                    names
+                ).fetchall())
+                updates = []
+                for (currency, key), name in zip(watched, names):
+                    value = _metric(conn, key, rates[currency], now)
+                    if value is None:
+                        continue
+                    updates.append((name, value, timestamp))
+                    before = previous.get(name)
+                    if before is None:
+                        continue
+                    for alert_id in index.crossed(key, before, value):
+                        alert = index.alerts[alert_id]
+                        fired.append({**alert, "previous": before, "value": value, "rate": rates[currency],
+                                      "triggered_at": timestamp, "message": describe(alert)})
+                conn.executemany(
+                    "INSERT OR REPLACE INTO rate_alert_state (series, value, updated_at) VALUES (?, ?, ?)", updates
+                )
+                conn.executemany(
+                    "INSERT INTO rate_alert_events (alert_id, currency, kind, direction, threshold, previous, value, "
+                    "triggered_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(e["id"], e["currency"], e["kind"], e["direction"], e["threshold"], e["previous"], e["value"],
+                      timestamp) for e in fired]
+                )
+                conn.executemany(
+                    "UPDATE rate_alerts SET last_triggered_at = ?, trigger_count = trigger_count + 1 WHERE id = ?",
+                    [(timestamp, e["id"]) for e in fired]
+                )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        finally:
+            conn.close()
+            metrics.DB_OPERATION_SECONDS.observe(time.perf_counter() - started, operation='alerts')
+
+        for event in fired:
+            for sink in self.sinks:
+                try:
+                    sink(event)
+                except Exception as e:
+                    # A broken sink must not stop the others or the snapshot
+                    logger.warning("Alert sink %r failed: %s", sink, e)
+        return fired
+
+
+def notify_sink(notify: Callable[[str, str], None]) -> Sink:
+    """Route fired alerts to a tracker notify hook (st.warning in the dashboard, logging in the CLI)"""
+    def send(event: Dict):
+        notify("warning", f"🔔 {event['message']} ({event['previous']:.4f} → {event['value']:.4f})")
+    return send
+
+
+def log_sink(event: Dict):
+    logger.warning("Alert %s fired: %s (%.4f -> %.4f)", event["id"], event["message"],
+                   event["previous"], event["value"])
+
+
+class FileSink:
+    """Append fired alerts as JSON lines"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __call__(self, event: Dict):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def __repr__(self):
+        return f"FileSink({self.path!r})"
+
+
+class WebhookSink:
+    """POST fired alerts as JSON to a URL; a minimal hook for chat or paging integrations"""
+
+    def __init__(self, url: str, timeout: float = 5):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, event: Dict):
+        import requests
+
+        requests.post(self.url, json=event, timeout=self.timeout).raise_for_status()
+
+    def __repr__(self):
+        return f"WebhookSink({self.url!r})"
+
+
+def sinks_from_env() -> List[Sink]:
+    """Extra sinks from TRACKER_ALERT_SINKS, a comma separated list of log, file:PATH and webhook:URL"""
+    sinks = []
+    for spec in os.environ.get("TRACKER_ALERT_SINKS", "").split(","):
+        spec = spec.strip()
+        name, _, target = spec.partition(":")
+        if not spec:
+            continue
+        if name == "log":
+            sinks.append(log_sink)
+        elif name == "file" and target:
+            sinks.append(FileSink(target))
+        elif name == "webhook" and target:
+            sinks.append(WebhookSink(target))
+        else:
+            logger.warning("Ignoring unknown alert sink %r", spec)
+    return sinks
+
+
+def _series_values(kind: str, window: int, ts: "np.ndarray", rates: "np.ndarray") -> "np.ndarray":
+    """The value an engine would see at every row of a history; NaN where it has too little history"""
+    import numpy as np
+
+    if kind == "level":
+        return rates.astype(float)
+    span = np.int64(window) * 1_000_000_000
+    if kind == "change":
+        # Newest row at or before t - window, like the engine's ORDER BY timestamp DESC LIMIT 1
+        base = np.searchsorted(ts, ts - span, side="right") - 1
+        then = rates[np.maximum(base, 0)]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = (rates - then) / then * 100
+        change[(base < 0) | (then == 0)] = np.nan
+        return change
+    # Sample std over rows with timestamp >= t - window, via prefix sums of the
+    # centred rates (centring keeps the sums well conditioned)
+    centred = rates - rates.mean()
+    s1 = np.concatenate(([0.0], np.cumsum(centred)))
+    s2 = np.concatenate(([0.0], np.cumsum(centred * centred)))
+    end = np.arange(1, len(rates) + 1)
+    start = np.searchsorted(ts, ts - span, side="left")
+    count = end - start
+    total = s1[end] - s1[start]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (s2[end] - s2[start] - total * total / count) / (count - 1)
+    std = np.sqrt(np.maximum(variance, 0.0))
+    std[count < 2] = np.nan
+    return std
+
+
+def backtest_series(ts: "np.ndarray", rates: "np.ndarray", rules: Sequence[Dict],
+                    max_timestamps: Optional[int] = None) -> List[Dict]:
+    """Replay one currency's history through many alert rules at once
+
+    ``ts`` holds int64 nanosecond timestamps in ascending order. Each rule
+    needs ``kind``, ``direction`` and ``threshold`` (and ``window_seconds``
+    for change/volatility). Returns one dictionary per rule, in order, with
+    ``hits``, ``first`` and ``last`` (datetime64 or None) and the hit
+    ``timestamps`` (at most ``max_timestamps`` of them when given).
+
+    Rules sharing a series are evaluated together: every step from ``prev``
+    to ``value`` fires the contiguous block of sorted thresholds between
+    them, the same bisects the live engine does, here for all steps at once.
+    """
+    import numpy as np
+
+    ts = np.asarray(ts, dtype=np.int64)
+    rates = np.asarray(rates, dtype=float)
+    results: List[Optional[Dict]] = [None] * len(rules)
+    groups: Dict[Tuple[str, int, str], List[int]] = {}
+    for position, rule in enumerate(rules):
+        window = 0 if rule["kind"] == "level" else int(rule.get("window_seconds") or DEFAULT_WINDOW_SECONDS)
+        groups.setdefault((rule["kind"], window, rule["direction"]), []).append(position)
+
+    series_cache: Dict[Tuple[str, int], Tuple["np.ndarray", "np.ndarray"]] = {}
+    for (kind, window, direction), positions in groups.items():
+        if (kind, window) not in series_cache:
+            values = _series_values(kind, window, ts, rates)
+            # The engine keeps the last known value when a tick has none
+            known = ~np.isnan(values)
+            series_cache[(kind, window)] = (values[known], ts[known])
+        values, value_ts = series_cache[(kind, window)]
+
+        thresholds = np.array([float(rules[p]["threshold"]) for p in positions])
+        order = np.argsort(thresholds, kind="stable")
+        sorted_thresholds = thresholds[order]
+        previous, current = values[:-1], values[1:]
+        if direction == "above":
+            # previous < threshold <= current
+            lo = np.searchsorted(sorted_thresholds, previous, side="right")
+            hi = np.searchsorted(sorted_thresholds, current, side="right")
+        else:
+            # current <= threshold < previous
+            lo = np.searchsorted(sorted_thresholds, current, side="left")
+            hi = np.searchsorted(sorted_thresholds, previous, side="left")
+        steps = np.nonzero(hi > lo)[0]
+        lo, hi = lo[steps], hi[steps]
+
+        # Expand each step's block into (threshold, step) pairs, then group by threshold
+        sizes = hi - lo
+        offsets = np.repeat(np.cumsum(sizes) - sizes, sizes)
+        ranks = np.repeat(lo, sizes) + np.arange(int(sizes.sum())) - offsets
+        fired_steps = np.repeat(steps, sizes)
+        by_rank = np.argsort(ranks, kind="stable")
+        ranks, fired_steps = ranks[by_rank], fired_steps[by_rank]
+        counts = np.bincount(ranks, minlength=len(positions))
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        hit_ts = value_ts[fired_steps + 1].view("datetime64[ns]")
+
+        for rank, position in enumerate(np.asarray(positions)[order]):
+            hits = hit_ts[bounds[rank]:bounds[rank + 1]]
+            results[position] = {
+                **rules[position],
+                "hits": int(counts[rank]),
+                "first": hits[0] if len(hits) else None,
+                "last": hits[-1] if len(hits) else None,
+                "timestamps": hits if max_timestamps is None else hits[:max_timestamps],
+            }
+    return results
+
+
+def backtest(tracker, currency: str, rules: Sequence[Dict], days: int = 3650,
+             max_timestamps: Optional[int] = None) -> List[Dict]:
+    """How often each rule would have fired over the last ``days`` days of history
+
+    Uses ``tracker.get_historical_data``, so currencies without stored
+    history are replayed over the same synthetic series the charts show.
+    """
+    df = tracker.get_historical_data(currency, days)
+    if df.empty:
+        return [{**rule, "hits": 0, "first": None, "last": None, "timestamps": []} for rule in rules]
+    ts = df.index.values.astype("datetime64[ns]").view("int64")
+    started = time.perf_counter()
+    try:
+        return backtest_series(ts, df["rate"].to_numpy(dtype=float), rules, max_timestamps)
+    finally:
+        metrics.DB_OPERATION_SECONDS.observe(time.perf_counter() - started, operation='alert_backtest')
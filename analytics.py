@@ -0,0 +1,415 @@
+"""Analytical backends for aggregate queries over twd_exchange_rates.
+
+The statistics, ranking and comparison views need per-currency aggregates
+over long periods. A backend computes them for many currencies at once:
+
+* ``sqlite`` (default) reads all the currencies' rows in one query and
+  aggregates them in one pandas group-by. It is the reference
+  implementation and needs nothing extra.
+* ``duckdb`` runs one vectorised GROUP BY in an embedded DuckDB (optional
+  ``pip install duckdb``). It reads either a Parquet mirror of the table,
+  kept up to date incrementally, or the SQLite file itself through DuckDB's
+  sqlite extension.
+
+Select a backend with TRACKER_ANALYTICS_BACKEND. TRACKER_DUCKDB_SOURCE picks
+``parquet`` (default) or ``sqlite``, and TRACKER_DUCKDB_MIRROR sets the mirror
+directory. Both backends return exactly the dictionaries that
+``TWDCurrencyTracker.calculate_statistics`` produces; benchmarks/parity_analytics.py
+checks that they agree.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import metrics
+from column_store import exclusive_lock, shared_lock
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from tracker import TWDCurrencyTracker
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("sqlite", "duckdb")
+
+# Small Parquet parts appended by incremental syncs are merged past this count
+MAX_MIRROR_PARTS = 32
+
+MIRROR_STATE = "state.json"
+
+AGGREGATE_SQL = '''
+    SELECT currency,
+           arg_max(rate, timestamp), arg_min(rate, timestamp),
+           min(rate), max(rate), avg(rate), stddev_samp(rate),
+           arg_max(volume, timestamp), arg_min(volume, timestamp),
+           sum(volume), avg(volume), max(volume), min(volume),
+           count(*), count(volume)
+    FROM {source}
+    WHERE currency IN ({placeholders}) AND timestamp >= ? AND timestamp < ?
+    GROUP BY currency
+'''
+
+
+def _trend(current: float, previous: float) -> str:
+    return 'up' if current > previous else 'down' if current < previous else 'stable'
+
+
+def statistics_from_aggregates(current: float, previous: float, minimum: float, maximum: float,
+                               mean: float, std: Optional[float], current_volume: float,
+                               previous_volume: float, total_volume: float, avg_volume: float,
+                               max_volume: float, min_volume: float) -> Dict:
+    """Build the calculate_statistics dictionary from per-currency aggregates"""
+    return {
+        'current': current,
+        'change': current - previous,
+        'change_percent': ((current - previous) / previous * 100) if previous != 0 else 0,
+        'min': minimum,
+        'max': maximum,
+        'mean': mean,
+        'volatility': float('nan') if std is None else std,
+        'trend': _trend(current, previous),
+        'current_volume': current_volume,
+        'total_volume': total_volume,
+        'avg_volume': avg_volume,
+        'max_volume': max_volume,
+        'min_volume': min_volume,
+        'volume_change': current_volume - previous_volume,
+        'volume_change_percent': ((current_volume - previous_volume) / previous_volume * 100) if previous_volume != 0 else 0,
+        'volume_trend': _trend(current_volume, previous_volume),
+    }
+
+
+class AnalyticsBackend:
+    """Per-currency statistics over stored history in [start, end)
+
+    Only currencies whose rows in the window all have a volume are returned;
+    the tracker handles the rest the old way, filling in the missing volumes.
+    """
+    name = "base"
+
+    def statistics(self, currencies: Sequence[str], start: datetime, end: datetime) -> Dict[str, Dict]:
+        raise NotImplementedError
+
+
+class SQLiteBackend(AnalyticsBackend):
+    """Reference backend: the currencies' rows in one ordered query, aggregated with a pandas group-by
+    
+    Reads go through the column store when it is enabled, like get_historical_data.
+    """
+    name = "sqlite"
+
+    def __init__(self, tracker: "TWDCurrencyTracker"):
+        self.tracker = tracker
+
+    def _query(self, currencies: Sequence[str], start: datetime, end: datetime) -> Optional["pd.DataFrame"]:
+        """(currency, rate, volume) rows in timestamp order per currency, like _query_history; None without volumes"""
+        import pandas as pd
+
+        conn = sqlite3.connect(self.tracker.db_file)
+        try:
+            columns = [column[1] for column in conn.execute("PRAGMA table_info(twd_exchange_rates)")]
+            if 'volume' not in columns:
+                return None
+            with metrics.DB_OPERATION_SECONDS.time(operation='query'):
+                # Timestamps only order the rows, so they are never parsed
+                return pd.read_sql_query(
+                    f"""
+                        SELECT currency, rate, volume
+                        FROM twd_exchange_rates
+                        WHERE currency IN ({','.join('?' * len(currencies))})
+                        AND timestamp >= ?
+                        AND timestamp <= ?
+                        ORDER BY currency, timestamp
+                    """,
+                    conn,
+                    params=(*currencies, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+                )
+        except Exception:
+            return None
+        finally:
+            conn.close()
+
+    def statistics(self, currencies: Sequence[str], start: datetime, end: datetime) -> Dict[str, Dict]:
+        import pandas as pd
+
+        if not currencies:
+            return {}
+        with metrics.DB_OPERATION_SECONDS.time(operation='analytics_sqlite'):
+            frames = []
+            missing = list(currencies)
+            if self.tracker.column_store is not None:
+                missing = []
+                for currency in currencies:
+                    df = self.tracker.column_store.frame(currency, start, end)
+                    if df is None:
+                        missing.append(currency)
+                    elif not df.empty:
+                        frames.append(pd.DataFrame({'currency': currency, 'rate': df['rate'].to_numpy(),
+                                                    'volume': df['volume'].to_numpy()}))
+            if missing:
+                df = self._query(missing, start, end)
+                if df is not None:
+                    frames.append(df)
+            if not frames:
+                return {}
+            # One pass over every currency's rows instead of a frame per currency
+            aggregates = pd.concat(frames, ignore_index=True).groupby('currency', sort=False).agg(
+                current=('rate', 'last'), previous=('rate', 'first'), minimum=('rate', 'min'),
+                maximum=('rate', 'max'), mean=('rate', 'mean'), std=('rate', 'std'),
+                current_volume=('volume', 'last'), previous_volume=('volume', 'first'),
+                total_volume=('volume', 'sum'), avg_volume=('volume', 'mean'),
+                max_volume=('volume', 'max'), min_volume=('volume', 'min'),
+                count=('rate', 'size'), volume_count=('volume', 'count'),
+            )
+        results = {}
+        for currency, (*values, count, volume_count) in zip(aggregates.index, aggregates.itertuples(index=False)):
+            # Currencies with missing volumes are left to the tracker, which fills them in
+            if volume_count == count:
+                results[currency] = statistics_from_aggregates(*values)
+        return results
+
+
+class DuckDBBackend(AnalyticsBackend):
+    """Vectorised aggregates in an embedded DuckDB over a Parquet mirror or the SQLite file"""
+    name = "duckdb"
+
+    def __init__(self, db_file: str, source: str = "parquet", mirror_dir: Optional[str] = None):
+        import duckdb
+
+        if source not in ("parquet", "sqlite"):
+            raise ValueError(f"Unknown DuckDB source {source!r}")
+        self.db_file = db_file
+        self.source = source
+        self.mirror_dir = mirror_dir or f"{db_file}.mirror"
+        self._conn = duckdb.connect()
+        # DuckDB connections are not safe to share between Streamlit's script threads
+        self._lock = threading.Lock()
+        if source == "sqlite":
+            path = db_file.replace("'", "''")
+            self._conn.execute(f"ATTACH '{path}' AS tracker_db (TYPE sqlite, READ_ONLY)")
+
+    def _query(self, currencies: Sequence[str], start: datetime, end: datetime) -> List[Tuple]:
+        if self.source == "sqlite":
+            source = "tracker_db.twd_exchange_rates"
+        else:
+            pattern = os.path.join(self.mirror_dir, "*.parquet").replace("'", "''")
+            source = f"read_parquet('{pattern}')"
+        sql = AGGREGATE_SQL.format(source=source, placeholders=",".join("?" * len(currencies)))
+        # Typed bounds keep the comparison on the timestamp column, so row groups are pruned
+        params = [*currencies, start, end]
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def statistics(self, currencies: Sequence[str], start: datetime, end: datetime) -> Dict[str, Dict]:
+        if not currencies:
+            return {}
+        with metrics.DB_OPERATION_SECONDS.time(operation='analytics_duckdb'):
+            if self.source == "sqlite":
+                rows = self._query(currencies, start, end)
+            else:
+                rows = []
+                lock = os.path.join(self.mirror_dir, ".lock")
+                mirrored = _mirrored_rows(self.db_file, self.mirror_dir)
+                if mirrored is None:
+                    mirrored = sync_mirror(self.db_file, self.mirror_dir)
+                if mirrored:
+                    # Held through the scan so no sync merges or deletes parts under it;
+                    # concurrent queries share it
+                    with shared_lock(lock):
+                        rows = self._query(currencies, start, end)
+        results = {}
+        for currency, *aggregates, count, volume_count in rows:
+            if count and volume_count == count:
+                results[currency] = statistics_from_aggregates(*aggregates)
+        return results
+
+
+def _mirror_state(mirror_dir: str) -> Dict:
+    try:
+        with open(os.path.join(mirror_dir, MIRROR_STATE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_mirror_state(mirror_dir: str, state: Dict):
+    path = os.path.join(mirror_dir, MIRROR_STATE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _mirror_parts(mirror_dir: str) -> List[str]:
+    return sorted(os.path.join(mirror_dir, name) for name in os.listdir(mirror_dir) if name.endswith(".parquet"))
+
+
+def _chunks(cursor: sqlite3.Cursor, size: int = 50000) -> Iterator[List[Tuple]]:
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def _write_part(mirror_dir: str, name: str, cursor: sqlite3.Cursor) -> int:
+    """Stream a cursor of (timestamp, currency, rate, volume) rows into one Parquet part"""
+    import exporter
+
+    path = os.path.join(mirror_dir, name)
+    rows = exporter.write_parquet(_chunks(cursor), f"{path}.partial")
+    os.replace(f"{path}.partial", path)
+    return rows
+
+
+def sync_mirror(db_file: str, mirror_dir: str) -> int:
+    """Bring the Parquet mirror up to date; returns the number of mirrored rows
+
+    New rows (id above the last mirrored id) are appended as a small part
+    file. If the row count no longer adds up, rows were deleted or replaced
+    (compaction, reset, restore), and the mirror is rebuilt from scratch.
+    """
+    os.makedirs(mirror_dir, exist_ok=True)
+    with exclusive_lock(os.path.join(mirror_dir, ".lock")):
+        return _sync_mirror(db_file, mirror_dir)
+
+
+def _file_stamp(db_file: str) -> List:
+    """Size and mtime of the database and its WAL; every commit changes one of them"""
+    stamp = []
+    for path in (db_file, f"{db_file}-wal"):
+        try:
+            info = os.stat(path)
+            stamp += [info.st_size, info.st_mtime_ns]
+        except FileNotFoundError:
+            stamp += [0, 0]
+    return stamp
+
+
+def _mirrored_rows(db_file: str, mirror_dir: str) -> Optional[int]:
+    """Rows in the mirror if nothing was committed since its last sync, else None"""
+    state = _mirror_state(mirror_dir)
+    if state.get("db") == os.path.abspath(db_file) and state.get("stamp") == _file_stamp(db_file):
+        return state["rows"]
+    return None
+
+
+def _sync_mirror(db_file: str, mirror_dir: str) -> int:
+    state = _mirror_state(mirror_dir)
+    same_db = state.get("db") == os.path.abspath(db_file)
+    stamp = _file_stamp(db_file)
+    if same_db and state.get("stamp") == stamp:
+        # Nothing committed since the last sync; skips COUNT(*) over the whole table
+        return state["rows"]
+
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        # One read snapshot for the watermark, the count and the rows
+        conn.execute("BEGIN")
+        max_id, count = conn.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM twd_exchange_rates").fetchone()
+        if same_db and state.get("last_id") == max_id and state.get("rows") == count:
+            _write_mirror_state(mirror_dir, {**state, "stamp": stamp})
+            return count
+
+        select = "SELECT timestamp, currency, rate, volume FROM twd_exchange_rates"
+        last_id, mirrored = state.get("last_id", 0), state.get("rows", 0)
+        if same_db and last_id <= max_id:
+            new_rows = conn.execute("SELECT COUNT(*) FROM twd_exchange_rates WHERE id > ?", (last_id,)).fetchone()[0]
+            if mirrored + new_rows == count:
+                if new_rows:
+                    _write_part(mirror_dir, f"part-{max_id:012d}.parquet",
+                                conn.execute(f"{select} WHERE id > ?", (last_id,)))
+                parts = _mirror_parts(mirror_dir)
+                if len(parts) > MAX_MIRROR_PARTS:
+                    # Only the small incremental parts are merged; a mirror first synced
+                    # against an empty table has no base file at all
+                    small = [part for part in parts if os.path.basename(part).startswith("part-")]
+                    _merge_parts(small, os.path.join(mirror_dir, f"part-{max_id:012d}-merged.parquet"))
+                _write_mirror_state(mirror_dir, {"db": os.path.abspath(db_file), "last_id": max_id, "rows": count,
+                                                 "stamp": stamp})
+                return count
+
+        # Rows were deleted or rewritten: write a new base, then drop the old parts
+        old_parts = _mirror_parts(mirror_dir)
+        base = f"base-{max_id:012d}-{time.time_ns()}.parquet"
+        if count:
+            _write_part(mirror_dir, base, conn.execute(f"{select} ORDER BY timestamp"))
+        for part in old_parts:
+            os.remove(part)
+        _write_mirror_state(mirror_dir, {"db": os.path.abspath(db_file), "last_id": max_id, "rows": count,
+                                         "stamp": stamp})
+        return count
+    finally:
+        conn.close()
+
+
+def mirror_dir_from_env(db_file: str) -> str:
+    """TRACKER_DUCKDB_MIRROR, else the ``<db>.mirror`` directory next to the database"""
+    return os.environ.get("TRACKER_DUCKDB_MIRROR") or f"{db_file}.mirror"
+
+
+def invalidate_mirror(db_file: str):
+    """Force a full mirror rebuild after rows were rewritten in place (upserts, restores)"""
+    mirror_dir = mirror_dir_from_env(db_file)
+    if not os.path.isdir(mirror_dir):
+        return
+    with exclusive_lock(os.path.join(mirror_dir, ".lock")):
+        try:
+            os.remove(os.path.join(mirror_dir, MIRROR_STATE))
+        except FileNotFoundError:
+            pass
+
+
+def _merge_parts(parts: List[str], dest: str):
+    """Combine small incremental parts into one file with DuckDB"""
+    import duckdb
+
+    files = ", ".join("'" + part.replace("'", "''") + "'" for part in parts)
+    partial = f"{dest}.partial"
+    duckdb.connect().execute(
+        f"COPY (SELECT * FROM read_parquet([{files}])) TO '{partial}' (FORMAT parquet, COMPRESSION zstd)"
+    )
+    os.replace(partial, dest)
+    for part in parts:
+        os.remove(part)
+
+
+_DUCKDB_BACKENDS: Dict[Tuple, Optional[DuckDBBackend]] = {}
+_DUCKDB_BACKENDS_LOCK = threading.Lock()
+
+
+def shared_duckdb(db_file: str, source: str = "parquet", mirror_dir: Optional[str] = None) -> Optional[DuckDBBackend]:
+    """The shared DuckDB backend of a database, or None if DuckDB is unavailable
+
+    Streamlit builds a tracker on every rerun; sharing the backend keeps one
+    DuckDB connection per database instead of one per interaction. A failed
+    setup is remembered too, so it is not retried on every rerun.
+    """
+    key = (os.path.abspath(db_file), source, mirror_dir)
+    with _DUCKDB_BACKENDS_LOCK:
+        if key not in _DUCKDB_BACKENDS:
+            try:
+                _DUCKDB_BACKENDS[key] = DuckDBBackend(db_file, source=source, mirror_dir=mirror_dir)
+            except Exception as e:
+                # duckdb not installed, or the sqlite extension cannot be loaded offline
+                logger.warning("DuckDB analytics backend unavailable, using SQLite: %s", e)
+                _DUCKDB_BACKENDS[key] = None
+        return _DUCKDB_BACKENDS[key]
+
+
+def backend_from_env(tracker: "TWDCurrencyTracker") -> AnalyticsBackend:
+    """The backend selected by TRACKER_ANALYTICS_BACKEND, falling back to SQLite"""
+    name = os.environ.get("TRACKER_ANALYTICS_BACKEND", "sqlite").lower()
+    if name == "duckdb":
+        backend = shared_duckdb(tracker.db_file, source=os.environ.get("TRACKER_DUCKDB_SOURCE", "parquet"),
+                                mirror_dir=os.environ.get("TRACKER_DUCKDB_MIRROR"))
+        if backend is not None:
+            return backend
+    elif name != "sqlite":
+        logger.warning("Unknown analytics backend %r, using SQLite", name)
+    return SQLiteBackend(tracker)
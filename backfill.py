@@ -0,0 +1,254 @@
+"""Backfill daily history from the upstream ``/timeseries`` endpoints.
+
+The requested range is split into chunks of whole days. Chunks are fetched
+concurrently on an asyncio event loop, with a cap on in-flight requests, a
+token-bucket rate limit and retries with exponential backoff. Each chunk is
+written through the bulk import path as soon as it arrives. The chunk's
+checkpoint is committed in the same transaction, so an interrupted backfill
+resumes where it stopped.
+
+requests stays the only HTTP client: blocking calls run in worker threads
+via ``asyncio.to_thread``, so no async HTTP library is needed.
+"""
+import asyncio
+import logging
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import column_store
+import importer
+import maintenance
+import metrics
+from tracker import TWDCurrencyTracker
+
+logger = logging.getLogger(__name__)
+
+# exchangerate.host accepts at most 365 days per timeseries request
+DEFAULT_CHUNK_DAYS = 90
+
+CHECKPOINT_PREFIX = "backfilled:"
+
+# Responses worth retrying; anything else moves on to the next source
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class _Retryable(Exception):
+    def __init__(self, reason: str, retry_after: Optional[float] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` requests per second in bursts of up to ``burst``"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def timeseries_url(api_url: str, start: date, end: date) -> str:
+    """Turn a ``.../latest?base=USD`` source URL into its timeseries request"""
+    parsed = urlparse(api_url)
+    path = parsed.path.rstrip("/")
+    path = (path[:-len("latest")] if path.endswith("latest") else path + "/") + "timeseries"
+    query = dict(parse_qsl(parsed.query))
+    query.update(start_date=start.isoformat(), end_date=end.isoformat())
+    return urlunparse(parsed._replace(path=path, query=urlencode(query)))
+
+
+def split_range(start: date, end: date, chunk_days: int) -> List[Tuple[date, date]]:
+    """Split [start, end] into chunks aligned to multiples of ``chunk_days``
+
+    The alignment is independent of ``start``, so a later run over a wider
+    range reuses the checkpoints of the chunks it shares with earlier runs.
+    """
+    chunks = []
+    day = start
+    while day <= end:
+        boundary = date.fromordinal((day.toordinal() // chunk_days + 1) * chunk_days)
+        chunk_end = min(end, boundary - timedelta(days=1))
+        chunks.append((day, chunk_end))
+        day = chunk_end + timedelta(days=1)
+    return chunks
+
+
+def _days(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def fetch_timeseries(api_url: str, start: date, end: date, timeout: float = 30) -> Dict[str, Dict]:
+    """Fetch one chunk from one source; returns {YYYY-MM-DD: units-per-USD rates}"""
+    import requests
+
+    source = urlparse(api_url).hostname
+    started = time.perf_counter()
+    try:
+        try:
+            response = requests.get(timeseries_url(api_url, start, end), timeout=timeout)
+        finally:
+            metrics.UPSTREAM_FETCH_SECONDS.observe(time.perf_counter() - started, source=source)
+    except requests.exceptions.RequestException:
+        metrics.UPSTREAM_FETCH_FAILURES.inc(source=source, reason='network')
+        raise _Retryable('network')
+
+    if response.status_code != 200:
+        metrics.UPSTREAM_FETCH_FAILURES.inc(source=source, reason=f'http_{response.status_code}')
+        if response.status_code in RETRY_STATUSES:
+            try:
+                retry_after = float(response.headers.get("Retry-After", ""))
+            except ValueError:
+                # Missing, or an HTTP date we do not bother to parse
+                retry_after = None
+            raise _Retryable(f'http_{response.status_code}', retry_after)
+        raise ValueError(f"{source} answered HTTP {response.status_code}")
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = None
+    # A JSON list or string is as invalid as a body that is not JSON at all
+    rates = payload.get('rates') if isinstance(payload, dict) else None
+    if not isinstance(rates, dict):
+        metrics.UPSTREAM_FETCH_FAILURES.inc(source=source, reason='invalid_response')
+        raise ValueError(f"{source} returned no timeseries rates")
+    return rates
+
+
+class Backfill:
+    """One backfill run over a date range; see :func:`run_backfill`"""
+
+    def __init__(self, tracker: TWDCurrencyTracker, concurrency: int = 4, rate: float = 2.0,
+                 retries: int = 4, backoff: float = 0.5, replace: bool = False):
+        self.tracker = tracker
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.replace = replace
+        self.stats = {"chunks": 0, "checkpointed": 0, "fetched": 0, "failed": 0, "incomplete": 0,
+                      "requests": 0, "retries": 0, "inserted": 0, "duplicates": 0, "seconds": 0.0}
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _done(self, chunk_start: date) -> Optional[str]:
+        return maintenance._get_meta(self._conn, CHECKPOINT_PREFIX + chunk_start.isoformat())
+
+    def _write(self, chunk: Tuple[date, date], series: Dict[str, Dict]):
+        """Convert one fetched chunk to TWD-based daily rows and store it with its checkpoint
+
+        The checkpoint is only recorded when every day of the chunk came back
+        with rates, so a later run refetches chunks with missing or malformed
+        days; rows already written are then skipped as duplicates.
+        """
+        first, last = chunk[0].isoformat(), chunk[1].isoformat()
+        rows = []
+        present = set()
+        for day, usd_rates in series.items():
+            if first <= day <= last and isinstance(usd_rates, dict) and usd_rates.get('TWD'):
+                present.add(day)
+                # Quotes cover every currency upstream knows; only tracked ones are stored
+                twd_rates = self.tracker.tracked_twd_rates(self.tracker.usd_to_twd_rates(usd_rates))
+                for currency, rate in twd_rates.items():
+                    rows.append((currency, rate, None, f"{day} 00:00:00"))
+        missing = [day.isoformat() for day in _days(*chunk) if day.isoformat() not in present]
+        with self._conn:
+            written = importer.write_rows(self._conn, rows, self.replace)
+            if not missing:
+                maintenance._set_meta(self._conn, CHECKPOINT_PREFIX + first, last)
+        if missing:
+            self.stats["incomplete"] += 1
+            logger.warning("Backfill of %s..%s is missing %d day(s) (%s%s); it is retried on the next run",
+                           first, last, len(missing), ", ".join(missing[:5]), ", ..." if len(missing) > 5 else "")
+        self.stats["inserted"] += written
+        self.stats["duplicates"] += len(rows) - written
+
+    async def _fetch(self, chunk: Tuple[date, date], limiter: RateLimiter) -> Optional[Dict]:
+        """Try each source in turn, retrying transient failures with jittered backoff"""
+        for api_url in self.tracker.api_urls:
+            for attempt in range(self.retries + 1):
+                await limiter.acquire()
+                self.stats["requests"] += 1
+                try:
+                    return await asyncio.to_thread(fetch_timeseries, api_url, *chunk)
+                except _Retryable as e:
+                    if attempt == self.retries:
+                        break
+                    self.stats["retries"] += 1
+                    delay = e.retry_after or self.backoff * 2 ** attempt
+                    await asyncio.sleep(delay * random.uniform(1.0, 1.5))
+                except ValueError as e:
+                    logger.debug("Giving up on %s for %s..%s: %s", api_url, chunk[0], chunk[1], e)
+                    break
+        return None
+
+    async def _run_chunk(self, chunk: Tuple[date, date], limiter: RateLimiter, slots: asyncio.Semaphore):
+        async with slots:
+            series = await self._fetch(chunk, limiter)
+        if series is None:
+            self.stats["failed"] += 1
+            logger.warning("Backfill of %s..%s failed on every source", chunk[0], chunk[1])
+            return
+        # Writes run on the event loop thread, which keeps them serialised on one connection
+        self._write(chunk, series)
+        self.stats["fetched"] += 1
+        logger.info("Backfilled %s..%s (%d/%d chunks)", chunk[0], chunk[1],
+                    self.stats["fetched"] + self.stats["checkpointed"], self.stats["chunks"])
+
+    async def run(self, start: date, end: date, chunk_days: int = DEFAULT_CHUNK_DAYS) -> Dict:
+        started = time.perf_counter()
+        self._conn = importer.connect(self.tracker.db_file)
+        maintenance._ensure_meta_table(self._conn)
+        try:
+            pending = []
+            for chunk in split_range(start, end, chunk_days):
+                self.stats["chunks"] += 1
+                done_through = self._done(chunk[0])
+                if done_through and done_through >= chunk[1].isoformat():
+                    self.stats["checkpointed"] += 1
+                else:
+                    pending.append(chunk)
+            limiter = RateLimiter(self.rate, burst=self.concurrency)
+            slots = asyncio.Semaphore(self.concurrency)
+            await asyncio.gather(*(self._run_chunk(chunk, limiter, slots) for chunk in pending))
+        finally:
+            self._conn.close()
+            self._conn = None
+        # Upserts rewrite rows in place, which only a rebuild picks up
+        column_store.sync_if_enabled(self.tracker.db_file, rebuild=self.replace and self.stats["inserted"] > 0)
+        if self.replace and self.stats["inserted"]:
+            maintenance.mark_history_rewritten(self.tracker.db_file)
+        self.stats["seconds"] = time.perf_counter() - started
+        return self.stats
+
+
+def run_backfill(tracker: TWDCurrencyTracker, start: date, end: date, chunk_days: int = DEFAULT_CHUNK_DAYS,
+                 concurrency: int = 4, rate: float = 2.0, retries: int = 4, backoff: float = 0.5,
+                 replace: bool = False) -> Dict:
+    """Backfill daily rates for [start, end] into the tracker's database
+
+    ``concurrency`` caps requests in flight and ``rate`` caps requests per
+    second (0 disables the limit). Chunks already recorded in the checkpoint
+    table are skipped; chunks with missing days are counted as ``incomplete``
+    and not checkpointed.
+    """
+    job = Backfill(tracker, concurrency=concurrency, rate=rate, retries=retries, backoff=backoff, replace=replace)
+    return asyncio.run(job.run(start, end, chunk_days))
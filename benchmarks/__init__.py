@@ -0,0 +1,4 @@
+"""Performance benchmarks and load tests for the TWD exchange rate tracker.
+
+Run from the repository root, e.g. ``python -m benchmarks.bench_hot_paths``.
+"""
@@ -0,0 +1,422 @@
+"""Reproducible benchmarks for the tracker's hot paths.
+
+Covers synthetic history generation, SQLite history reads at several database
+sizes, volume rankings, snapshot writes, bulk CSV import, statistics, alert backtests, technical
+indicators (full, cached and after one new tick), correlation matrices, Monte
+Carlo forecasts, every chart builder and a full ``main()`` render through Streamlit's AppTest. Randomness is seeded and the upstream API is
+replaced by a local fake, so results can be compared between commits:
+
+    python -m benchmarks.bench_hot_paths --output before.json
+    python -m benchmarks.bench_hot_paths --compare before.json
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.common import (
+    CACHE_DIR, build_history_db, compare_results, environment_info, format_size,
+    measure, parse_size, quiet_streamlit, seed_everything, summarize, write_results,
+)
+from benchmarks.fake_upstream import FakeRateAPI
+
+PERIODS = {
+    "1M": 30, "3M": 90, "6M": 180, "1Y": 365, "3Y": 1095, "5Y": 1825, "10Y": 3650
+}
+QUERY_PERIODS = {"1M": 30, "1Y": 365, "10Y": 3650}
+VOLUME_PERIODS = {"7D": 7, "1M": 30}
+CHART_CURRENCIES = ["USD", "EUR", "JPY", "THB"]
+
+
+def make_tracker(db_file: str):
+    """Build a tracker bound to ``db_file`` without touching the default database"""
+    os.environ["TRACKER_DB_FILE"] = db_file
+    from tracker import TWDCurrencyTracker
+    return TWDCurrencyTracker()
+
+
+def bench_generate(results: Dict, tracker, repeat: int):
+    for label, days in PERIODS.items():
+        results[f"generate_historical_data[{label}]"] = measure(
+            lambda days=days: tracker.generate_historical_data("USD", days), repeat=repeat
+        )
+
+
+def bench_queries(results: Dict, sizes: List[int], seed: int, repeat: int):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    for rows in sizes:
+        started = time.perf_counter()
+        path = build_history_db(os.path.join(CACHE_DIR, f"history-{format_size(rows)}-seed{seed}.db"), rows, seed)
+        print(f"  database {format_size(rows)} ready in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        tracker = make_tracker(path)
+        # SQLite reads first, without the shared in-memory cache; repeats must not hit the query cache
+        import query_cache
+        tracker.query_cache = query_cache.QueryCache(path, size=0)
+        tracker.use_history_cache = False
+        for label, days in QUERY_PERIODS.items():
+            name = f"get_historical_data[rows={format_size(rows)},period={label}]"
+            results[name] = measure(lambda days=days: tracker.get_historical_data("USD", days), repeat=repeat)
+            results[name]["rows_returned"] = len(tracker.get_historical_data("USD", days))
+            name = f"get_pair_history[rows={format_size(rows)},period={label}]"
+            results[name] = measure(lambda days=days: tracker.get_pair_history("EUR", "USD", days), repeat=repeat)
+
+        # Same reads served from the memory-mapped column store
+        from column_store import ColumnStore
+        tracker.column_store = ColumnStore(f"{path}.columns", path)
+        started = time.perf_counter()
+        tracker.column_store.sync()
+        print(f"  column store {format_size(rows)} ready in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        for label, days in QUERY_PERIODS.items():
+            name = f"get_historical_data[rows={format_size(rows)},period={label},store=columns]"
+            results[name] = measure(lambda days=days: tracker.get_historical_data("USD", days), repeat=repeat)
+            name = f"get_pair_history[rows={format_size(rows)},period={label},store=columns]"
+            results[name] = measure(lambda days=days: tracker.get_pair_history("EUR", "USD", days), repeat=repeat)
+
+        # Same reads sliced from the compact in-memory history cache
+        import history_cache
+        tracker.column_store = None
+        tracker.use_history_cache = True
+        started = time.perf_counter()
+        cache = history_cache.shared(path)
+        results[f"history_cache.load[rows={format_size(rows)}]"] = {
+            **summarize([time.perf_counter() - started]), **cache.footprint()
+        }
+        for label, days in QUERY_PERIODS.items():
+            name = f"get_historical_data[rows={format_size(rows)},period={label},store=cache]"
+            results[name] = measure(lambda days=days: tracker.get_historical_data("USD", days), repeat=repeat)
+            name = f"get_pair_history[rows={format_size(rows)},period={label},store=cache]"
+            results[name] = measure(lambda days=days: tracker.get_pair_history("EUR", "USD", days), repeat=repeat)
+
+        # Repeated reads with no write in between, answered by the query-result cache
+        tracker.query_cache = query_cache.QueryCache(path)
+        for label, days in QUERY_PERIODS.items():
+            name = f"get_historical_data[rows={format_size(rows)},period={label},store=query_cache]"
+            results[name] = measure(lambda days=days: tracker.get_historical_data("USD", days), repeat=repeat)
+
+        # Volume ranking of every tracked currency: statistics per request vs the incremental leaderboard
+        import trading_volume
+        tracker.query_cache = query_cache.QueryCache(path, size=0)
+        currencies = list(tracker.popular_currencies)
+        for label, days in VOLUME_PERIODS.items():
+            name = f"volume_ranking[rows={format_size(rows)},period={label},store=statistics]"
+            results[name] = measure(
+                lambda days=days: trading_volume.top(
+                    trading_volume.from_statistics(tracker.get_statistics(currencies, days))),
+                repeat=repeat
+            )
+        started = time.perf_counter()
+        trading_volume.leaderboard(path)
+        results[f"volume_leaderboard.load[rows={format_size(rows)}]"] = summarize([time.perf_counter() - started])
+        for label, days in VOLUME_PERIODS.items():
+            name = f"volume_ranking[rows={format_size(rows)},period={label},store=leaderboard]"
+            results[name] = measure(
+                lambda days=days: trading_volume.top(trading_volume.leaderboard(path).ranking(currencies, days)),
+                repeat=repeat
+            )
+
+
+def bench_save(results: Dict, workdir: str, snapshots: int):
+    tracker = make_tracker(os.path.join(workdir, "save.db"))
+    rates = dict(tracker.base_rates)
+    samples = []
+    for _ in range(snapshots):
+        start = time.perf_counter()
+        tracker.save_rates_to_db(rates)
+        samples.append(time.perf_counter() - start)
+    result = summarize(samples)
+    result["rows_per_second"] = len(rates) / result["mean"] if result["mean"] else 0.0
+    results["save_rates_to_db[23 currencies]"] = result
+
+
+def bench_import(results: Dict, workdir: str, years: int, seed: int):
+    import csv
+    import random
+    from datetime import date, timedelta
+
+    import importer
+
+    rng = random.Random(seed)
+    tracker = make_tracker(os.path.join(workdir, "import.db"))
+    path = os.path.join(workdir, "history.csv")
+    start = date.today() - timedelta(days=years * 365)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "currency", "rate", "volume"])
+        for day in range(years * 365):
+            stamp = (start + timedelta(days=day)).isoformat()
+            for currency, rate in tracker.base_rates.items():
+                writer.writerow([stamp, currency, f"{rate * rng.uniform(0.9, 1.1):.6g}", f"{rng.uniform(100, 5000):.1f}"])
+
+    label = f"{years}y x {len(tracker.base_rates)} currencies"
+    for phase in ("fresh", "duplicates"):
+        stats = importer.import_csv(tracker.db_file, [path])
+        results[f"import_csv[{label},{phase}]"] = {
+            **summarize([stats["seconds"]]),
+            "rows": stats["read"],
+            "rows_per_second": stats["read"] / stats["seconds"] if stats["seconds"] else 0.0,
+        }
+
+
+def bench_statistics(results: Dict, tracker, repeat: int):
+    for label in ("1M", "1Y", "10Y"):
+        df = tracker.generate_historical_data("USD", PERIODS[label])
+        results[f"calculate_statistics[{label}]"] = measure(lambda df=df: tracker.calculate_statistics(df), repeat=repeat)
+
+
+def bench_backtest(results: Dict, tracker, repeat: int):
+    import numpy as np
+
+    import alerts
+
+    for label in ("1Y", "10Y"):
+        df = tracker.generate_historical_data("USD", PERIODS[label])
+        low, high = df["rate"].min(), df["rate"].max()
+        rules = [
+            {"kind": kind, "direction": direction, "threshold": float(threshold), "window_seconds": window}
+            for kind, thresholds, window in (
+                ("level", np.linspace(low, high, 1000), 0),
+                ("change", np.linspace(-3, 3, 1000), 7 * 86400),
+                ("volatility", np.linspace(0, 0.5, 1000), 30 * 86400),
+            )
+            for direction in alerts.DIRECTIONS
+            for threshold in thresholds[::2]
+        ]
+        ts = df.index.values.astype("datetime64[ns]").view("int64")
+        rates = df["rate"].to_numpy(dtype=float)
+        results[f"alerts.backtest_series[{label},{len(rules)} rules]"] = measure(
+            lambda ts=ts, rates=rates, rules=rules: alerts.backtest_series(ts, rates, rules), repeat=repeat
+        )
+
+
+def bench_indicators(results: Dict, workdir: str, rows: int, seed: int, repeat: int):
+    import shutil
+    import sqlite3
+
+    import indicators
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    cached = build_history_db(os.path.join(CACHE_DIR, f"history-{format_size(rows)}-seed{seed}.db"), rows, seed)
+    # New ticks are written below, so work on a copy
+    path = os.path.join(workdir, "indicators.db")
+    shutil.copyfile(cached, path)
+    specs = ["sma:20", "ema:50", "bb:20:2", "rsi:14", "macd:12:26:9", "atr:14"]
+    conn = sqlite3.connect(path)
+    ticks = iter(range(1, 1000000))
+    last = conn.execute("SELECT MAX(timestamp) FROM twd_exchange_rates WHERE currency = 'USD'").fetchone()[0]
+
+    def tick():
+        minute = next(ticks)
+        conn.execute(
+            "INSERT INTO twd_exchange_rates (currency, rate, volume, timestamp) "
+            "VALUES ('USD', ?, 1000, datetime(?, ?))", (31 + (minute % 7) / 100, last, f"+{minute} minutes")
+        )
+        conn.commit()
+
+    for resolution in indicators.RESOLUTIONS:
+        label = f"rows={format_size(rows)},resolution={resolution},{len(specs)} specs"
+        results[f"indicators.full[{label}]"] = measure(
+            lambda resolution=resolution: indicators.IndicatorEngine(path).frame("USD", specs, resolution),
+            repeat=repeat
+        )
+        engine = indicators.IndicatorEngine(path)
+        engine.frame("USD", specs, resolution)
+        results[f"indicators.cached[{label}]"] = measure(
+            lambda engine=engine, resolution=resolution: engine.frame("USD", specs, resolution), repeat=repeat
+        )
+
+        def after_tick(engine=engine, resolution=resolution):
+            tick()
+            return engine.frame("USD", specs, resolution)
+
+        results[f"indicators.after_tick[{label}]"] = measure(after_tick, repeat=repeat)
+    conn.close()
+
+
+def bench_correlation(results: Dict, seed: int, repeat: int):
+    import numpy as np
+    import pandas as pd
+
+    import correlation
+
+    rng = np.random.default_rng(seed)
+    for currencies in (23, 170):
+        closes = pd.DataFrame(
+            30 * np.exp(np.cumsum(rng.normal(0, 0.005, (PERIODS["10Y"], currencies)), axis=0)),
+            index=pd.date_range("2015-01-01", periods=PERIODS["10Y"], freq="D"),
+            columns=[f"C{i:03d}" for i in range(currencies)]
+        )
+        rets = correlation.returns(closes)
+        pairs = [(rets.columns[0], other) for other in rets.columns[1:]]
+        label = f"10Y,{currencies} currencies"
+        results[f"correlation.matrix[{label}]"] = measure(lambda rets=rets: correlation.matrix(rets), repeat=repeat)
+        results[f"correlation.rolling[{label},90D]"] = measure(
+            lambda rets=rets, pairs=pairs: correlation.rolling(rets, pairs, 90), repeat=repeat
+        )
+        if currencies == 23:
+            # Per-window reference the cumulative sums replace
+            results[f"pandas.rolling.corr[{label},90D]"] = measure(
+                lambda rets=rets, pairs=pairs: [rets[a].rolling(90, min_periods=20).corr(rets[b]) for a, b in pairs],
+                repeat=repeat
+            )
+
+
+def bench_forecast(results: Dict, tracker, repeat: int):
+    import forecast
+    from tracker import DAILY_VOLATILITY, DEFAULT_DAILY_VOLATILITY
+
+    inputs = {
+        currency: {"rate": rate, "volatility": DAILY_VOLATILITY.get(currency, DEFAULT_DAILY_VOLATILITY), "anchor": rate}
+        for currency, rate in tracker.base_rates.items()
+    }
+    one = {"USD": inputs["USD"]}
+    results["forecast[1 currency,10k paths,1Y]"] = measure(
+        lambda: forecast.forecast(one, PERIODS["1Y"], seed=0, workers=0), repeat=repeat
+    )
+    results[f"forecast[{len(inputs)} currencies,10k paths,1Y]"] = measure(
+        lambda: forecast.forecast(inputs, PERIODS["1Y"], seed=0, workers=0), repeat=repeat
+    )
+    workers = os.cpu_count() or 1
+    if workers > 1:
+        results[f"forecast[{len(inputs)} currencies,10k paths,1Y,{workers} workers]"] = measure(
+            lambda: forecast.forecast(inputs, PERIODS["1Y"], seed=0, workers=workers), repeat=repeat
+        )
+
+
+def bench_charts(results: Dict, tracker, repeat: int):
+    import charts
+    from i18n import language_manager as lang_manager
+
+    for label in ("1M", "1Y", "10Y"):
+        df = tracker.generate_historical_data("USD", PERIODS[label])
+        results[f"create_trend_chart[{label}]"] = measure(
+            lambda df=df: charts.create_trend_chart(df, "USD", label, lang_manager, "en"),
+            repeat=repeat
+        )
+        results[f"create_volume_chart[{label}]"] = measure(
+            lambda df=df: charts.create_volume_chart(df, "USD", label, lang_manager, "en"),
+            repeat=repeat
+        )
+        results[f"create_comparison_chart[{label}]"] = measure(
+            lambda days=PERIODS[label]: charts.create_comparison_chart(
+                tracker, CHART_CURRENCIES, days, lang_manager, "en"),
+            repeat=repeat
+        )
+
+
+def bench_main(results: Dict, workdir: str, repeat: int):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["TRACKER_DB_FILE"] = os.path.join(workdir, "app.db")
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "currency_tracker.py")
+    app = AppTest.from_file(script, default_timeout=600)
+
+    def render():
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+
+    results["main[AppTest full render]"] = measure(render, repeat=repeat)
+
+    # Further sessions reuse the shared market snapshot; peak RSS should stay flat
+    import resource
+
+    sessions = []
+
+    def new_session():
+        sessions.append(AppTest.from_file(script, default_timeout=600))
+        sessions[-1].run()
+        if sessions[-1].exception:
+            raise RuntimeError(sessions[-1].exception[0].value)
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["main[AppTest new session]"] = measure(new_session, repeat=repeat)
+    results["main[AppTest new session]"]["sessions"] = len(sessions)
+    results["main[AppTest new session]"]["peak_rss_growth_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+    sessions.clear()
+
+    # Every registry currency tracked and quoted, as with TRACKER_CURRENCIES=all
+    import currencies
+
+    os.environ["TRACKER_DB_FILE"] = os.path.join(workdir, "app-all.db")
+    os.environ["TRACKER_CURRENCIES"] = "all"
+    previous_apis = os.environ.get("TRACKER_RATE_APIS")
+    try:
+        with FakeRateAPI(twd_rates=currencies.twd_rates()) as api:
+            os.environ["TRACKER_RATE_APIS"] = api.url
+            app = AppTest.from_file(script, default_timeout=600)
+            results[f"main[AppTest full render,currencies={len(currencies.tracked())}]"] = measure(
+                render, repeat=repeat)
+    finally:
+        del os.environ["TRACKER_CURRENCIES"]
+        if previous_apis is not None:
+            os.environ["TRACKER_RATE_APIS"] = previous_apis
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k,1M,10M", help="Database sizes for history queries")
+    parser.add_argument("--quick", action="store_true", help="Small databases and fewer repeats (smoke run)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", action="append", default=[],
+                        choices=["generate", "query", "save", "import", "stats", "backtest", "indicators",
+                                 "correlation", "forecast", "charts", "main"],
+                        help="Run only the given group (repeatable)")
+    parser.add_argument("--output", help="Result JSON path (default benchmarks/results/hot_paths-<rev>.json)")
+    parser.add_argument("--compare", help="Baseline result JSON to compare medians against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    quiet_streamlit()
+    sizes = [parse_size(s) for s in ("10k,100k" if args.quick else args.sizes).split(",")]
+    repeat = 2 if args.quick else args.repeat
+    groups = set(args.only) or {"generate", "query", "save", "import", "stats", "backtest", "indicators",
+                                "correlation", "forecast", "charts", "main"}
+    results: Dict[str, Dict] = {}
+
+    with tempfile.TemporaryDirectory() as workdir, FakeRateAPI(seed=args.seed) as api:
+        os.environ["TRACKER_RATE_APIS"] = api.url
+        seed_everything(args.seed)
+        tracker = make_tracker(os.path.join(workdir, "generated.db"))
+
+        steps = [
+            ("generate", lambda: bench_generate(results, tracker, repeat)),
+            ("query", lambda: bench_queries(results, sizes, args.seed, repeat)),
+            ("save", lambda: bench_save(results, workdir, 20 if args.quick else 200)),
+            ("import", lambda: bench_import(results, workdir, 3 if args.quick else 30, args.seed)),
+            ("stats", lambda: bench_statistics(results, tracker, repeat)),
+            ("backtest", lambda: bench_backtest(results, tracker, repeat)),
+            ("indicators", lambda: bench_indicators(results, workdir, parse_size("100k" if args.quick else "1M"),
+                                                    args.seed, repeat)),
+            ("correlation", lambda: bench_correlation(results, args.seed, repeat)),
+            ("forecast", lambda: bench_forecast(results, tracker, repeat)),
+            ("charts", lambda: bench_charts(results, tracker, repeat)),
+            ("main", lambda: bench_main(results, workdir, repeat)),
+        ]
+        for group, step in steps:
+            if group in groups:
+                print(f"running {group} benchmarks...", file=sys.stderr)
+                seed_everything(args.seed)
+                step()
+
+    payload = {"meta": environment_info(args.seed), "results": results}
+    payload["meta"]["sizes"] = sizes
+    path = write_results(payload, args.output, "hot_paths")
+
+    print(f"\n{'benchmark':<55} {'median (s)':>12} {'min (s)':>12}")
+    for name, result in sorted(results.items()):
+        print(f"{name:<55} {result['median']:>12.6f} {result['min']:>12.6f}")
+    print(f"\nresults written to {path}")
+
+    if args.compare:
+        regressions = compare_results(payload, args.compare, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.2f}x")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Import-time (cold start) benchmark based on ``python -X importtime``.
+
+Each entry point is imported in a fresh interpreter several times. The
+report lists the median total import time and the heaviest direct imports.
+The headless entry points are also checked to make sure they never pull in
+Streamlit, Plotly or pandas:
+
+    python -m benchmarks.bench_import_time
+    python -m benchmarks.bench_import_time --compare before.json
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from benchmarks.common import REPO_ROOT, compare_results, environment_info, write_results
+
+# Entry point -> top-level packages it must not import
+TARGETS = {
+    "cli": ("streamlit", "plotly", "pandas", "numpy", "requests"),
+    "tracker": ("streamlit", "plotly", "pandas", "numpy", "requests"),
+    "i18n": ("streamlit", "plotly", "pandas", "numpy"),
+    "charts": ("streamlit",),
+    "currency_tracker": (),
+}
+
+LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Parse -X importtime output into (module, self_us, cumulative_us, depth)"""
+    entries = []
+    for line in stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def profile_import(module: str) -> Dict:
+    """Import ``module`` in a fresh interpreter and summarise -X importtime"""
+    code = f"import {module}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    entries = parse_importtime(result.stderr)
+    top_level = [entry for entry in entries if entry[3] == 0]
+    packages = {name.split(".")[0] for name, _, _, _ in entries}
+
+    # Output is post-order: a module's direct imports are the depth-1 lines
+    # printed just before its own depth-0 line
+    children, pending = [], []
+    for name, _, cumulative, depth in entries:
+        if depth == 1:
+            pending.append((name, cumulative / 1e6))
+        elif depth == 0:
+            if name == module:
+                children = pending
+            pending = []
+    return {
+        "total": sum(entry[2] for entry in top_level) / 1e6,
+        "heaviest": sorted(children, key=lambda item: item[1], reverse=True)[:10],
+        "packages": packages,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--target", action="append", choices=sorted(TARGETS), help="Entry point(s) to profile")
+    parser.add_argument("--budget", action="append", default=[], metavar="TARGET=SECONDS",
+                        help="Fail if the median import time of TARGET exceeds SECONDS")
+    parser.add_argument("--output", help="Result JSON path (default benchmarks/results/import_time-<rev>.json)")
+    parser.add_argument("--compare", help="Baseline result JSON to compare medians against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    budgets = {}
+    for item in args.budget:
+        name, _, seconds = item.partition("=")
+        budgets[name] = float(seconds)
+
+    results: Dict[str, Dict] = {}
+    failures = []
+    for target in args.target or list(TARGETS):
+        print(f"profiling import {target}...", file=sys.stderr)
+        # One discarded run warms the OS file cache
+        profile_import(target)
+        runs = [profile_import(target) for _ in range(args.repeat)]
+        totals = sorted(run["total"] for run in runs)
+        forbidden = sorted(set(TARGETS[target]) & runs[0]["packages"])
+        results[f"import[{target}]"] = {
+            "repeat": len(totals),
+            "min": totals[0],
+            "median": statistics.median(totals),
+            "max": totals[-1],
+            "heaviest": runs[0]["heaviest"],
+            "forbidden_imports": forbidden,
+        }
+        if forbidden:
+            failures.append(f"{target} imports {', '.join(forbidden)}")
+        if target in budgets and statistics.median(totals) > budgets[target]:
+            failures.append(f"{target} median {statistics.median(totals):.3f}s exceeds budget {budgets[target]:.3f}s")
+
+    payload = {"meta": environment_info(), "results": results}
+    path = write_results(payload, args.output, "import_time")
+
+    for name, result in results.items():
+        print(f"\n{name}: median {result['median'] * 1000:.1f} ms (min {result['min'] * 1000:.1f} ms)")
+        for module, seconds in result["heaviest"][:5]:
+            print(f"    {module:<40} {seconds * 1000:>8.1f} ms")
+    print(f"\nresults written to {path}")
+
+    if args.compare and compare_results(payload, args.compare, args.threshold):
+        failures.append("import time regressed against baseline")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Check that a backfill stores only the tracked currencies.
+
+Upstream timeseries quote every currency they know, far more than the
+tracked set. This backfills a few weeks from the fake upstream serving the
+whole currency registry plus codes the registry does not know, then checks
+that exactly the tracked currencies were stored, one row per day, and that
+a second run is answered from checkpoints. Exits non-zero on any mismatch:
+
+    python -m benchmarks.check_backfill
+    python -m benchmarks.check_backfill --days 120 --currencies all
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import date, timedelta
+
+from benchmarks.fake_upstream import FakeRateAPI
+
+# Quoted upstream but unknown to currencies.csv
+UNKNOWN_CODES = {"ZZZ": 1.5, "QQQ": 0.02}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=45, help="Days to backfill, ending yesterday")
+    parser.add_argument("--currencies", help="TRACKER_CURRENCIES for the run (default: the popular set)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="check-backfill-")
+    try:
+        os.environ["TRACKER_DB_FILE"] = os.path.join(workdir, "backfill.db")
+        os.environ.pop("TRACKER_COLUMN_STORE", None)
+        if args.currencies:
+            os.environ["TRACKER_CURRENCIES"] = args.currencies
+        import backfill
+        import currencies
+        from tracker import TWDCurrencyTracker
+
+        quoted = {**currencies.twd_rates(), **UNKNOWN_CODES}
+        end = date.today() - timedelta(days=1)
+        start = end - timedelta(days=args.days - 1)
+        with FakeRateAPI(seed=args.seed, twd_rates=quoted) as api:
+            os.environ["TRACKER_RATE_APIS"] = api.url
+            tracker = TWDCurrencyTracker()
+            first = backfill.run_backfill(tracker, start, end, chunk_days=30, rate=0)
+            second = backfill.run_backfill(tracker, start, end, chunk_days=30, rate=0)
+
+        conn = sqlite3.connect(tracker.db_file)
+        try:
+            counts = dict(conn.execute("SELECT currency, COUNT(*) FROM twd_exchange_rates GROUP BY currency"))
+        finally:
+            conn.close()
+
+        expected = set(tracker.popular_currencies) & (set(quoted) | {"USD"})
+        failures = []
+        if set(counts) != expected:
+            failures.append(f"stored {len(counts)} currencies, expected {len(expected)}: "
+                            f"untracked {sorted(set(counts) - expected)[:10]}, "
+                            f"missing {sorted(expected - set(counts))[:10]}")
+        wrong = {currency: n for currency, n in counts.items() if n != args.days}
+        if wrong:
+            failures.append(f"expected {args.days} rows per currency, got {dict(list(wrong.items())[:5])}")
+        if first["failed"] or first["incomplete"]:
+            failures.append(f"first run: {first['failed']} failed, {first['incomplete']} incomplete chunks")
+        if second["fetched"] or second["checkpointed"] != second["chunks"]:
+            failures.append(f"second run fetched {second['fetched']} of {second['chunks']} chunks again")
+
+        print(f"quoted {len(quoted)} currencies, tracked {len(tracker.popular_currencies)}, "
+              f"stored {len(counts)} ({sum(counts.values())} rows over {args.days} days)")
+        for failure in failures:
+            print(f"MISMATCH {failure}")
+        print("backfill ok" if not failures else f"{len(failures)} mismatch(es)")
+        return 1 if failures else 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
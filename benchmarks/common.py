@@ -0,0 +1,183 @@
+"""Shared helpers for the benchmark and load-test scripts."""
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+CACHE_DIR = os.path.join(REPO_ROOT, "benchmarks", ".cache")
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_upstream import TWD_RATES  # noqa: E402
+
+
+def quiet_streamlit():
+    """Silence bare-mode Streamlit warnings when the app module is imported directly"""
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+
+def seed_everything(seed: int):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def parse_size(text: str) -> int:
+    """Parse row counts such as 10k, 1M or 2500"""
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    number = text[:-1] if multiplier > 1 else text
+    return int(float(number) * multiplier)
+
+
+def format_size(rows: int) -> str:
+    if rows >= 1_000_000 and rows % 1_000_000 == 0:
+        return f"{rows // 1_000_000}M"
+    if rows >= 1_000 and rows % 1_000 == 0:
+        return f"{rows // 1_000}k"
+    return str(rows)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(fn: Callable[[], object], repeat: int = 5, warmup: int = 1) -> Dict:
+    """Time ``fn`` several times and summarise the wall-clock seconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def summarize(samples: List[float]) -> Dict:
+    ordered = sorted(samples)
+    return {
+        "repeat": len(ordered),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "mean": statistics.fmean(ordered),
+        "max": ordered[-1],
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment_info(seed: Optional[int] = None) -> Dict:
+    return {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+    }
+
+
+def write_results(payload: Dict, output: Optional[str], prefix: str) -> str:
+    """Write a JSON result file; defaults to benchmarks/results/<prefix>-<revision>.json"""
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{prefix}-{payload['meta']['revision']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    return output
+
+
+def compare_results(current: Dict, baseline_path: str, threshold: float, key: str = "median") -> List[str]:
+    """Print per-benchmark ratios against a baseline file; return the regressions"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\n{'benchmark':<55} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for name, result in sorted(current["results"].items()):
+        previous = baseline.get("results", {}).get(name)
+        if not previous or key not in previous or key not in result:
+            continue
+        ratio = result[key] / previous[key] if previous[key] else float("inf")
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name:<55} {previous[key]:>12.6f} {result[key]:>12.6f} {ratio:>7.2f}x{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def build_history_db(path: str, rows: int, seed: int = 42, years: int = 10,
+                     currencies: Optional[List[str]] = None) -> str:
+    """Create a twd_exchange_rates database with ``rows`` seeded synthetic rows
+
+    Rows are spread evenly over the last ``years`` years for every currency, so
+    the same file serves short and long period queries. Existing files with the
+    same name are reused because large databases take a while to build.
+    """
+    if os.path.exists(path):
+        return path
+    currencies = currencies or list(TWD_RATES)
+    rng = np.random.default_rng(seed)
+    per_currency = max(1, rows // len(currencies))
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    span_seconds = years * 365 * 86400
+    step = max(1, span_seconds // per_currency)
+    offsets = np.arange(per_currency, dtype=np.int64) * step
+    start_epoch = int(end.timestamp()) - int(offsets[-1])
+    timestamps = [datetime.fromtimestamp(start_epoch + int(o)).strftime("%Y-%m-%d %H:%M:%S") for o in offsets]
+
+    tmp_path = f"{path}.building"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute('''
+        CREATE TABLE twd_exchange_rates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            currency TEXT,
+            rate REAL,
+            volume REAL DEFAULT 0,
+            timestamp DATETIME,
+            UNIQUE(currency, timestamp)
+        )
+    ''')
+    for currency in currencies:
+        base_rate = TWD_RATES.get(currency, 1.0)
+        steps = rng.normal(0, 0.002, per_currency)
+        rates = base_rate * np.exp(np.cumsum(steps))
+        volumes = rng.uniform(500, 15000, per_currency)
+        conn.executemany(
+            "INSERT INTO twd_exchange_rates (currency, rate, volume, timestamp) VALUES (?, ?, ?, ?)",
+            zip([currency] * per_currency, rates.tolist(), volumes.tolist(), timestamps)
+        )
+        conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,209 @@
+"""Local stand-in for the upstream exchange rate API.
+
+Serves ``/latest?base=USD`` and ``/timeseries?start_date=...&end_date=...``
+in the exchangerate.host response format from a background thread, with seeded
+jitter, optional latency, failures and a request rate limit (HTTP 429), so
+benchmarks, load tests and backfills never touch the network and are
+reproducible.
+"""
+import json
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+# TWD per unit of foreign currency, mirroring TWDCurrencyTracker.base_rates
+TWD_RATES = {
+    "USD": 30.8, "EUR": 33.5, "GBP": 39.2, "JPY": 0.206, "AUD": 20.4,
+    "CAD": 22.8, "CHF": 34.6, "CNY": 4.25, "SEK": 2.91, "NZD": 18.9,
+    "MXN": 1.79, "SGD": 22.9, "HKD": 3.95, "NOK": 2.85, "KRW": 0.0233,
+    "TRY": 0.90, "RUB": 0.33, "INR": 0.369, "BRL": 6.18, "ZAR": 1.68,
+    "THB": 0.87, "VND": 0.00125, "MYR": 6.95
+}
+
+
+def usd_based_rates(twd_rates: Dict[str, float]) -> Dict[str, float]:
+    """Convert TWD-per-unit rates into the API's units-per-USD form"""
+    twd_per_usd = twd_rates["USD"]
+    rates = {currency: twd_per_usd / rate for currency, rate in twd_rates.items()}
+    rates["USD"] = 1.0
+    rates["TWD"] = twd_per_usd
+    return rates
+
+
+class FakeRateAPI:
+    """Threaded HTTP server imitating the upstream rate API
+
+    Use as a context manager; ``url`` is the value to put in TRACKER_RATE_APIS.
+    ``twd_rates`` replaces the quoted currencies, e.g. with the whole registry
+    (currencies.twd_rates()) like the real API.
+    """
+
+    def __init__(self, seed: int = 42, latency: float = 0.0, failure_rate: float = 0.0,
+                 jitter: float = 0.003, host: str = "127.0.0.1", port: int = 0,
+                 max_rps: float = 0.0, max_days: int = 366, twd_rates: Optional[Dict[str, float]] = None):
+        self.seed = seed
+        self.twd_rates = dict(twd_rates or TWD_RATES)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.jitter = jitter
+        self.max_rps = max_rps
+        self.max_days = max_days
+        self.requests = 0
+        self.rate_limited = 0
+        self._last_request = 0.0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/latest?base=USD"
+
+    def latest_payload(self) -> Dict:
+        """Build one /latest response; jitter comes from the seeded RNG"""
+        with self._lock:
+            self.requests += 1
+            fail = self._rng.random() < self.failure_rate
+            twd_rates = {currency: rate * (1 + self._rng.uniform(-self.jitter, self.jitter))
+                         for currency, rate in self.twd_rates.items()}
+        if fail:
+            return {}
+        return {
+            "success": True,
+            "base": "USD",
+            "date": datetime.now().strftime("%Y-%m-%d"),
+            "rates": usd_based_rates(twd_rates),
+        }
+
+    def history_rates(self, day: date) -> Dict[str, float]:
+        """Units-per-USD rates for one past day; the same day always gives the same rates"""
+        rng = random.Random(f"{self.seed}:{day.isoformat()}")
+        return usd_based_rates({currency: rate * (1 + rng.uniform(-0.05, 0.05))
+                                for currency, rate in self.twd_rates.items()})
+
+    def timeseries_payload(self, start: date, end: date) -> Dict:
+        """Build one /timeseries response covering ``start`` to ``end`` inclusive"""
+        with self._lock:
+            self.requests += 1
+            fail = self._rng.random() < self.failure_rate
+        if fail:
+            return {}
+        days = (end - start).days + 1
+        return {
+            "success": True,
+            "timeseries": True,
+            "base": "USD",
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "rates": {(start + timedelta(days=i)).isoformat(): self.history_rates(start + timedelta(days=i))
+                      for i in range(days)},
+        }
+
+    def _throttled(self) -> bool:
+        """True when the request exceeds ``max_rps`` (counted as rate limited)"""
+        if not self.max_rps:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_request < 1.0 / self.max_rps:
+                self.rate_limited += 1
+                return True
+            self._last_request = now
+            return False
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if api.latency:
+                    time.sleep(api.latency)
+                path = parsed.path.rstrip("/")
+                query = parse_qs(parsed.query)
+                if path not in ("/latest", "/timeseries"):
+                    self._send(404, {"success": False, "error": "not found"})
+                    return
+                if api._throttled():
+                    self._send(429, {"success": False, "error": "rate limited"}, {"Retry-After": "1"})
+                    return
+                base = query.get("base", ["USD"])[0]
+                if path == "/latest":
+                    payload = api.latest_payload()
+                else:
+                    try:
+                        start = date.fromisoformat(query["start_date"][0])
+                        end = date.fromisoformat(query["end_date"][0])
+                    except (KeyError, ValueError):
+                        self._send(400, {"success": False, "error": "start_date and end_date are required"})
+                        return
+                    if end < start or (end - start).days >= api.max_days:
+                        self._send(400, {"success": False, "error": f"at most {api.max_days} days per request"})
+                        return
+                    payload = api.timeseries_payload(start, end)
+                if not payload or base != "USD":
+                    self._send(503, {"success": False, "error": "unavailable"})
+                else:
+                    self._send(200, payload)
+
+            def _send(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeRateAPI":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-rate-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeRateAPI":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local fake exchange rate API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--max-rps", type=float, default=0.0, help="Answer 429 above this request rate")
+    args = parser.parse_args()
+
+    with FakeRateAPI(seed=args.seed, latency=args.latency, failure_rate=args.failure_rate, port=args.port,
+                     max_rps=args.max_rps) as api:
+        print(f"TRACKER_RATE_APIS={api.url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,178 @@
+"""Concurrent-session load test for the Streamlit dashboard.
+
+Each simulated user is a separate process driving the app through Streamlit's
+AppTest with seeded, realistic widget interactions (period, currency, language,
+display base, comparison set, converter and volume tab changes). All sessions
+share one SQLite file, so they contend on the per-rerun ``save_rates_to_db``
+write, and fetch current rates from a local stub API on every rerun.
+
+    python -m benchmarks.load_test --sessions 1,4,16 --reruns 20 --latency 0.05
+
+For every concurrency level the harness reports throughput, p50/p95/p99 rerun
+latency and the time spent waiting for the SQLite write lock.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import crosses
+from benchmarks.common import (
+    REPO_ROOT, environment_info, percentile, quiet_streamlit, write_results,
+)
+from benchmarks.fake_upstream import FakeRateAPI
+
+APP_SCRIPT = os.path.join(REPO_ROOT, "currency_tracker.py")
+CURRENCIES = ["USD", "EUR", "GBP", "JPY", "AUD", "CNY", "HKD", "KRW", "SGD", "THB", "VND", "MYR"]
+LANGUAGES = ["zh-TW", "zh-CN", "en", "ja"]
+COMPARE_SETS = [["USD", "EUR"], ["USD", "EUR", "JPY", "THB"], ["GBP", "AUD", "KRW"], ["CNY", "HKD", "SGD", "MYR", "VND"]]
+
+
+def _interact(app, rng: random.Random):
+    """Apply one random user interaction to the app (without running it)
+
+    Widgets are looked up by their ``key=`` in currency_tracker.py, so new
+    widgets elsewhere on the page do not shift what each action drives.
+    """
+    action = rng.choices(
+        ["period", "trend_currency", "compare", "convert", "volume", "language", "base", "refresh"],
+        weights=[3, 4, 2, 2, 2, 1, 1, 2]
+    )[0]
+    if action == "period":
+        box = app.selectbox(key="time_period")
+        box.select_index(rng.randrange(len(box.options)))
+    elif action == "trend_currency":
+        # Boxes with a format_func are driven by value, not by displayed label
+        app.selectbox(key="trend_currency").set_value(rng.choice(CURRENCIES))
+    elif action == "compare":
+        app.multiselect(key="compare_currencies").set_value(rng.choice(COMPARE_SETS))
+    elif action == "convert":
+        app.number_input(key="convert_amount").set_value(round(rng.uniform(1, 10000), 2))
+        app.selectbox(key="convert_to").set_value(rng.choice(CURRENCIES))
+    elif action == "volume":
+        box = app.selectbox(key="volume_period")
+        box.select_index(rng.randrange(len(box.options)))
+    elif action == "language":
+        app.selectbox(key="language_select").set_value(rng.choice(LANGUAGES))
+    elif action == "base":
+        app.selectbox(key="display_base").set_value(rng.choice(crosses.DISPLAY_BASES))
+    return action
+
+
+def run_session(session_id: int, reruns: int, seed: int, env: Dict[str, str]) -> Dict:
+    """Drive one dashboard session; runs in a worker process"""
+    os.environ.update(env)
+    quiet_streamlit()
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed * 1000 + session_id)
+    app = AppTest.from_file(APP_SCRIPT, default_timeout=300)
+    latencies: List[float] = []
+    actions: Dict[str, int] = {}
+    errors = 0
+
+    for i in range(reruns + 1):
+        if i > 0:
+            try:
+                action = _interact(app, rng)
+            except (IndexError, KeyError):
+                action = "refresh"
+            actions[action] = actions.get(action, 0) + 1
+        start = time.perf_counter()
+        app.run()
+        elapsed = time.perf_counter() - start
+        if app.exception:
+            errors += 1
+        if i > 0:
+            # The first run includes imports and is reported separately
+            latencies.append(elapsed)
+        else:
+            cold_start = elapsed
+
+    import metrics
+    return {
+        "latencies": latencies,
+        "cold_start": cold_start,
+        "actions": actions,
+        "errors": errors,
+        "lock_waits": metrics.DB_LOCK_WAIT_SECONDS.count(),
+        "lock_wait_seconds": metrics.DB_LOCK_WAIT_SECONDS.sum(),
+        "lock_timeouts": metrics.DB_LOCK_TIMEOUTS.get(),
+    }
+
+
+def run_level(sessions: int, reruns: int, seed: int, env: Dict[str, str]) -> Dict:
+    """Run ``sessions`` concurrent sessions and aggregate their measurements"""
+    ctx = multiprocessing.get_context("spawn")
+    started = time.perf_counter()
+    with ctx.Pool(processes=sessions) as pool:
+        outcomes = pool.starmap(run_session, [(i, reruns, seed, env) for i in range(sessions)])
+    wall = time.perf_counter() - started
+
+    latencies = sorted(lat for outcome in outcomes for lat in outcome["latencies"])
+    lock_waits = sum(o["lock_waits"] for o in outcomes)
+    lock_wait_seconds = sum(o["lock_wait_seconds"] for o in outcomes)
+    # Throughput is measured over the interaction phase only, excluding cold starts
+    busy = max(sum(o["latencies"]) for o in outcomes) or wall
+    return {
+        "sessions": sessions,
+        "reruns": len(latencies),
+        "wall_seconds": wall,
+        "throughput_reruns_per_second": len(latencies) / busy if busy else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else 0.0,
+        "cold_start_p50": percentile(sorted(o["cold_start"] for o in outcomes), 50),
+        "lock_waits": lock_waits,
+        "lock_wait_seconds": lock_wait_seconds,
+        "lock_wait_mean": lock_wait_seconds / lock_waits if lock_waits else 0.0,
+        "lock_timeouts": sum(o["lock_timeouts"] for o in outcomes),
+        "errors": sum(o["errors"] for o in outcomes),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,2,4,8", help="Comma separated concurrency levels")
+    parser.add_argument("--reruns", type=int, default=20, help="Interactions per session")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub API latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of stub API failures")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="SQLite file shared by all sessions (default: fresh temp file)")
+    parser.add_argument("--output", help="Result JSON path (default benchmarks/results/load-<rev>.json)")
+    args = parser.parse_args(argv)
+
+    levels = [int(s) for s in args.sessions.split(",")]
+    results = []
+    with tempfile.TemporaryDirectory() as workdir, \
+            FakeRateAPI(seed=args.seed, latency=args.latency, failure_rate=args.failure_rate) as api:
+        for sessions in levels:
+            env = {
+                "TRACKER_RATE_APIS": api.url,
+                "TRACKER_DB_FILE": args.db or os.path.join(workdir, f"load-{sessions}.db"),
+            }
+            print(f"running {sessions} concurrent session(s)...", file=sys.stderr)
+            results.append(run_level(sessions, args.reruns, args.seed, env))
+
+    payload = {"meta": environment_info(args.seed), "results": {f"sessions={r['sessions']}": r for r in results}}
+    payload["meta"].update({"reruns_per_session": args.reruns, "stub_latency": args.latency})
+    path = write_results(payload, args.output, "load")
+
+    header = f"{'sessions':>8} {'reruns/s':>9} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9} " \
+             f"{'lock waits':>10} {'lock wait (s)':>13} {'timeouts':>8} {'errors':>6}"
+    print("\n" + header)
+    for r in results:
+        print(f"{r['sessions']:>8} {r['throughput_reruns_per_second']:>9.2f} {r['p50']:>9.3f} {r['p95']:>9.3f} "
+              f"{r['p99']:>9.3f} {r['lock_waits']:>10} {r['lock_wait_seconds']:>13.3f} "
+              f"{int(r['lock_timeouts']):>8} {r['errors']:>6}")
+    print(f"\nresults written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
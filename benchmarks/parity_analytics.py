@@ -0,0 +1,153 @@
+"""Check that the DuckDB analytics backend matches the SQLite reference.
+
+Builds (or reuses) a seeded history database, then compares the statistics
+of both backends for several periods and currency sets. The Parquet mirror
+is exercised three ways: a fresh build, an incremental append after new
+snapshots, and a full rebuild after rows are deleted. The SQLite source
+(DuckDB attaching the database directly) is compared last; it needs DuckDB's
+sqlite extension, which is downloaded on first use, so the run is reported as
+skipped when it cannot be loaded. The database lives in a directory with a
+quote in its name, so paths embedded in DuckDB SQL are exercised too. Exits
+non-zero on any mismatch:
+
+    python -m benchmarks.parity_analytics
+    python -m benchmarks.parity_analytics --rows 1M --repeat 5
+"""
+import argparse
+import math
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from benchmarks.common import CACHE_DIR, build_history_db, format_size, measure, parse_size
+
+PERIODS = {"1D": 1, "7D": 7, "1M": 30, "1Y": 365, "10Y": 3650}
+CURRENCY_SETS = {
+    "one": ["USD"],
+    "four": ["USD", "EUR", "JPY", "THB"],
+    "all": None,
+}
+
+
+def _equal(a, b) -> bool:
+    if isinstance(a, str) or isinstance(b, str):
+        return a == b
+    if math.isnan(a) and math.isnan(b):
+        return True
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def compare(reference: Dict[str, Dict], candidate: Dict[str, Dict]) -> List[str]:
+    """Describe every difference between two statistics results"""
+    problems = []
+    if set(reference) != set(candidate):
+        problems.append(f"currencies differ: {sorted(set(reference) ^ set(candidate))}")
+    for currency in sorted(set(reference) & set(candidate)):
+        ref, got = reference[currency], candidate[currency]
+        if set(ref) != set(got):
+            problems.append(f"{currency}: keys differ: {sorted(set(ref) ^ set(got))}")
+        for key in sorted(set(ref) & set(got)):
+            if not _equal(ref[key], got[key]):
+                problems.append(f"{currency}.{key}: sqlite={ref[key]!r} duckdb={got[key]!r}")
+    return problems
+
+
+def check(label: str, sqlite_backend, duckdb_backend, currencies: List[str], repeat: int) -> int:
+    """Compare both backends on every period; returns the number of mismatching cases"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    failures = 0
+    for period, days in PERIODS.items():
+        start = today - timedelta(days=days)
+        reference = sqlite_backend.statistics(currencies, start, today)
+        candidate = duckdb_backend.statistics(currencies, start, today)
+        problems = compare(reference, candidate)
+        timings = ""
+        if repeat:
+            sqlite_time = measure(lambda: sqlite_backend.statistics(currencies, start, today), repeat=repeat)
+            duckdb_time = measure(lambda: duckdb_backend.statistics(currencies, start, today), repeat=repeat)
+            timings = f"  sqlite {sqlite_time['median'] * 1000:8.1f} ms  duckdb {duckdb_time['median'] * 1000:8.1f} ms"
+        status = "ok" if not problems else f"{len(problems)} MISMATCHES"
+        print(f"{label:<28} {period:>4} currencies={len(reference):<3}{timings}  {status}")
+        for problem in problems[:10]:
+            print(f"    {problem}")
+        failures += bool(problems)
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=parse_size, default=parse_size("100k"), help="Rows in the test database")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (0 to skip timing)")
+    args = parser.parse_args(argv)
+
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        print("duckdb is not installed (pip install duckdb)", file=sys.stderr)
+        return 2
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    cached = build_history_db(os.path.join(CACHE_DIR, f"history-{format_size(args.rows)}-seed{args.seed}.db"),
+                              args.rows, args.seed)
+    workdir = tempfile.mkdtemp(prefix="parity-analytics-o'")
+    try:
+        # Work on a copy: the checks write to the database and build a mirror next to it
+        db_file = os.path.join(workdir, "history.db")
+        shutil.copyfile(cached, db_file)
+        os.environ["TRACKER_DB_FILE"] = db_file
+        os.environ.pop("TRACKER_COLUMN_STORE", None)
+        from analytics import DuckDBBackend, SQLiteBackend
+        from tracker import TWDCurrencyTracker
+
+        tracker = TWDCurrencyTracker()
+        sqlite_backend = SQLiteBackend(tracker)
+        duckdb_backend = DuckDBBackend(db_file, source="parquet")
+        conn = sqlite3.connect(db_file)
+        everything = [row[0] for row in conn.execute("SELECT DISTINCT currency FROM twd_exchange_rates")]
+
+        failures = 0
+        for name, currencies in CURRENCY_SETS.items():
+            failures += check(f"fresh mirror [{name}]", sqlite_backend, duckdb_backend,
+                              currencies or everything, args.repeat)
+
+        # Incremental append: a few new snapshots land after the mirror was built
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        for hour in (9, 13, 17):
+            conn.executemany(
+                "INSERT OR REPLACE INTO twd_exchange_rates (currency, rate, volume, timestamp) VALUES (?, ?, ?, ?)",
+                [(currency, 1.0 + i / 10 + hour / 100, 1000.0 + hour, f"{yesterday} {hour:02d}:00:00")
+                 for i, currency in enumerate(everything)]
+            )
+            conn.commit()
+            # One part per sync, like the collector writing a snapshot between page loads
+            duckdb_backend.statistics(["USD"], datetime(2000, 1, 1), datetime.now())
+        failures += check("appended parts [all]", sqlite_backend, duckdb_backend, everything, 0)
+
+        # Deleted rows no longer add up, so the mirror is rebuilt
+        conn.execute("DELETE FROM twd_exchange_rates WHERE currency = 'EUR' AND id % 3 = 0")
+        conn.commit()
+        conn.close()
+        failures += check("rebuilt mirror [all]", sqlite_backend, duckdb_backend, everything, 0)
+
+        try:
+            attached_backend = DuckDBBackend(db_file, source="sqlite")
+        except Exception as e:
+            print(f"sqlite source skipped: {str(e).splitlines()[0]}", file=sys.stderr)
+        else:
+            for name, currencies in CURRENCY_SETS.items():
+                failures += check(f"sqlite source [{name}]", sqlite_backend, attached_backend,
+                                  currencies or everything, args.repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("parity ok" if not failures else f"{failures} mismatching cases", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""Plotly chart builders for the dashboard."""
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+import plotly.graph_objects as go
+from plotly.colors import qualitative
+
+import indicators
+import trading_volume
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from tracker import TWDCurrencyTracker
+
+
+def base_text(key: str, base: str, lang_manager, current_lang) -> str:
+    """Translated text with the display base filled in (its localized name, else its code)"""
+    name = lang_manager.table(current_lang).get(f'bases.{base}', base)
+    return lang_manager.get_text(key, current_lang, base=name, code=base)
+
+
+def create_trend_chart(df: "pd.DataFrame", currency: str, period: str, lang_manager, current_lang,
+                       indicator_frame: Optional["pd.DataFrame"] = None, specs: Sequence[str] = (),
+                       quote: str = 'TWD'):
+    """Create interactive trend chart of ``currency`` priced in ``quote``, with indicators on the rate axis or in panels below it"""
+    if df.empty:
+        return None
+    
+    from plotly.subplots import make_subplots
+    
+    if indicator_frame is None:
+        specs = []
+    oscillators = [spec for spec in specs if not indicators.is_overlay(spec)]
+    fig = make_subplots(
+        rows=1 + len(oscillators), cols=1, shared_xaxes=True, vertical_spacing=0.04,
+        row_heights=[0.6] + [0.4 / len(oscillators)] * len(oscillators) if oscillators else None
+    )
+    
+    # Add main trend line
+    fig.add_trace(go.Scatter(
+        x=df.index,
+        y=df['rate'],
+        mode='lines',
+        name=f'{currency}/{quote}',
+        line=dict(color='#1f77b4', width=2),
+        hovertemplate='<b>%{fullData.name}</b><br>' +
+                      'Date: %{x}<br>' +
+                      f'Rate: %{{y:.4f}} {quote}<br>' +
+                      '<extra></extra>'
+    ), row=1, col=1)
+    
+    colors = qualitative.Set2
+    for i, spec in enumerate(specs):
+        color = colors[i % len(colors)]
+        kind = indicators.parse_spec(spec)[0]
+        name = indicators.label(spec)
+        columns = indicators.columns(spec)
+        row = 1 if indicators.is_overlay(spec) else 2 + oscillators.index(spec)
+        x = indicator_frame.index
+        if kind == 'bb':
+            mid, upper, lower = (indicator_frame[column] for column in columns)
+            fig.add_trace(go.Scatter(x=x, y=upper, mode='lines', name=f'{name} upper',
+                                     line=dict(color=color, width=1), legendgroup=name), row=row, col=1)
+            fig.add_trace(go.Scatter(x=x, y=lower, mode='lines', name=f'{name} lower', fill='tonexty',
+                                     line=dict(color=color, width=1), legendgroup=name), row=row, col=1)
+            fig.add_trace(go.Scatter(x=x, y=mid, mode='lines', name=name,
+                                     line=dict(color=color, width=1, dash='dot'), legendgroup=name), row=row, col=1)
+        elif kind == 'macd':
+            line, signal, hist = (indicator_frame[column] for column in columns)
+            fig.add_trace(go.Bar(x=x, y=hist, name=f'{name} hist', marker_color=color, opacity=0.5,
+                                 legendgroup=name), row=row, col=1)
+            fig.add_trace(go.Scatter(x=x, y=line, mode='lines', name=name,
+                                     line=dict(color='#1f77b4', width=1), legendgroup=name), row=row, col=1)
+            fig.add_trace(go.Scatter(x=x, y=signal, mode='lines', name=f'{name} signal',
+                                     line=dict(color='orange', width=1), legendgroup=name), row=row, col=1)
+        else:
+            fig.add_trace(go.Scatter(
+                x=x,
+                y=indicator_frame[columns[0]],
+                mode='lines',
+                name=name,
+                line=dict(color=color, width=1, dash='dash' if row == 1 else 'solid'),
+                hovertemplate=f'{name}: %{{y:.4f}}<extra></extra>'
+            ), row=row, col=1)
+            if kind == 'rsi':
+                fig.add_hline(y=70, line=dict(color='gray', width=1, dash='dot'), row=row, col=1)
+                fig.add_hline(y=30, line=dict(color='gray', width=1, dash='dot'), row=row, col=1)
+        if row > 1:
+            fig.update_yaxes(title_text=name, row=row, col=1)
+    
+    # Customize layout
+    fig.update_layout(
+        title=f'{currency}/{quote} {base_text("trend_title", quote, lang_manager, current_lang)} - {period}',
+        xaxis_title='Date',
+        yaxis_title=f'Exchange Rate ({quote})',
+        hovermode='x unified',
+        template='plotly_white',
+        height=500 + 150 * len(oscillators),
+        showlegend=True
+    )
+    
+    # Add range selector
+    fig.update_layout(
+        xaxis=dict(
+            rangeselector=dict(
+                buttons=list([
+                    dict(count=7, label="7d", step="day", stepmode="backward"),
+                    dict(count=30, label="30d", step="day", stepmode="backward"),
+                    dict(count=90, label="3m", step="day", stepmode="backward"),
+                    dict(step="all")
+                ])
+            ),
+            # The slider would squeeze the indicator panels below it
+            rangeslider=dict(visible=not oscillators),
+            type="date"
+        )
+    )
+    
+    return fig
+
+def create_volume_chart(df: "pd.DataFrame", currency: str, period: str, lang_manager, current_lang):
+    """Create trading volume chart"""
+    if df.empty or 'volume' not in df.columns:
+        return None
+    
+    from plotly.subplots import make_subplots
+    
+    fig = make_subplots(
+        rows=2, cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.1,
+        subplot_titles=[
+            f'{currency}/TWD {base_text("trend_title", "TWD", lang_manager, current_lang)}',
+            f'{lang_manager.get_text("volume_chart_title", current_lang)}'
+        ],
+        row_heights=[0.7, 0.3]
+    )
+    
+    # Add price chart
+    fig.add_trace(
+        go.Scatter(
+            x=df.index,
+            y=df['rate'],
+            mode='lines',
+            name=f'{currency}/TWD Rate',
+            line=dict(color='#1f77b4', width=2),
+            hovertemplate='Date: %{x}<br>Rate: %{y:.4f} TWD<extra></extra>'
+        ),
+        row=1, col=1
+    )
+    
+    # Add volume chart, red where volume fell from the previous bar
+    fig.add_trace(
+        go.Bar(
+            x=df.index,
+            y=df['volume'],
+            name='Trading Volume',
+            marker_color=trading_volume.bar_colors(df['volume'].to_numpy()),
+            hovertemplate='Date: %{x}<br>Volume: %{y:,.0f} M TWD<extra></extra>'
+        ),
+        row=2, col=1
+    )
+    
+    # Update layout
+    fig.update_layout(
+        title=f'{currency} {lang_manager.get_text("trading_volume_title", current_lang)} - {period}',
+        hovermode='x unified',
+        template='plotly_white',
+        height=600,
+        showlegend=True
+    )
+    
+    # Update axes
+    fig.update_xaxes(title_text="Date", row=2, col=1)
+    fig.update_yaxes(title_text="Exchange Rate (TWD)", row=1, col=1)
+    fig.update_yaxes(title_text="Volume (M TWD)", row=2, col=1)
+    
+    return fig
+
+def create_comparison_chart(tracker: "TWDCurrencyTracker", currencies: List[str], days: int, lang_manager, current_lang,
+                            base: str = 'TWD'):
+    """Create comparison chart for multiple currencies vs ``base``"""
+    fig = go.Figure()
+    
+    colors = qualitative.Set1
+    
+    for i, currency in enumerate(currencies):
+        df = tracker.get_history_in(currency, days, base)
+        if not df.empty:
+            # Normalize to show percentage change from start
+            normalized = (df['rate'] / df['rate'].iloc[0] - 1) * 100
+            
+            fig.add_trace(go.Scatter(
+                x=df.index,
+                y=normalized,
+                mode='lines',
+                name=currency,
+                line=dict(color=colors[i % len(colors)], width=2),
+                hovertemplate=f'<b>{currency}</b><br>' +
+                              'Date: %{x}<br>' +
+                              'Change: %{y:.2f}%<br>' +
+                              '<extra></extra>'
+            ))
+    
+    fig.update_layout(
+        title=f'{base_text("comparison_title", base, lang_manager, current_lang)} (% Change)',
+        xaxis_title='Date',
+        yaxis_title='Change (%)',
+        hovermode='x unified',
+        template='plotly_white',
+        height=500
+    )
+    
+    return fig
+
+
+def create_correlation_heatmap(matrix: "pd.DataFrame", lang_manager, current_lang):
+    """Heatmap of a currency correlation matrix"""
+    if matrix.empty:
+        return None
+    
+    fig = go.Figure(go.Heatmap(
+        z=matrix.to_numpy(),
+        x=list(matrix.columns),
+        y=list(matrix.index),
+        zmin=-1,
+        zmax=1,
+        colorscale='RdBu_r',
+        # Cell labels only while they stay readable
+        texttemplate='%{z:.2f}' if len(matrix) <= 25 else None,
+        hovertemplate='%{y} / %{x}: %{z:.3f}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title=lang_manager.get_text('correlation_matrix', current_lang),
+        template='plotly_white',
+        height=max(450, 22 * len(matrix)),
+        yaxis=dict(autorange='reversed')
+    )
+    
+    return fig
+
+
+def create_rolling_correlation_chart(rolling: "pd.DataFrame", window: int, lang_manager, current_lang):
+    """Rolling pairwise correlations, one line per pair"""
+    if rolling.empty:
+        return None
+    
+    fig = go.Figure()
+    colors = qualitative.Set1
+    
+    for i, pair in enumerate(rolling.columns):
+        fig.add_trace(go.Scatter(
+            x=rolling.index,
+            y=rolling[pair],
+            mode='lines',
+            name=pair,
+            line=dict(color=colors[i % len(colors)], width=1.5),
+            hovertemplate=f'<b>{pair}</b>: %{{y:.3f}}<extra></extra>'
+        ))
+    
+    fig.update_layout(
+        title=f'{lang_manager.get_text("rolling_correlation", current_lang)} ({window}D)',
+        xaxis_title='Date',
+        yaxis=dict(title='Correlation', range=[-1, 1]),
+        hovermode='x unified',
+        template='plotly_white',
+        height=450
+    )
+    
+    return fig
+
+
+def create_forecast_chart(history: "pd.DataFrame", result: Dict, currency: str, lang_manager, current_lang,
+                          quote: str = 'TWD'):
+    """Recent rates followed by the forecast's percentile bands"""
+    import pandas as pd
+    
+    fig = go.Figure()
+    
+    if not history.empty:
+        recent = history['rate'].loc[history.index >= history.index[-1] - pd.Timedelta(days=result['days'])]
+        fig.add_trace(go.Scatter(
+            x=recent.index,
+            y=recent,
+            mode='lines',
+            name=f'{currency}/{quote}',
+            line=dict(color='#1f77b4', width=2),
+            hovertemplate=f'Rate: %{{y:.4f}} {quote}<extra></extra>'
+        ))
+    
+    dates = pd.date_range(pd.Timestamp.now().normalize(), periods=result['days'] + 1, freq='D')
+    bands = dict(zip(result['percentiles'], result['bands']))
+    # Outer band first so the inner one is drawn on top of it
+    for low, high, opacity in ((5, 95, 0.15), (25, 75, 0.3)):
+        if low in bands and high in bands:
+            fig.add_trace(go.Scatter(
+                x=dates, y=bands[high], mode='lines', line=dict(width=0), showlegend=False,
+                hoverinfo='skip'
+            ))
+            fig.add_trace(go.Scatter(
+                x=dates, y=bands[low], mode='lines', line=dict(width=0), fill='tonexty',
+                fillcolor=f'rgba(255, 127, 14, {opacity})', name=f'P{low}–P{high}',
+                hovertemplate=f'P{low}: %{{y:.4f}}<extra></extra>'
+            ))
+    if 50 in bands:
+        fig.add_trace(go.Scatter(
+            x=dates, y=bands[50], mode='lines', name='P50',
+            line=dict(color='#ff7f0e', width=2, dash='dash'),
+            hovertemplate='P50: %{y:.4f}<extra></extra>'
+        ))
+    
+    fig.update_layout(
+        title=f'{currency}/{quote} {lang_manager.get_text("forecast_title", current_lang)} - {result["days"]}D',
+        xaxis_title='Date',
+        yaxis_title=f'Exchange Rate ({quote})',
+        hovermode='x unified',
+        template='plotly_white',
+        height=450
+    )
+    
+    return fig
+
+
+def create_portfolio_chart(valuation: "pd.DataFrame", lang_manager, current_lang):
+    """Stacked TWD value per currency with the portfolio's cost basis"""
+    if valuation.empty:
+        return None
+    
+    fig = go.Figure()
+    colors = qualitative.Set2
+    
+    value_columns = [column for column in valuation.columns if column.startswith('value_')]
+    for i, column in enumerate(value_columns):
+        fig.add_trace(go.Scatter(
+            x=valuation.index,
+            y=valuation[column],
+            mode='lines',
+            name=column[len('value_'):],
+            stackgroup='value',
+            line=dict(color=colors[i % len(colors)], width=0.5),
+            hovertemplate='%{y:,.0f} TWD<extra>%{fullData.name}</extra>'
+        ))
+    
+    fig.add_trace(go.Scatter(
+        x=valuation.index,
+        y=valuation['cost'],
+        mode='lines',
+        name=lang_manager.get_text('cost_basis', current_lang),
+        line=dict(color='#444444', width=2, dash='dash'),
+        hovertemplate='%{y:,.0f} TWD<extra>%{fullData.name}</extra>'
+    ))
+    
+    fig.update_layout(
+        title=lang_manager.get_text('valuation_history', current_lang),
+        xaxis_title='Date',
+        yaxis_title=lang_manager.get_text('market_value', current_lang),
+        hovermode='x unified',
+        template='plotly_white',
+        height=450
+    )
+    
+    return fig
@@ -0,0 +1,606 @@
+"""Command-line entry point for headless jobs (no Streamlit, no Plotly).
+
+    python cli.py collect                 # save one snapshot of current rates
+    python cli.py collect --interval 300  # keep collecting every 5 minutes
+    python cli.py compact --older-than 90 # downsample old ticks to daily bars
+    python cli.py backup                  # online snapshot into backups/
+    python cli.py import history/*.csv    # bulk load historical CSV files
+    python cli.py backfill --days 3650    # fetch ten years of daily history upstream
+    python cli.py export rates.parquet    # stream history to CSV or Parquet
+    python cli.py columns --rebuild       # rebuild the memory-mapped column store
+    python cli.py mirror                  # sync the Parquet mirror of the DuckDB backend
+    python cli.py cache                   # memory held by the in-memory history cache
+    python cli.py alerts add USD level above 32.5   # notify when USD/TWD crosses 32.5
+    python cli.py alerts backtest USD level above 32 32.5 33  # how often would they have fired?
+    python cli.py indicators USD rsi:14 macd --days 30  # technical indicators on daily bars
+    python cli.py correlation --days 365 --base USD      # how the crosses co-move with USD/TWD
+    python cli.py pair EUR USD --days 90                 # EUR/USD daily closes from the TWD crosses
+    python cli.py forecast USD JPY --days 365 --quantity 1000  # Monte Carlo bands and value-at-risk
+    python cli.py portfolio add Travel USD 1000 31.2  # record a purchase of 1000 USD at 31.2 TWD
+    python cli.py portfolio show Travel --days 30     # holdings and daily TWD valuation
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import alerts
+import analytics
+import column_store
+import correlation
+import exporter
+import history_cache
+import importer
+import indicators
+import maintenance
+import metrics
+import portfolio
+from tracker import TWDCurrencyTracker
+
+logger = logging.getLogger("tracker.cli")
+
+
+def cmd_collect(args) -> int:
+    tracker = TWDCurrencyTracker()
+    while True:
+        rates = tracker.get_current_rates()
+        tracker.save_rates_to_db(rates)
+        logger.info("Saved %d rates to %s", len(rates or {}), tracker.db_file)
+        metrics.flush_textfile()
+        if not args.interval:
+            return 0
+        time.sleep(args.interval)
+
+
+def cmd_compact(args) -> int:
+    tracker = TWDCurrencyTracker()
+    result = maintenance.compact_history(
+        tracker.db_file,
+        older_than_days=args.older_than,
+        batch_rows=args.batch_rows,
+        pause=args.pause,
+        vacuum_pages=args.vacuum_pages,
+        full=args.full,
+        convert_auto_vacuum=args.convert_auto_vacuum
+    )
+    logger.info(
+        "Compacted %d rows older than %s into %d daily bars in %d batches; "
+        "freed %d pages, size %.1f MB -> %.1f MB (%.1fs)",
+        result["deleted"], result["cutoff"], result["bars"], result["windows"], result["pages_freed"],
+        result["size_before"] / 1e6, result["size_after"] / 1e6, result["seconds"]
+    )
+    return 0
+
+
+def cmd_backup(args) -> int:
+    tracker = TWDCurrencyTracker()
+
+    def progress(status, remaining, total):
+        logger.debug("Backup progress: %d/%d pages copied", total - remaining, total)
+
+    dest = maintenance.backup_database(
+        tracker.db_file,
+        dest=args.dest or maintenance.snapshot_path(tracker.db_file, args.dir),
+        pages_per_step=args.pages,
+        sleep=args.sleep,
+        verify=args.verify,
+        progress=progress
+    )
+    logger.info("Snapshot of %s written to %s", tracker.db_file, dest)
+    return 0
+
+
+def cmd_snapshots(args) -> int:
+    tracker = TWDCurrencyTracker()
+    for snapshot in maintenance.list_snapshots(tracker.db_file, args.dir):
+        print(snapshot)
+    return 0
+
+
+def cmd_restore(args) -> int:
+    tracker = TWDCurrencyTracker()
+    previous = maintenance.restore_database(tracker.db_file, args.snapshot, safety_backup=not args.no_backup)
+    if previous:
+        logger.info("Previous database saved to %s", previous)
+    logger.info("Restored %s from %s", tracker.db_file, args.snapshot)
+    return 0
+
+
+def cmd_reset(args) -> int:
+    tracker = TWDCurrencyTracker()
+    previous = maintenance.reset_database(tracker.db_file, safety_backup=not args.no_backup)
+    if previous:
+        logger.info("Previous database saved to %s", previous)
+    logger.info("Reset %s to an empty database", tracker.db_file)
+    return 0
+
+
+def cmd_import(args) -> int:
+    tracker = TWDCurrencyTracker()
+    currencies = [code.strip() for code in args.currencies.split(",")] if args.currencies else None
+    try:
+        stats = importer.import_csv(
+            tracker.db_file,
+            args.files,
+            fmt=args.format,
+            chunk_rows=args.chunk_rows,
+            currencies=currencies,
+            replace=args.replace,
+            encoding=args.encoding
+        )
+    except (OSError, UnicodeDecodeError, importer.CSVFormatError) as e:
+        logger.error("Import failed: %s", e)
+        return 1
+    logger.info(
+        "Read %d rows from %d files: %d written, %d duplicates, %d invalid, %d skipped (%.1fs, %.0f rows/s)",
+        stats["read"], stats["files"], stats["inserted"], stats["duplicates"], stats["invalid"],
+        stats["skipped"], stats["seconds"], stats["read"] / stats["seconds"] if stats["seconds"] else 0
+    )
+    return 0
+
+
+def cmd_backfill(args) -> int:
+    # asyncio alone costs more than the rest of the CLI, so it loads only here
+    import backfill
+
+    tracker = TWDCurrencyTracker()
+    end = date.fromisoformat(args.end) if args.end else date.today() - timedelta(days=1)
+    start = date.fromisoformat(args.start) if args.start else end - timedelta(days=args.days - 1)
+    if start > end:
+        logger.error("Start date %s is after end date %s", start, end)
+        return 2
+    stats = backfill.run_backfill(
+        tracker, start, end,
+        chunk_days=args.chunk_days or backfill.DEFAULT_CHUNK_DAYS,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        retries=args.retries,
+        backoff=args.backoff,
+        replace=args.replace
+    )
+    logger.info(
+        "Backfilled %s..%s: %d chunks fetched (%d with missing days), %d already done, %d failed; "
+        "%d rows written, %d duplicates; %d requests, %d retries (%.1fs)",
+        start, end, stats["fetched"], stats["incomplete"], stats["checkpointed"], stats["failed"],
+        stats["inserted"], stats["duplicates"], stats["requests"], stats["retries"], stats["seconds"]
+    )
+    return 1 if stats["failed"] or stats["incomplete"] else 0
+
+
+def cmd_export(args) -> int:
+    tracker = TWDCurrencyTracker()
+    currencies = [code.strip() for code in args.currencies.split(",")] if args.currencies else None
+    start = date.fromisoformat(args.start) if args.start else None
+    end = date.fromisoformat(args.end) if args.end else None
+    if args.dest == "-":
+        if args.format == "parquet":
+            logger.error("Parquet cannot be written to stdout")
+            return 2
+        chunks = exporter.iter_history(tracker.db_file, currencies, start, end, args.chunk_rows)
+        try:
+            rows = exporter.write_csv(chunks, sys.stdout)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # The reader (e.g. head) stopped early; silence the flush at exit
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return 0
+        logger.info("Exported %d rows", rows)
+        return 0
+    try:
+        result = exporter.export_history(tracker.db_file, args.dest, args.format, currencies, start, end,
+                                         args.chunk_rows)
+    except (OSError, RuntimeError) as e:
+        logger.error("Export failed: %s", e)
+        return 1
+    logger.info("Exported %d rows to %s (%s, %.1f MB, %.1fs)", result["rows"], args.dest, result["format"],
+                result["bytes"] / 1e6, result["seconds"])
+    return 0
+
+
+def cmd_columns(args) -> int:
+    tracker = TWDCurrencyTracker()
+    store = column_store.ColumnStore(args.dir, tracker.db_file) if args.dir else tracker.column_store
+    if store is None:
+        logger.error("No column store configured; set TRACKER_COLUMN_STORE or pass --dir")
+        return 2
+    result = store.rebuild() if args.rebuild else store.sync()
+    logger.info("%s %s: %d rows appended, %d currencies rebuilt (%.1fs)", "Rebuilt" if args.rebuild else "Synced",
+                store.directory, result["appended"], result["rebuilt"], result["seconds"])
+    for currency, rows in store.info().items():
+        print(f"{currency}\t{rows}")
+    return 0
+
+
+def cmd_mirror(args) -> int:
+    tracker = TWDCurrencyTracker()
+    mirror_dir = args.dir or analytics.mirror_dir_from_env(tracker.db_file)
+    started = time.perf_counter()
+    try:
+        rows = analytics.sync_mirror(tracker.db_file, mirror_dir)
+    except (ImportError, RuntimeError) as e:
+        logger.error("Mirror sync failed: %s", e)
+        return 1
+    logger.info("Synced Parquet mirror %s: %d rows (%.1fs)", mirror_dir, rows, time.perf_counter() - started)
+    return 0
+
+
+def cmd_cache(args) -> int:
+    tracker = TWDCurrencyTracker()
+    cache = history_cache.shared(tracker.db_file)
+    footprint = cache.footprint()
+    for key, value in footprint.items():
+        print(f"{key}\t{value}")
+    if not cache.length:
+        return 0
+    # Scale the observed snapshot rate to --days of every currency in the registry
+    span_days = max((cache.index[cache.length - 1] - cache.index[0]) / 86400e9, 1.0)
+    timestamps = int(cache.length / span_days * args.days)
+    count = len(tracker.reference_rates)
+    projected = history_cache.estimate(timestamps, count, cache.rates.itemsize)
+    logger.info("History cache: %.1f MB for %d rows (%.1f MB as float64 frames); "
+                "%d days x %d currencies at the same snapshot rate: about %.0f MB",
+                footprint["total_bytes"] / 1e6, footprint["rows"], footprint["float64_frames_bytes"] / 1e6,
+                args.days, count, projected / 1e6)
+    return 0
+
+
+def cmd_alerts(args) -> int:
+    tracker = TWDCurrencyTracker()
+    if args.action == "add":
+        window = alerts.parse_window(args.window) if args.window else None
+        alert_id = alerts.add_alert(tracker.db_file, args.currency, args.kind, args.direction, args.threshold,
+                                    window_seconds=window, note=args.note)
+        logger.info("Added alert %d", alert_id)
+    elif args.action == "remove":
+        if not alerts.remove_alert(tracker.db_file, args.id):
+            logger.error("No active alert with id %d", args.id)
+            return 1
+        logger.info("Removed alert %d", args.id)
+    elif args.action == "backtest":
+        window = alerts.parse_window(args.window) if args.window else None
+        rules = [{"currency": args.currency.upper(), "kind": args.kind, "direction": args.direction,
+                  "threshold": threshold, "window_seconds": window or alerts.DEFAULT_WINDOW_SECONDS}
+                 for threshold in args.thresholds]
+        for result in alerts.backtest(tracker, args.currency.upper(), rules, days=args.days):
+            first = str(result["first"])[:19].replace("T", " ") if result["first"] is not None else "-"
+            last = str(result["last"])[:19].replace("T", " ") if result["last"] is not None else "-"
+            print(f"{alerts.describe(result)}\t{result['hits']} hits\tfirst {first}\tlast {last}")
+    elif args.action == "events":
+        for event in alerts.recent_events(tracker.db_file, args.limit):
+            print(f"{event['triggered_at']}\t{event['alert_id']}\t{event['currency']}\t{event['kind']}\t"
+                  f"{event['direction']}\t{event['threshold']}\t{event['previous']:.6g} -> {event['value']:.6g}")
+    else:
+        for alert in alerts.list_alerts(tracker.db_file, include_inactive=args.all):
+            state = "" if alert["active"] else "\t(removed)"
+            print(f"{alert['id']}\t{alerts.describe(alert)}\tfired {alert['trigger_count']}x, "
+                  f"last {alert['last_triggered_at'] or '-'}{state}")
+    return 0
+
+
+def cmd_indicators(args) -> int:
+    tracker = TWDCurrencyTracker()
+    try:
+        specs = [indicators.format_spec(spec) for spec in args.specs]
+    except ValueError as e:
+        logger.error("%s", e)
+        return 1
+    frame = tracker.get_indicators(args.currency.upper(), args.days, specs, args.resolution)
+    print(frame.round(6).to_string())
+    return 0
+
+
+def cmd_correlation(args) -> int:
+    tracker = TWDCurrencyTracker()
+    currencies = [currency.upper() for currency in args.currencies] or tracker.popular_currencies
+    if args.base and args.base.upper() not in currencies:
+        currencies = [args.base.upper(), *currencies]
+    rets = correlation.returns(tracker.get_daily_closes(currencies, args.days + args.window))
+    matrix = correlation.matrix(rets.iloc[-args.days:])
+    if not args.base:
+        print(matrix.round(2).to_string())
+        return 0
+    base = args.base.upper()
+    latest = correlation.rolling(rets, [(base, currency) for currency in currencies if currency != base],
+                                 args.window).iloc[-1]
+    print(f"currency\t{args.days}d\tlast {args.window}d")
+    for pair, value in sorted(latest.items(), key=lambda item: -abs(matrix.loc[base, item[0].split("/")[1]])):
+        currency = pair.split("/")[1]
+        print(f"{currency}\t{matrix.loc[base, currency]:+.3f}\t{value:+.3f}")
+    return 0
+
+
+def cmd_pair(args) -> int:
+    tracker = TWDCurrencyTracker()
+    base, quote = args.base.upper(), args.quote.upper()
+    if base == quote:
+        logger.error("Base and quote must differ")
+        return 1
+    history = tracker.get_pair_history(base, quote, args.days)
+    closes = history["rate"].resample("D").last().dropna()
+    if closes.empty:
+        logger.error("No history for %s/%s", base, quote)
+        return 1
+    print(f"date\t{base}/{quote}")
+    for day, rate in closes.items():
+        print(f"{day:%Y-%m-%d}\t{rate:.6f}")
+    first, last = closes.iloc[0], closes.iloc[-1]
+    logger.info("%s/%s over %d days: %.6f -> %.6f (%+.2f%%), low %.6f, high %.6f", base, quote, args.days,
+                first, last, (last / first - 1) * 100, closes.min(), closes.max())
+    return 0
+
+
+def cmd_forecast(args) -> int:
+    # Loaded here so other commands do not pay for the process pool machinery
+    import forecast
+
+    tracker = TWDCurrencyTracker()
+    currencies = [currency.upper() for currency in args.currencies] or tracker.popular_currencies
+    inputs = forecast.calibrate(tracker, currencies)
+    horizons = sorted({*forecast.HORIZONS, args.days} & set(range(1, args.days + 1)))
+    results = forecast.forecast(inputs, args.days, paths=args.paths, quantity=args.quantity,
+                                confidence=args.confidence, horizons=horizons, seed=args.seed,
+                                workers=args.workers)
+    percentiles = forecast.PERCENTILES
+    print("currency\trate\tvol/day\tsource\t" + "\t".join(f"P{p}@{args.days}d" for p in percentiles) + "\t"
+          + "\t".join(f"VaR{h}d" for h in horizons))
+    for currency, result in results.items():
+        print(f"{currency}\t{result['rate']:.4f}\t{result['volatility'] * 100:.2f}%\t{result['source']}\t"
+              + "\t".join(f"{band[-1]:.4f}" for band in result["bands"]) + "\t"
+              + "\t".join(f"{risk['var']:,.0f}" for risk in result["risk"]))
+    logger.info("Simulated %d paths x %d days for %d currencies; VaR at %.0f%% for %g units each",
+                args.paths, args.days, len(results), args.confidence * 100, args.quantity)
+    return 0
+
+
+def _find_portfolio(db_file: str, name: str):
+    for entry in portfolio.list_portfolios(db_file):
+        if entry["name"] == name:
+            return entry
+    return None
+
+
+def cmd_portfolio(args) -> int:
+    tracker = TWDCurrencyTracker()
+    if args.action == "list":
+        for entry in portfolio.list_portfolios(tracker.db_file):
+            print(f"{entry['id']}\t{entry['name']}\tcreated {entry['created_at']}")
+        return 0
+    if args.action == "create":
+        try:
+            portfolio_id = portfolio.create_portfolio(tracker.db_file, args.name)
+        except ValueError as e:
+            logger.error("%s", e)
+            return 1
+        logger.info("Created portfolio %d", portfolio_id)
+        return 0
+
+    entry = _find_portfolio(tracker.db_file, args.name)
+    if entry is None:
+        logger.error("No portfolio named %r", args.name)
+        return 1
+    if args.action == "add":
+        try:
+            tx_id = portfolio.add_transaction(tracker.db_file, entry["id"], args.currency, args.quantity, args.rate,
+                                              timestamp=args.date and f"{args.date} 00:00:00", fee=args.fee,
+                                              note=args.note)
+        except ValueError as e:
+            logger.error("%s", e)
+            return 1
+        logger.info("Added transaction %d", tx_id)
+    elif args.action == "remove":
+        try:
+            removed = portfolio.delete_transaction(tracker.db_file, args.id)
+        except ValueError as e:
+            logger.error("%s", e)
+            return 1
+        if not removed:
+            logger.error("No transaction with id %d", args.id)
+            return 1
+        logger.info("Removed transaction %d", args.id)
+    else:
+        for tx in portfolio.transactions(tracker.db_file, entry["id"]):
+            print(f"{tx['id']}\t{tx['timestamp']}\t{tx['currency']}\t{tx['quantity']:+,.2f} @ {tx['rate']:.4f}"
+                  f"\tfee {tx['fee']:,.2f}")
+        print()
+        for holding in portfolio.positions(tracker.db_file, entry["id"]):
+            print(f"{holding['currency']}\t{holding['quantity']:,.2f}\tavg {holding['avg_cost']:.4f}\t"
+                  f"rate {holding['rate']:.4f}\tvalue {holding['value']:,.0f}\t"
+                  f"unrealized {holding['unrealized']:+,.0f}\trealized {holding['realized']:+,.0f}")
+        history = portfolio.valuation(tracker.db_file, entry["id"], start=date.today() - timedelta(days=args.days))
+        if not history.empty:
+            print()
+            print(history[["value", "cost", "unrealized", "realized", "pnl"]].round(2).to_string())
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Taiwan Bank exchange rate tracker jobs")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log debug output")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    collect = subparsers.add_parser("collect", help="Fetch current rates and save them to the database")
+    collect.add_argument("--interval", type=float, default=0,
+                         help="Repeat every N seconds instead of collecting once")
+    collect.set_defaults(func=cmd_collect)
+
+    compact = subparsers.add_parser("compact", help="Downsample old tick-level rows into daily bars")
+    compact.add_argument("--older-than", type=int, default=maintenance.DEFAULT_RETENTION_DAYS, metavar="DAYS",
+                         help="Keep tick-level rows for this many days (default: %(default)s)")
+    compact.add_argument("--batch-rows", type=int, default=5000,
+                         help="Approximate raw rows rewritten per transaction")
+    compact.add_argument("--pause", type=float, default=0.05,
+                         help="Seconds to yield the write lock between batches")
+    compact.add_argument("--vacuum-pages", type=int, default=1000,
+                         help="Pages released per incremental VACUUM step")
+    compact.add_argument("--full", action="store_true",
+                         help="Ignore the checkpoint and rescan all expired days")
+    compact.add_argument("--convert-auto-vacuum", action="store_true",
+                         help="One-time full VACUUM to enable incremental vacuum on an old database")
+    compact.set_defaults(func=cmd_compact)
+
+    backup = subparsers.add_parser("backup", help="Take a consistent online snapshot of the database")
+    backup.add_argument("--dest", help="Snapshot file (default: timestamped file in --dir)")
+    backup.add_argument("--dir", default=maintenance.DEFAULT_BACKUP_DIR, help="Snapshot directory")
+    backup.add_argument("--pages", type=int, default=1024, help="Pages copied per step")
+    backup.add_argument("--sleep", type=float, default=0.005, help="Seconds between steps")
+    backup.add_argument("--verify", action="store_true", help="Run PRAGMA quick_check on the snapshot")
+    backup.set_defaults(func=cmd_backup)
+
+    snapshots = subparsers.add_parser("snapshots", help="List snapshots, newest first")
+    snapshots.add_argument("--dir", default=maintenance.DEFAULT_BACKUP_DIR, help="Snapshot directory")
+    snapshots.set_defaults(func=cmd_snapshots)
+
+    restore = subparsers.add_parser("restore", help="Replace the live database with a snapshot")
+    restore.add_argument("snapshot", help="Snapshot file to restore")
+    restore.add_argument("--no-backup", action="store_true", help="Skip the safety snapshot of the current data")
+    restore.set_defaults(func=cmd_restore)
+
+    reset = subparsers.add_parser("reset", help="Atomically replace the database with an empty one")
+    reset.add_argument("--no-backup", action="store_true", help="Skip the safety snapshot of the current data")
+    reset.set_defaults(func=cmd_reset)
+
+    load = subparsers.add_parser("import", help="Bulk load historical rates from CSV files")
+    load.add_argument("files", nargs="+", help="CSV files (optionally .gz)")
+    load.add_argument("--format", choices=importer.FORMATS, default="auto",
+                      help="bot: Bank of Taiwan download, generic: date,currency,rate[,volume]")
+    load.add_argument("--chunk-rows", type=int, default=50000, help="Rows written per transaction")
+    load.add_argument("--currencies", help="Comma separated currency codes to keep (default: all)")
+    load.add_argument("--replace", action="store_true", help="Overwrite existing rows with the same timestamp")
+    load.add_argument("--encoding", default="utf-8-sig", help="File encoding (default: %(default)s)")
+    load.set_defaults(func=cmd_import)
+
+    fill = subparsers.add_parser("backfill", help="Fetch daily history from the upstream timeseries endpoints")
+    fill.add_argument("--start", help="First day, YYYY-MM-DD (default: --days before --end)")
+    fill.add_argument("--end", help="Last day, YYYY-MM-DD (default: yesterday)")
+    fill.add_argument("--days", type=int, default=365, help="Days to fetch when --start is not given")
+    fill.add_argument("--chunk-days", type=int, help="Days per request (default: 90)")
+    fill.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+    fill.add_argument("--rate", type=float, default=2.0, help="Requests per second (0 for no limit)")
+    fill.add_argument("--retries", type=int, default=4, help="Retries per source for transient failures")
+    fill.add_argument("--backoff", type=float, default=0.5, help="Initial retry delay in seconds")
+    fill.add_argument("--replace", action="store_true", help="Overwrite existing rows for the same day")
+    fill.set_defaults(func=cmd_backfill)
+
+    export = subparsers.add_parser("export", help="Stream history to a CSV or Parquet file")
+    export.add_argument("dest", help="Output file; .parquet selects Parquet, - writes CSV to stdout")
+    export.add_argument("--format", choices=exporter.FORMATS, help="Override the format implied by dest")
+    export.add_argument("--currencies", help="Comma separated currency codes (default: all)")
+    export.add_argument("--start", help="First day, YYYY-MM-DD")
+    export.add_argument("--end", help="Last day, YYYY-MM-DD (inclusive)")
+    export.add_argument("--chunk-rows", type=int, default=50000, help="Rows fetched and written per chunk")
+    export.set_defaults(func=cmd_export)
+
+    columns = subparsers.add_parser("columns", help="Sync the memory-mapped column store and list its contents")
+    columns.add_argument("--dir", help="Store directory (default: TRACKER_COLUMN_STORE)")
+    columns.add_argument("--rebuild", action="store_true", help="Rebuild every currency from SQLite")
+    columns.set_defaults(func=cmd_columns)
+
+    mirror = subparsers.add_parser("mirror", help="Sync the Parquet mirror read by the DuckDB analytics backend")
+    mirror.add_argument("--dir", help="Mirror directory (default: TRACKER_DUCKDB_MIRROR or <db>.mirror)")
+    mirror.set_defaults(func=cmd_mirror)
+
+    cache = subparsers.add_parser("cache", help="Load the in-memory history cache and report its footprint")
+    cache.add_argument("--days", type=int, default=3650,
+                       help="History length for the all-currency projection (default: %(default)s)")
+    cache.set_defaults(func=cmd_cache)
+
+    alert = subparsers.add_parser("alerts", help="Manage rate alerts checked on every collected snapshot")
+    actions = alert.add_subparsers(dest="action")
+    listing = actions.add_parser("list", help="List alerts (default action)")
+    listing.add_argument("--all", action="store_true", help="Include removed alerts")
+    add = actions.add_parser("add", help="Add an alert")
+    add.add_argument("currency", help="Currency code, e.g. USD")
+    add.add_argument("kind", choices=alerts.KINDS,
+                     help="level: the rate, change: %% change over --window, volatility: std over --window")
+    add.add_argument("direction", choices=alerts.DIRECTIONS, help="Fire when crossing upwards or downwards")
+    add.add_argument("threshold", type=float, help="Rate, percent change (e.g. -1.5) or standard deviation")
+    add.add_argument("--window", help="Look-back for change/volatility, e.g. 90m, 24h, 7d (default: 1d)")
+    add.add_argument("--note", help="Free text shown with the alert")
+    remove = actions.add_parser("remove", help="Remove an alert")
+    remove.add_argument("id", type=int)
+    test = actions.add_parser("backtest", help="Count how often rules would have fired over stored history")
+    test.add_argument("currency", help="Currency code, e.g. USD")
+    test.add_argument("kind", choices=alerts.KINDS)
+    test.add_argument("direction", choices=alerts.DIRECTIONS)
+    test.add_argument("thresholds", type=float, nargs="+", help="One or more thresholds to compare")
+    test.add_argument("--window", help="Look-back for change/volatility (default: 1d)")
+    test.add_argument("--days", type=int, default=3650, help="History to replay (default: %(default)s)")
+    events = actions.add_parser("events", help="Show recently fired alerts")
+    events.add_argument("--limit", type=int, default=50)
+    alert.set_defaults(func=cmd_alerts, action="list", all=False)
+
+    indicator = subparsers.add_parser("indicators", help="Print technical indicators of a currency")
+    indicator.add_argument("currency", help="Currency code, e.g. USD")
+    indicator.add_argument("specs", nargs="+", metavar="SPEC",
+                           help="sma:N, ema:N, bb:N:K, rsi:N, macd:FAST:SLOW:SIGNAL or atr:N; "
+                                "omitted parameters take the usual defaults")
+    indicator.add_argument("--resolution", choices=list(indicators.RESOLUTIONS),
+                           default=indicators.DEFAULT_RESOLUTION, help="Bar width (default: %(default)s)")
+    indicator.add_argument("--days", type=int, default=30, help="Bars to print (default: %(default)s days)")
+    indicator.set_defaults(func=cmd_indicators)
+
+    corr = subparsers.add_parser("correlation", help="Correlation of daily returns across currencies")
+    corr.add_argument("currencies", nargs="*", help="Currencies to include (default: all tracked)")
+    corr.add_argument("--days", type=int, default=365, help="Period of daily returns (default: %(default)s)")
+    corr.add_argument("--base", help="List every currency against this one, with its latest rolling correlation")
+    corr.add_argument("--window", type=int, default=90, help="Rolling window in days (default: %(default)s)")
+    corr.set_defaults(func=cmd_correlation)
+
+    pair = subparsers.add_parser("pair", help="Daily closes of a cross pair, derived from the TWD rates")
+    pair.add_argument("base", help="Currency priced, e.g. EUR")
+    pair.add_argument("quote", help="Currency it is priced in, e.g. USD")
+    pair.add_argument("--days", type=int, default=30, help="Period in days (default: %(default)s)")
+    pair.set_defaults(func=cmd_pair)
+
+    fc = subparsers.add_parser("forecast", help="Monte Carlo forecast bands and value-at-risk")
+    fc.add_argument("currencies", nargs="*", help="Currencies to forecast (default: all tracked)")
+    fc.add_argument("--days", type=int, default=365, help="Horizon in days (default: %(default)s)")
+    fc.add_argument("--paths", type=int, default=10000, help="Simulated paths per currency (default: %(default)s)")
+    fc.add_argument("--quantity", type=float, default=1000, help="Units held for VaR (default: %(default)s)")
+    fc.add_argument("--confidence", type=float, default=0.95, help="VaR confidence (default: %(default)s)")
+    fc.add_argument("--seed", type=int, help="Seed for reproducible paths")
+    fc.add_argument("--workers", type=int, help="Processes to spread currencies over "
+                                                "(default: TRACKER_FORECAST_WORKERS or in-process)")
+    fc.set_defaults(func=cmd_forecast)
+
+    book = subparsers.add_parser("portfolio", help="Track foreign-currency holdings valued in TWD")
+    actions = book.add_subparsers(dest="action")
+    actions.add_parser("list", help="List portfolios (default action)")
+    create = actions.add_parser("create", help="Create a portfolio")
+    create.add_argument("name")
+    add = actions.add_parser("add", help="Record a buy (positive quantity) or sell (negative quantity)")
+    add.add_argument("name", help="Portfolio name")
+    add.add_argument("currency", help="Currency code, e.g. USD")
+    add.add_argument("quantity", type=float, help="Units bought, negative for a sale")
+    add.add_argument("rate", type=float, help="TWD per unit")
+    add.add_argument("--date", type=date.fromisoformat, help="Trade date YYYY-MM-DD (default: now)")
+    add.add_argument("--fee", type=float, default=0.0, help="Fee in TWD")
+    add.add_argument("--note", help="Free text stored with the transaction")
+    remove = actions.add_parser("remove", help="Delete a transaction")
+    remove.add_argument("name", help="Portfolio name")
+    remove.add_argument("id", type=int)
+    show = actions.add_parser("show", help="Transactions, holdings and daily valuation")
+    show.add_argument("name", help="Portfolio name")
+    show.add_argument("--days", type=int, default=30, help="Valuation history to print (default: %(default)s)")
+    book.set_defaults(func=cmd_portfolio, action="list")
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    metrics.setup_from_env()
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
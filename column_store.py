@@ -0,0 +1,301 @@
+"""Optional columnar copy of twd_exchange_rates as memory-mapped NumPy arrays.
+
+Set TRACKER_COLUMN_STORE to a directory to enable it. Each currency gets a
+subdirectory with three flat little-endian files in time order: ``ts``
+(int64 nanoseconds), ``rate`` and ``volume`` (float64, NaN when unknown).
+History reads become a binary search plus read-only memmap slices, so
+``get_historical_data`` no longer converts rows one by one through
+``read_sql_query``.
+
+SQLite stays the source of truth. Ingest paths call :meth:`ColumnStore.sync`
+after committing. It appends rows whose id is above the last synced id, and
+rebuilds a currency from SQLite when new rows land before its last stored
+timestamp (imported or compacted history). Destructive maintenance calls
+:meth:`ColumnStore.rebuild`. Rebuilt currencies are renamed into place, so
+readers see either the old or the new arrays, never a mix.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import groupby
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+FIELDS = (("ts", "<i8"), ("rate", "<f8"), ("volume", "<f8"))
+STATE_FILE = "state.json"
+LOCK_FILE = ".lock"
+
+# Rows read from SQLite per batch while rebuilding a currency
+REBUILD_CHUNK_ROWS = 200000
+
+
+def _to_arrays(rows: Sequence[Tuple]) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Convert (timestamp, rate, volume) rows into the stored column dtypes"""
+    import numpy as np
+
+    timestamps, rates, volumes = zip(*rows)
+    ts = np.array(timestamps, dtype="datetime64[ns]").view("<i8")
+    rate = np.array(rates, dtype="<f8")
+    volume = np.array([np.nan if v is None else v for v in volumes], dtype="<f8")
+    return ts, rate, volume
+
+
+@contextmanager
+def exclusive_lock(path: str, timeout: float = 60):
+    """Serialise writers across processes with an exclusive lock on a small SQLite file"""
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    try:
+        conn.execute("BEGIN EXCLUSIVE")
+        yield
+    finally:
+        conn.close()
+
+
+@contextmanager
+def shared_lock(path: str, timeout: float = 60):
+    """Let readers in together while keeping ``exclusive_lock`` holders out
+
+    A read inside a deferred transaction takes SQLite's SHARED lock, which
+    other readers share and an exclusive transaction waits for.
+    """
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        yield
+    finally:
+        conn.close()
+
+
+class ColumnStore:
+    """Per-currency memory-mapped columns mirroring one SQLite database"""
+
+    def __init__(self, directory: str, db_file: str):
+        self.directory = directory
+        self.db_file = db_file
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, db_file: str) -> Optional["ColumnStore"]:
+        """The store configured by TRACKER_COLUMN_STORE, or None when disabled"""
+        directory = os.environ.get("TRACKER_COLUMN_STORE")
+        return cls(directory, db_file) if directory else None
+
+    def _currency_dir(self, currency: str) -> str:
+        # Codes come from our own table, but keep them from escaping the directory
+        return os.path.join(self.directory, "".join(ch for ch in currency.upper() if ch.isalnum()))
+
+    def _read_state(self) -> Dict:
+        try:
+            with open(os.path.join(self.directory, STATE_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_state(self, state: Dict):
+        path = os.path.join(self.directory, STATE_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _locked(self):
+        return exclusive_lock(os.path.join(self.directory, LOCK_FILE))
+
+    def columns(self, currency: str) -> Optional[Tuple["np.ndarray", "np.ndarray", "np.ndarray"]]:
+        """Read-only memmaps of (ts, rate, volume), or None if the currency is not stored"""
+        import numpy as np
+
+        directory = self._currency_dir(currency)
+        try:
+            sizes = [os.path.getsize(os.path.join(directory, name)) // 8 for name, _ in FIELDS]
+        except OSError:
+            return None
+        # An append in progress may have extended one file before the others
+        length = min(sizes)
+        if length == 0:
+            return None
+        try:
+            return tuple(np.memmap(os.path.join(directory, name), dtype=dtype, mode="r", shape=(length,))
+                         for name, dtype in FIELDS)
+        except (OSError, ValueError):
+            return None
+
+    def slice(self, currency: str, start: datetime, end: datetime
+              ) -> Optional[Tuple["np.ndarray", "np.ndarray", "np.ndarray"]]:
+        """Zero-copy views of the rows with start <= timestamp < end"""
+        import numpy as np
+
+        columns = self.columns(currency)
+        if columns is None:
+            return None
+        ts = columns[0]
+        bounds = np.array([start, end], dtype="datetime64[ns]").view("<i8")
+        lo = int(np.searchsorted(ts, bounds[0], side="left"))
+        hi = int(np.searchsorted(ts, bounds[1], side="left"))
+        return tuple(column[lo:hi] for column in columns)
+
+    def frame(self, currency: str, start: datetime, end: datetime) -> Optional["pd.DataFrame"]:
+        """History as a DataFrame backed by the memmaps; None when the store cannot answer"""
+        import pandas as pd
+
+        if not self._read_state():
+            # First use on an existing database: build the store once
+            self.sync()
+        with metrics.DB_OPERATION_SECONDS.time(operation='columnar_query'):
+            views = self.slice(currency, start, end)
+            if views is None:
+                return None
+            ts, rate, volume = views
+            index = pd.DatetimeIndex(ts.view("datetime64[ns]"), name="timestamp", copy=False)
+            return pd.DataFrame({"rate": rate, "volume": volume}, index=index, copy=False)
+
+    def _append(self, currency: str, ts: "np.ndarray", rate: "np.ndarray", volume: "np.ndarray",
+                length: int):
+        """Append to the column files after trimming any partial previous append"""
+        directory = self._currency_dir(currency)
+        os.makedirs(directory, exist_ok=True)
+        for (name, _), values in zip(FIELDS, (ts, rate, volume)):
+            with open(os.path.join(directory, name), "ab") as f:
+                f.truncate(length * 8)
+                f.write(values.tobytes())
+
+    def _overwrite_last(self, currency: str, length: int, rate: float, volume: float):
+        """Replace the newest row in place (INSERT OR REPLACE of the same second)"""
+        import numpy as np
+
+        directory = self._currency_dir(currency)
+        for name, value in (("rate", rate), ("volume", volume)):
+            column = np.memmap(os.path.join(directory, name), dtype="<f8", mode="r+", shape=(length,))
+            column[-1] = value
+            column.flush()
+
+    def _rebuild_currency(self, conn: sqlite3.Connection, currency: str):
+        """Rewrite one currency from SQLite into a fresh directory and swap it in"""
+        directory = self._currency_dir(currency)
+        building = f"{directory}.building"
+        shutil.rmtree(building, ignore_errors=True)
+        os.makedirs(building)
+        files = [open(os.path.join(building, name), "wb") for name, _ in FIELDS]
+        try:
+            cursor = conn.execute(
+                "SELECT timestamp, rate, volume FROM twd_exchange_rates WHERE currency = ? ORDER BY timestamp",
+                (currency,)
+            )
+            while True:
+                rows = cursor.fetchmany(REBUILD_CHUNK_ROWS)
+                if not rows:
+                    break
+                for f, values in zip(files, _to_arrays(rows)):
+                    f.write(values.tobytes())
+        finally:
+            for f in files:
+                f.close()
+        old = f"{directory}.old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(directory):
+            os.rename(directory, old)
+        os.rename(building, directory)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def rebuild(self) -> Dict:
+        """Rebuild every currency from SQLite (after reset, restore or an upsert import)"""
+        started = time.perf_counter()
+        with self._locked():
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            try:
+                conn.execute("BEGIN")
+                result = self._rebuild_all(conn)
+            finally:
+                conn.close()
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+    def _rebuild_all(self, conn: sqlite3.Connection) -> Dict:
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM twd_exchange_rates").fetchone()[0]
+        currencies = [row[0] for row in conn.execute("SELECT DISTINCT currency FROM twd_exchange_rates")]
+        for currency in currencies:
+            self._rebuild_currency(conn, currency)
+        # Drop currencies that no longer exist in SQLite
+        keep = {os.path.basename(self._currency_dir(currency)) for currency in currencies}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path) and name not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+        self._write_state({"db": os.path.abspath(self.db_file), "last_id": max_id})
+        return {"appended": 0, "rebuilt": len(currencies), "full": True}
+
+    def sync(self) -> Dict:
+        """Bring the store up to date with rows committed to SQLite since the last sync"""
+        started = time.perf_counter()
+        result = {"appended": 0, "rebuilt": 0, "full": False}
+        with self._locked():
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            try:
+                # One read transaction, so the id watermark and the rows come from the same snapshot
+                conn.execute("BEGIN")
+                state = self._read_state()
+                max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM twd_exchange_rates").fetchone()[0]
+                last_id = state.get("last_id") if state.get("db") == os.path.abspath(self.db_file) else None
+                if last_id is None or max_id < last_id:
+                    # New store, another database, or ids went backwards (reset/restore)
+                    result = self._rebuild_all(conn)
+                elif max_id > last_id:
+                    cursor = conn.execute(
+                        "SELECT currency, timestamp, rate, volume FROM twd_exchange_rates "
+                        "WHERE id > ? AND id <= ? ORDER BY currency, timestamp",
+                        (last_id, max_id)
+                    )
+                    for currency, group in groupby(cursor, key=lambda row: row[0]):
+                        added = self._sync_currency(conn, currency, [row[1:] for row in group])
+                        if added is None:
+                            result["rebuilt"] += 1
+                        else:
+                            result["appended"] += added
+                    self._write_state({"db": os.path.abspath(self.db_file), "last_id": max_id})
+            finally:
+                conn.close()
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+    def _sync_currency(self, conn: sqlite3.Connection, currency: str, rows: List[Tuple]) -> Optional[int]:
+        """Append new rows of one currency; returns None when it had to be rebuilt instead"""
+        ts, rate, volume = _to_arrays(rows)
+        columns = self.columns(currency)
+        length = 0 if columns is None else len(columns[0])
+        if length:
+            last_ts = int(columns[0][-1])
+            if ts[0] == last_ts:
+                self._overwrite_last(currency, length, rate[0], volume[0])
+                ts, rate, volume = ts[1:], rate[1:], volume[1:]
+            elif ts[0] < last_ts:
+                self._rebuild_currency(conn, currency)
+                return None
+        if len(ts):
+            self._append(currency, ts, rate, volume, length)
+        return len(ts)
+
+    def info(self) -> Dict[str, int]:
+        """Stored row count per currency"""
+        counts = {}
+        for name in sorted(os.listdir(self.directory)):
+            columns = self.columns(name) if os.path.isdir(os.path.join(self.directory, name)) else None
+            if columns is not None:
+                counts[name] = len(columns[0])
+        return counts
+
+
+def sync_if_enabled(db_file: str, rebuild: bool = False) -> Optional[Dict]:
+    """Sync (or rebuild) the configured column store after writing to ``db_file``"""
+    store = ColumnStore.from_env(db_file)
+    if store is None:
+        return None
+    return store.rebuild() if rebuild else store.sync()
@@ -0,0 +1,88 @@
+"""Cross rates between any two currencies, derived from the stored TWD rates.
+
+Every stored rate is TWD per unit of a currency, so the rate of one
+``base`` unit in ``quote`` is twd[base] / twd[quote], with TWD itself as
+the constant 1. N stored series give all N² pairs on demand; nothing
+besides the TWD series is stored.
+
+The helpers work on snapshots (a {currency: rate} dict) and on wide
+frames of TWD rates (time x currency), where a pair is one vectorized
+column division. Re-expressing everything in another display base is
+likewise one division of the whole frame by the base column.
+"""
+from typing import TYPE_CHECKING, Dict, List, Sequence
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+HOME_CURRENCY = "TWD"
+# Bases the dashboard can display rates in
+DISPLAY_BASES = ("TWD", "USD", "JPY")
+
+
+def rate(twd_rates: Dict[str, float], base: str, quote: str) -> float:
+    """Units of ``quote`` per unit of ``base`` in a snapshot; 0 when either rate is missing"""
+    base_rate = 1.0 if base == HOME_CURRENCY else twd_rates.get(base, 0)
+    quote_rate = 1.0 if quote == HOME_CURRENCY else twd_rates.get(quote, 0)
+    if not base_rate or not quote_rate:
+        return 0.0
+    return base_rate / quote_rate
+
+
+def matrix(twd_rates: Dict[str, float], currencies: Sequence[str]) -> "pd.DataFrame":
+    """Cross rates of a snapshot: row currency priced in the column currency"""
+    import numpy as np
+    import pandas as pd
+
+    values = np.array([1.0 if c == HOME_CURRENCY else twd_rates.get(c, np.nan) for c in currencies], dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cross = values[:, None] / values[None, :]
+    return pd.DataFrame(cross, index=list(currencies), columns=list(currencies))
+
+
+def pair(twd: "pd.DataFrame", base: str, quote: str) -> "pd.Series":
+    """Series of ``quote`` per unit of ``base`` from a wide frame of TWD rates"""
+    import numpy as np
+    import pandas as pd
+
+    def column(currency: str) -> "np.ndarray":
+        if currency == HOME_CURRENCY:
+            return np.ones(len(twd))
+        return twd[currency].to_numpy(dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = column(base) / column(quote)
+    return pd.Series(values, index=twd.index, name=f"{base}/{quote}")
+
+
+def display_currencies(currencies: Sequence[str], base: str) -> List[str]:
+    """Currencies to list against ``base``: TWD first when it is not the base, never the base itself"""
+    listed = [currency for currency in currencies if currency not in (base, HOME_CURRENCY)]
+    return listed if base == HOME_CURRENCY else [HOME_CURRENCY, *listed]
+
+
+def rebase_rates(twd_rates: Dict[str, float], base: str) -> Dict[str, float]:
+    """A snapshot of TWD rates re-expressed in ``base``, TWD included; empty without a rate for ``base``"""
+    if base == HOME_CURRENCY:
+        return dict(twd_rates)
+    base_rate = twd_rates.get(base, 0)
+    if not base_rate:
+        return {}
+    rebased = {currency: rate / base_rate for currency, rate in twd_rates.items()}
+    rebased[HOME_CURRENCY] = 1.0 / base_rate
+    return rebased
+
+
+def rebase(twd: "pd.DataFrame", base: str) -> "pd.DataFrame":
+    """A wide frame of TWD rates re-expressed in ``base``, with a TWD column added"""
+    import numpy as np
+    import pandas as pd
+
+    if base == HOME_CURRENCY:
+        return twd.assign(**{HOME_CURRENCY: 1.0}) if HOME_CURRENCY not in twd.columns else twd
+    columns = [column for column in twd.columns if column != HOME_CURRENCY]
+    values = twd[columns].to_numpy(dtype=float)
+    divisor = twd[base].to_numpy(dtype=float)[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rebased = np.hstack([values, np.ones((len(twd), 1))]) / divisor
+    return pd.DataFrame(rebased, index=twd.index, columns=[*columns, HOME_CURRENCY])
@@ -0,0 +1,90 @@
+"""Currency registry: names, reference rates and simulation parameters per currency.
+
+The registry is data, not code: currencies.csv holds one row for every
+currency the upstream API quotes (about 170), with its Chinese and English
+names, an approximate TWD rate (used for simulated data), a typical daily
+volatility, a base trading volume in millions of TWD and whether it is
+tracked by default. Blank volatility or volume cells use the defaults
+below.
+
+The tracked currencies are the ones collected, stored and listed by the
+dashboard and CLI. By default they are the rows flagged in the file (the
+original 23); TRACKER_CURRENCIES selects ``all`` or a comma-separated list
+of codes instead. The file is read once per process.
+"""
+import csv
+import logging
+import os
+from typing import Dict, List, Optional
+
+from crosses import HOME_CURRENCY
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "currencies.csv")
+DEFAULT_DAILY_VOLATILITY = 0.012
+# Millions of TWD per day, for currencies without a base volume
+DEFAULT_BASE_VOLUME = 1000
+
+_REGISTRIES: Dict[str, Dict[str, Dict]] = {}
+
+
+def load(path: Optional[str] = None) -> Dict[str, Dict]:
+    """{code: row} in file order; rows have name_zh, name_en, twd_rate, daily_volatility, base_volume, tracked"""
+    path = path or REGISTRY_FILE
+    registry = _REGISTRIES.get(path)
+    if registry is None:
+        registry = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                registry[row["code"]] = {
+                    "name_zh": row["name_zh"],
+                    "name_en": row["name_en"],
+                    "twd_rate": float(row["twd_rate"]),
+                    "daily_volatility": float(row["daily_volatility"]) if row["daily_volatility"] else None,
+                    "base_volume": float(row["base_volume"]) if row["base_volume"] else None,
+                    "tracked": row["tracked"] == "1",
+                }
+        _REGISTRIES[path] = registry
+    return registry
+
+
+def names(registry: Optional[Dict[str, Dict]] = None) -> Dict[str, str]:
+    """Display name per currency, e.g. '美元 US Dollar'"""
+    registry = registry or load()
+    return {code: f"{row['name_zh']} {row['name_en']}" for code, row in registry.items()}
+
+
+def twd_rates(registry: Optional[Dict[str, Dict]] = None) -> Dict[str, float]:
+    """Approximate TWD per unit of every foreign currency"""
+    registry = registry or load()
+    return {code: row["twd_rate"] for code, row in registry.items() if code != HOME_CURRENCY}
+
+
+def volatilities(registry: Optional[Dict[str, Dict]] = None) -> Dict[str, float]:
+    """Typical daily volatility of the currencies that set one"""
+    registry = registry or load()
+    return {code: row["daily_volatility"] for code, row in registry.items() if row["daily_volatility"] is not None}
+
+
+def base_volumes(registry: Optional[Dict[str, Dict]] = None) -> Dict[str, float]:
+    """Base daily trading volume (millions of TWD) of the currencies that set one"""
+    registry = registry or load()
+    return {code: row["base_volume"] for code, row in registry.items() if row["base_volume"] is not None}
+
+
+def tracked(spec: Optional[str] = None, registry: Optional[Dict[str, Dict]] = None) -> List[str]:
+    """Currencies to collect and list, from ``spec`` or TRACKER_CURRENCIES ('all' or codes separated by commas)"""
+    registry = registry or load()
+    spec = (os.environ.get("TRACKER_CURRENCIES", "") if spec is None else spec).strip()
+    if not spec:
+        return [code for code, row in registry.items() if row["tracked"]]
+    if spec.lower() == "all":
+        return [code for code in registry if code != HOME_CURRENCY]
+    codes = []
+    for code in dict.fromkeys(part.strip().upper() for part in spec.split(",") if part.strip()):
+        if code in registry and code != HOME_CURRENCY:
+            codes.append(code)
+        else:
+            logger.warning("Ignoring unknown currency %s in TRACKER_CURRENCIES", code)
+    return codes
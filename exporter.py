@@ -0,0 +1,212 @@
+"""Streaming export of twd_exchange_rates to CSV or Parquet.
+
+Rows are read from a single SQLite cursor with ``fetchmany`` and written one
+chunk at a time, so memory use stays at one chunk no matter how many rows
+are exported. In WAL mode the cursor reads a consistent snapshot and does not
+block the collector's writes.
+
+CSV needs only the standard library. Parquet uses pyarrow when it is
+installed; it is optional and not listed in requirements.txt.
+
+Dashboard exports go to a per-process directory under the system temp
+directory. Streamlit serves a download from memory, so the dashboard only
+offers files up to TRACKER_EXPORT_DOWNLOAD_MB (default 200); larger exports
+are left to ``cli.py export``, which streams to disk or stdout.
+"""
+import csv
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import IO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import metrics
+
+FORMATS = ("csv", "parquet")
+COLUMNS = ("timestamp", "currency", "rate", "volume")
+
+MIME_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+EXPORT_DIR_PREFIX = "twd-exports-"
+# Dashboard exports older than this are removed, whichever process wrote them
+EXPORT_MAX_AGE_SECONDS = 3600
+DEFAULT_DOWNLOAD_MB = 200
+
+_pruned_at_start = False
+
+
+def download_limit_from_env() -> int:
+    """TRACKER_EXPORT_DOWNLOAD_MB: largest export (in bytes) the dashboard offers for download"""
+    try:
+        return max(int(float(os.environ.get("TRACKER_EXPORT_DOWNLOAD_MB", DEFAULT_DOWNLOAD_MB)) * 1e6), 0)
+    except ValueError:
+        return int(DEFAULT_DOWNLOAD_MB * 1e6)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to someone else
+        return True
+    return True
+
+
+def prune_exports(max_age: float = EXPORT_MAX_AGE_SECONDS):
+    """Remove export directories of exited processes and export files older than ``max_age`` seconds"""
+    root = tempfile.gettempdir()
+    cutoff = time.time() - max_age
+    for name in os.listdir(root):
+        if not name.startswith(EXPORT_DIR_PREFIX):
+            continue
+        directory = os.path.join(root, name)
+        try:
+            pid = int(name[len(EXPORT_DIR_PREFIX):])
+        except ValueError:
+            continue
+        if pid != os.getpid() and not _process_alive(pid):
+            shutil.rmtree(directory, ignore_errors=True)
+            continue
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+        except OSError:
+            # Removed by its owner in the meantime
+            continue
+
+
+def export_dir() -> str:
+    """This process's directory for dashboard exports; the first call also prunes stale exports"""
+    global _pruned_at_start
+    if not _pruned_at_start:
+        prune_exports()
+        _pruned_at_start = True
+    directory = os.path.join(tempfile.gettempdir(), f"{EXPORT_DIR_PREFIX}{os.getpid()}")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def parquet_available() -> bool:
+    """True when pyarrow can be imported, i.e. Parquet export is possible"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def format_for(path: str) -> str:
+    """Pick the export format from a file name, defaulting to CSV"""
+    return "parquet" if path.lower().endswith((".parquet", ".pq")) else "csv"
+
+
+def iter_history(db_file: str, currencies: Optional[Sequence[str]] = None, start: Optional[date] = None,
+                 end: Optional[date] = None, chunk_rows: int = 50000) -> Iterator[List[Tuple]]:
+    """Yield (timestamp, currency, rate, volume) rows in chunks of ``chunk_rows``
+
+    Rows are ordered by currency and then time, which follows the
+    UNIQUE(currency, timestamp) index and needs no sort. ``end`` is inclusive.
+    """
+    clauses, params = [], []
+    if currencies:
+        clauses.append(f"currency IN ({','.join('?' * len(currencies))})")
+        params.extend(code.upper() for code in currencies)
+    if start:
+        clauses.append("timestamp >= ?")
+        params.append(start.isoformat())
+    if end:
+        clauses.append("timestamp < ?")
+        params.append((end + timedelta(days=1)).isoformat())
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        cursor = conn.execute(
+            f"SELECT timestamp, currency, rate, volume FROM twd_exchange_rates {where} "
+            f"ORDER BY currency, timestamp",
+            params
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                return
+            yield rows
+    finally:
+        conn.close()
+
+
+def write_csv(chunks: Iterator[List[Tuple]], out: IO[str]) -> int:
+    """Write chunks as CSV with a header row; returns the number of data rows"""
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    rows = 0
+    for chunk in chunks:
+        writer.writerows(chunk)
+        rows += len(chunk)
+    return rows
+
+
+def write_parquet(chunks: Iterator[List[Tuple]], path: str) -> int:
+    """Write chunks as one Parquet row group each; returns the number of rows"""
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from None
+
+    schema = pa.schema([
+        ("timestamp", pa.timestamp("s")),
+        ("currency", pa.string()),
+        ("rate", pa.float64()),
+        ("volume", pa.float64()),
+    ])
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for chunk in chunks:
+            timestamps, currencies, rates, volumes = zip(*chunk)
+            batch = pa.record_batch([
+                pc.strptime(pa.array(timestamps, pa.string()), format="%Y-%m-%d %H:%M:%S",
+                            unit="s", error_is_null=True),
+                pa.array(currencies, pa.string()),
+                pa.array(rates, pa.float64()),
+                pa.array(volumes, pa.float64()),
+            ], schema=schema)
+            writer.write_batch(batch)
+            rows += len(chunk)
+    return rows
+
+
+def export_history(db_file: str, dest: str, fmt: Optional[str] = None,
+                   currencies: Optional[Sequence[str]] = None, start: Optional[date] = None,
+                   end: Optional[date] = None, chunk_rows: int = 50000) -> Dict:
+    """Export history to ``dest`` as CSV or Parquet
+
+    The file is written next to its destination and renamed into place, so a
+    failed or interrupted export never leaves a truncated file behind.
+    """
+    fmt = fmt or format_for(dest)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+    started = time.perf_counter()
+    chunks = iter_history(db_file, currencies, start, end, chunk_rows)
+    partial = f"{dest}.partial"
+    try:
+        with metrics.DB_OPERATION_SECONDS.time(operation='export'):
+            if fmt == "parquet":
+                rows = write_parquet(chunks, partial)
+            else:
+                with open(partial, "w", encoding="utf-8", newline="") as out:
+                    rows = write_csv(chunks, out)
+        os.replace(partial, dest)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return {"rows": rows, "bytes": os.path.getsize(dest), "format": fmt,
+            "seconds": time.perf_counter() - started}
@@ -0,0 +1,196 @@
+"""Monte Carlo forecast bands and value-at-risk for TWD crosses.
+
+Each currency follows the model behind the simulated history in
+tracker.py: a daily random walk with a per-currency volatility that is
+pulled back towards a long-run level. Here it runs on log rates, as an
+Ornstein-Uhlenbeck process
+
+    x[t+1] = x[t] + reversion * (mu - x[t]) + volatility * e[t]
+
+which is linear, so whole blocks of steps are computed at once from one
+(step x path) array of normal draws and a cumulative sum:
+
+    x[t0+k] = mu + (x[t0] - mu) a^k + sum_{s<=k} a^(k-s) e[t0+s],  a = 1 - reversion
+
+Blocks keep a^-k well inside floating point range for any reversion.
+Percentile bands are read off each step's sorted row of log rates (exp is
+monotonic, so only the percentiles are exponentiated), and value-at-risk
+of a holding comes from the sorted P&L at each horizon.
+
+Volatility and the long-run level are calibrated from the last year of
+daily closes when enough are stored, else taken from
+tracker.DAILY_VOLATILITY and the base rates. Currencies can be simulated
+in a process pool (``workers`` or ``TRACKER_FORECAST_WORKERS``); every
+currency gets its own seed from one SeedSequence, so results do not
+depend on the number of workers.
+"""
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Mapping, Optional, Sequence
+
+import crosses
+import metrics
+from tracker import DAILY_VOLATILITY, DEFAULT_DAILY_VOLATILITY
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+    from tracker import TWDCurrencyTracker
+
+DEFAULT_PATHS = 10000
+DEFAULT_REVERSION = 0.002
+PERCENTILES = (5, 25, 50, 75, 95)
+HORIZONS = (1, 10, 30, 90, 365)
+CALIBRATION_DAYS = 365
+MIN_CALIBRATION_RETURNS = 30
+# Steps per closed-form block
+BLOCK_STEPS = 128
+
+
+def simulate(rate: float, volatility: float, anchor: float, steps: int, paths: int = DEFAULT_PATHS,
+             reversion: float = DEFAULT_REVERSION, seed=None) -> "np.ndarray":
+    """Log-rate paths as a (steps + 1) x paths array; row 0 is log(rate)"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    mu = math.log(anchor)
+    decay = 1.0 - reversion
+    x = np.empty((steps + 1, paths))
+    x[0] = math.log(rate)
+    noise = rng.standard_normal((steps, paths))
+    noise *= volatility
+    for lo in range(0, steps, BLOCK_STEPS):
+        hi = min(lo + BLOCK_STEPS, steps)
+        powers = decay ** np.arange(1, hi - lo + 1)[:, None]
+        # sum_{s<=k} a^(k-s) e[s] = a^k * cumsum(a^-s e[s])
+        x[lo + 1:hi + 1] = mu + (x[lo] - mu) * powers + powers * np.cumsum(noise[lo:hi] / powers, axis=0)
+    return x
+
+
+def _quantiles(sorted_rows: "np.ndarray", percentiles: Sequence[float]) -> "np.ndarray":
+    """Linearly interpolated percentiles of each row of an already sorted array, like np.percentile"""
+    import numpy as np
+
+    positions = np.asarray(percentiles, dtype=float) / 100 * (sorted_rows.shape[1] - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.minimum(lower + 1, sorted_rows.shape[1] - 1)
+    weight = positions - lower
+    return (sorted_rows[:, lower] * (1 - weight) + sorted_rows[:, upper] * weight).T
+
+
+def value_at_risk(log_rates: "np.ndarray", rate: float, quantity: float, confidence: float = 0.95) -> Dict:
+    """VaR and expected shortfall (as positive losses) of ``quantity`` units from one horizon's log rates"""
+    import numpy as np
+
+    pnl = np.sort(quantity * (np.exp(log_rates) - rate))
+    cutoff = max(int(math.floor((1 - confidence) * len(pnl))), 1)
+    var = -float(np.quantile(pnl, 1 - confidence))
+    return {"var": var, "expected_shortfall": -float(pnl[:cutoff].mean())}
+
+
+def _run(job: Dict) -> Dict:
+    """Forecast one currency; a top-level function so process pools can pickle it"""
+    import numpy as np
+
+    started = time.perf_counter()
+    steps = job["days"]
+    x = simulate(job["rate"], job["volatility"], job["anchor"], steps, job["paths"], job["reversion"], job["seed"])
+    # Each step's marginal distribution is all the bands and VaR need
+    x.sort(axis=1)
+    bands = np.exp(_quantiles(x, job["percentiles"]))
+    risk = []
+    for horizon in job["horizons"]:
+        if horizon <= steps:
+            risk.append({"horizon": horizon, "confidence": job["confidence"],
+                         **value_at_risk(x[horizon], job["rate"], job["quantity"], job["confidence"])})
+    return {
+        "currency": job["currency"], "rate": job["rate"], "volatility": job["volatility"], "anchor": job["anchor"],
+        "days": steps, "paths": job["paths"], "percentiles": tuple(job["percentiles"]), "bands": bands,
+        "source": job.get("source"), "risk": risk, "seconds": time.perf_counter() - started,
+    }
+
+
+def _default_volatility(currency: str, base: str) -> float:
+    """Simulation volatility of a cross, treating the two TWD crosses as independent"""
+    def twd_volatility(c: str) -> float:
+        return 0.0 if c == crosses.HOME_CURRENCY else DAILY_VOLATILITY.get(c, DEFAULT_DAILY_VOLATILITY)
+
+    return math.hypot(twd_volatility(currency), twd_volatility(base))
+
+
+def calibrate(tracker: "TWDCurrencyTracker", currencies: Sequence[str], days: int = CALIBRATION_DAYS,
+              rates: Optional[Mapping[str, float]] = None, base: str = crosses.HOME_CURRENCY,
+              closes: Optional["pd.DataFrame"] = None) -> Dict[str, Dict]:
+    """Starting rate, daily log volatility and long-run level per currency from recent daily closes
+
+    ``rates`` overrides the starting rate, e.g. with the live quote. Rates,
+    and so bands and VaR, are in ``base``. ``closes`` are used instead of
+    reading the daily closes, e.g. a shared market snapshot's.
+    """
+    import numpy as np
+
+    if closes is None:
+        closes = tracker.get_daily_closes(list(currencies), days, base)
+    inputs = {}
+    for currency in currencies:
+        column = closes[currency].dropna().to_numpy()
+        column = column[column > 0]
+        rate = (rates or {}).get(currency) or (
+            column[-1] if len(column) else crosses.rate(tracker.base_rates, currency, base)
+        )
+        if not rate:
+            continue
+        returns = np.diff(np.log(column))
+        # Forward-filled gaps are flat days, not observations
+        returns = returns[returns != 0]
+        if len(returns) >= MIN_CALIBRATION_RETURNS:
+            volatility, source = float(returns.std(ddof=1)), "history"
+            anchor = float(np.exp(np.log(column).mean()))
+        else:
+            volatility, source = _default_volatility(currency, base), "default"
+            anchor = crosses.rate(tracker.base_rates, currency, base) or rate
+        inputs[currency] = {"rate": float(rate), "volatility": volatility, "anchor": float(anchor), "source": source}
+    return inputs
+
+
+def workers_from_env() -> int:
+    """TRACKER_FORECAST_WORKERS: processes for multi-currency forecasts (0 or unset: in-process)"""
+    try:
+        return max(int(os.environ.get("TRACKER_FORECAST_WORKERS", "0")), 0)
+    except ValueError:
+        return 0
+
+
+def forecast(inputs: Dict[str, Dict], days: int, paths: int = DEFAULT_PATHS, quantity: float = 1.0,
+             confidence: float = 0.95, horizons: Sequence[int] = HORIZONS,
+             percentiles: Sequence[float] = PERCENTILES, reversion: float = DEFAULT_REVERSION,
+             seed: Optional[int] = None, workers: Optional[int] = None) -> Dict[str, Dict]:
+    """Percentile bands (len(percentiles) x days + 1) and VaR per horizon for each calibrated currency
+
+    Everything is in the currency the inputs were calibrated in (TWD by
+    default). VaR and expected shortfall are for holding ``quantity`` units
+    of each currency, as positive losses at ``confidence``.
+    """
+    import numpy as np
+
+    if days < 1 or paths < 2:
+        raise ValueError("Forecasts need at least one day and two paths")
+    workers = workers_from_env() if workers is None else workers
+    seeds = np.random.SeedSequence(seed).spawn(len(inputs))
+    jobs: List[Dict] = [
+        {"currency": currency, **params, "days": days, "paths": paths, "quantity": quantity,
+         "confidence": confidence, "horizons": tuple(horizons), "percentiles": tuple(percentiles),
+         "reversion": reversion, "seed": child}
+        for (currency, params), child in zip(inputs.items(), seeds)
+    ]
+    started = time.perf_counter()
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(_run, jobs))
+    else:
+        results = [_run(job) for job in jobs]
+    metrics.COMPUTE_SECONDS.observe(time.perf_counter() - started, operation='forecast')
+    return {result["currency"]: result for result in results}
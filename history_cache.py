@@ -0,0 +1,289 @@
+"""Compact in-memory copy of the stored rate history, shared by every reader.
+
+Instead of one float64 DataFrame per currency per call, the history of all
+currencies is held once per database:
+
+* one sorted timestamp index (int64 nanoseconds) shared by every currency,
+  since a snapshot stores all currencies at the same timestamp;
+* a (timestamp x currency) rate matrix and a matching volume matrix, NaN
+  where a currency has no row (rate) or no recorded volume (volume). They
+  are float32 when that keeps every value within FLOAT32_RTOL, float64
+  otherwise;
+* currency codes as a categorical: each row's code is its column number.
+
+Reads slice rows out of the matrices with a binary search and hand back
+small float64 frames, so callers can add columns or fill gaps without
+touching the cache. :meth:`HistoryCache.update` follows new rows by id
+like portfolio.RateMatrix: snapshots at or after the newest cached
+timestamp are appended into spare capacity, anything older or a rewrite
+recorded by maintenance.mark_history_rewritten reloads everything (from the
+column store when it is enabled). :meth:`HistoryCache.footprint` reports
+the bytes held.
+
+Set TRACKER_HISTORY_CACHE=0 to read every history from the database instead.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import maintenance
+import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# Largest relative error a float32 copy may introduce
+FLOAT32_RTOL = 1e-6
+# Spare rows allocated beyond the loaded ones, as a fraction of them
+GROWTH = 0.25
+
+
+def enabled() -> bool:
+    """TRACKER_HISTORY_CACHE: on unless set to 0, false, off or no"""
+    return os.environ.get("TRACKER_HISTORY_CACHE", "1").strip().lower() not in ("0", "false", "off", "no")
+
+
+def _compact(values: "np.ndarray") -> "np.ndarray":
+    """``values`` as float32 when every value survives within FLOAT32_RTOL, else as float64"""
+    import numpy as np
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        narrow = values.astype(np.float32)
+        error = np.abs(narrow.astype(np.float64) - values)
+    if np.all((error <= FLOAT32_RTOL * np.abs(values)) | np.isnan(values)):
+        return narrow
+    return values.astype(np.float64)
+
+
+def _parse(timestamps: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+    """(sorted unique int64 nanoseconds, position of each input in them) for SQLite timestamp strings"""
+    import numpy as np
+    import pandas as pd
+
+    # Parse each distinct string once; a snapshot repeats its timestamp for every currency
+    codes, strings = pd.factorize(timestamps)
+    ns = np.array(strings, dtype="datetime64[ns]").view("<i8")
+    index, inverse = np.unique(ns, return_inverse=True)
+    return index, inverse[codes]
+
+
+class HistoryCache:
+    """Rates and volumes of every stored currency on one shared timestamp index"""
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self.currencies: List[str] = []
+        self.length = 0
+        self.index: Optional["np.ndarray"] = None
+        self.rates: Optional["np.ndarray"] = None
+        self.volumes: Optional["np.ndarray"] = None
+        self.last_id: Optional[int] = None
+        self.generation: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _rows(self, conn: sqlite3.Connection, since_id: int = 0):
+        """(currency, timestamp, rate, volume) arrays of the rows above ``since_id``, in id order"""
+        import numpy as np
+        import pandas as pd
+
+        columns = [column[1] for column in conn.execute("PRAGMA table_info(twd_exchange_rates)")]
+        volume = "volume" if "volume" in columns else "NULL AS volume"
+        df = pd.read_sql_query(
+            f"SELECT currency, timestamp, rate, {volume} FROM twd_exchange_rates WHERE id > ? ORDER BY id",
+            conn, params=(since_id,)
+        )
+        return (df["currency"].to_numpy(), df["timestamp"].to_numpy(), df["rate"].to_numpy(dtype=float),
+                pd.to_numeric(df["volume"]).to_numpy(dtype=float))
+
+    def _fill(self, index: "np.ndarray", currencies: Sequence[str], rows: "np.ndarray", columns: "np.ndarray",
+              rates: "np.ndarray", volumes: "np.ndarray"):
+        """Replace the cache with the given cells, compacted"""
+        import numpy as np
+
+        self.index, self.currencies, self.length = index, list(currencies), len(index)
+        for name, values in (("rates", rates), ("volumes", volumes)):
+            matrix = np.full((len(index), len(self.currencies)), np.nan)
+            matrix[rows, columns] = values
+            setattr(self, name, _compact(matrix))
+
+    def _set(self, rows: "np.ndarray", columns: "np.ndarray", rates: "np.ndarray", volumes: "np.ndarray"):
+        """Write values into the matrices, widening either one to float64 if float32 cannot hold them"""
+        import numpy as np
+
+        for name, values in (("rates", rates), ("volumes", volumes)):
+            matrix = getattr(self, name)
+            if matrix.dtype == np.float32 and _compact(values).dtype != np.float32:
+                matrix = matrix.astype(np.float64)
+                setattr(self, name, matrix)
+            # Rows come in id order, so a replaced row overwrites the older one
+            matrix[rows, columns] = values
+
+    def _load_all(self, conn: sqlite3.Connection):
+        import numpy as np
+        import pandas as pd
+
+        from column_store import ColumnStore
+
+        store = ColumnStore.from_env(self.db_file)
+        if store is not None:
+            store.sync()
+            stored = [(currency, store.columns(currency)) for currency in store.info()]
+            stored = [(currency, columns) for currency, columns in stored if columns is not None]
+            if stored:
+                index = np.unique(np.concatenate([ts for _, (ts, _, _) in stored]))
+                rows = np.concatenate([np.searchsorted(index, ts) for _, (ts, _, _) in stored])
+                columns = np.concatenate([np.full(len(ts), j) for j, (_, (ts, _, _)) in enumerate(stored)])
+                self._fill(index, [currency for currency, _ in stored], rows, columns,
+                           np.concatenate([rate for _, (_, rate, _) in stored]),
+                           np.concatenate([volume for _, (_, _, volume) in stored]))
+                return
+
+        currency, timestamps, rate, volume = self._rows(conn)
+        # Each row's currency code is its column
+        codes = pd.Categorical(currency)
+        index, rows = _parse(timestamps)
+        self._fill(index, codes.categories, rows, codes.codes, rate, volume)
+
+    def _load_recent(self, conn: sqlite3.Connection, since_id: int) -> bool:
+        """Append rows above ``since_id``; False when one lands before the newest cached timestamp"""
+        import numpy as np
+
+        currency, timestamps, rate, volume = self._rows(conn, since_id)
+        if not len(currency):
+            return True
+        index, rows = _parse(timestamps)
+        newest = self.index[self.length - 1] if self.length else None
+        if newest is not None and index[0] < newest:
+            return False
+        # A snapshot at the newest timestamp replaces values on its row
+        added = index if newest is None or index[0] > newest else index[1:]
+        rows = rows + self.length - (len(index) - len(added))
+        for code in dict.fromkeys(currency):
+            if code not in self.currencies:
+                self.currencies.append(code)
+                padding = np.full((len(self.rates), 1), np.nan, dtype=self.rates.dtype)
+                self.rates = np.hstack([self.rates, padding])
+                self.volumes = np.hstack([self.volumes, padding.astype(self.volumes.dtype)])
+        length = self.length + len(added)
+        if length > len(self.rates):
+            # Grow with spare rows, so the next snapshots are appended in place
+            capacity = int(length * (1 + GROWTH)) + 1
+            for name in ("rates", "volumes"):
+                matrix = getattr(self, name)
+                grown = np.full((capacity, matrix.shape[1]), np.nan, dtype=matrix.dtype)
+                grown[:self.length] = matrix[:self.length]
+                setattr(self, name, grown)
+            index_grown = np.zeros(capacity, dtype=np.int64)
+            index_grown[:self.length] = self.index[:self.length]
+            self.index = index_grown
+        self.index[self.length:length] = added
+        self.length = length
+        positions = {code: column for column, code in enumerate(self.currencies)}
+        columns = np.array([positions[code] for code in currency])
+        self._set(rows, columns, rate, volume)
+        return True
+
+    def update(self) -> bool:
+        """Catch up with committed rows; returns True when anything changed"""
+        with self._lock:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            try:
+                # One snapshot for the watermark and the rows it covers
+                conn.execute("BEGIN")
+                max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM twd_exchange_rates").fetchone()[0]
+                generation = maintenance.history_generation(conn)
+                if max_id == self.last_id and generation == self.generation:
+                    return False
+                started = time.perf_counter()
+                if self.last_id is None or max_id < self.last_id or generation != self.generation \
+                        or not self._load_recent(conn, self.last_id):
+                    self._load_all(conn)
+                self.last_id, self.generation = max_id, generation
+                metrics.DB_OPERATION_SECONDS.observe(time.perf_counter() - started, operation='history_cache')
+                metrics.HISTORY_CACHE_BYTES.set(self.footprint()["total_bytes"])
+                return True
+            finally:
+                conn.close()
+
+    def _bounds(self, start: datetime, end: datetime) -> Tuple[int, int]:
+        """Rows with start <= timestamp < end"""
+        import numpy as np
+
+        bounds = np.array([start, end], dtype="datetime64[ns]").view("<i8")
+        index = self.index[:self.length]
+        return int(np.searchsorted(index, bounds[0])), int(np.searchsorted(index, bounds[1]))
+
+    def frame(self, currency: str, start: datetime, end: datetime) -> "pd.DataFrame":
+        """One currency's rows with start <= timestamp < end as a new float64 frame; empty if none"""
+        import numpy as np
+        import pandas as pd
+
+        with self._lock:
+            if currency not in self.currencies:
+                return pd.DataFrame(columns=["rate", "volume"], dtype=float)
+            column = self.currencies.index(currency)
+            lo, hi = self._bounds(start, end)
+            rate = self.rates[lo:hi, column]
+            present = ~np.isnan(rate)
+            index = pd.DatetimeIndex(self.index[lo:hi][present].view("datetime64[ns]"), name="timestamp")
+            return pd.DataFrame({"rate": rate[present].astype(np.float64),
+                                 "volume": self.volumes[lo:hi, column][present].astype(np.float64)}, index=index)
+
+    def wide(self, currencies: Sequence[str], start: datetime, end: datetime) -> "pd.DataFrame":
+        """Rates of ``currencies`` with start <= timestamp < end (timestamp x currency), rows where any has one"""
+        import numpy as np
+        import pandas as pd
+
+        with self._lock:
+            found = [currency for currency in currencies if currency in self.currencies]
+            lo, hi = self._bounds(start, end)
+            rates = self.rates[lo:hi, [self.currencies.index(currency) for currency in found]].astype(np.float64)
+            present = ~np.isnan(rates).all(axis=1)
+            index = pd.DatetimeIndex(self.index[lo:hi][present].view("datetime64[ns]"), name="timestamp")
+            return pd.DataFrame(rates[present], index=index, columns=found)
+
+    def footprint(self) -> Dict:
+        """Bytes held by the index and matrices, and what per-currency float64 frames of the same rows take"""
+        import numpy as np
+
+        index = self.index.nbytes if self.index is not None else 0
+        rates = self.rates.nbytes if self.rates is not None else 0
+        volumes = self.volumes.nbytes if self.volumes is not None else 0
+        cells = int((~np.isnan(self.rates[:self.length])).sum()) if self.rates is not None else 0
+        return {
+            "timestamps": self.length,
+            "currencies": len(self.currencies),
+            "rows": cells,
+            "rate_dtype": str(self.rates.dtype) if self.rates is not None else None,
+            "volume_dtype": str(self.volumes.dtype) if self.volumes is not None else None,
+            "index_bytes": index,
+            "rates_bytes": rates,
+            "volumes_bytes": volumes,
+            "total_bytes": index + rates + volumes,
+            # A timestamp, rate and volume per row, as get_historical_data frames hold them
+            "float64_frames_bytes": cells * 24,
+        }
+
+
+def estimate(timestamps: int, currencies: int, itemsize: int = 4) -> int:
+    """Bytes a cache of ``timestamps`` snapshots of ``currencies`` takes, before spare capacity"""
+    return timestamps * 8 + 2 * timestamps * currencies * itemsize
+
+
+_CACHES: Dict[str, HistoryCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def shared(db_file: str) -> HistoryCache:
+    """The shared, up-to-date history cache of a database"""
+    key = os.path.abspath(db_file)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = _CACHES[key] = HistoryCache(db_file)
+    cache.update()
+    return cache
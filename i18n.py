@@ -0,0 +1,571 @@
+"""Translations for the dashboard, compiled once per process.
+
+The nested ``TRANSLATIONS`` tree is flattened at import into one dict per
+language keyed by dotted paths (``'periods.1 Year'``), with the Traditional
+Chinese fallback already merged in, so every lookup is a single dict get.
+"""
+from typing import Dict
+
+DEFAULT_LANGUAGE = 'zh-TW'
+
+TRANSLATIONS = {
+    'en': {
+        'title': '💱 Taiwan Bank Exchange Rate Tracker',
+        'subtitle': 'Track real-time and historical exchange rates for {count} currencies (TWD base)',
+        'settings': 'Settings',
+        'language': 'Language',
+        'auto_refresh': 'Auto-refresh data',
+        'refresh_interval': 'Refresh interval (minutes)',
+        'time_period': 'Select time period for charts',
+        'current_rates': '📊 Current Rates',
+        'trend_charts': '📈 Trend Charts',
+        'currency_comparison': '🔍 Currency Comparison',
+        'currency_converter': '🧮 Currency Converter',
+        'trading_volume': '📊 Trading Volume',
+        'statistics': '📋 Statistics',
+        'fetching_rates': 'Fetching latest exchange rates...',
+        'current_rates_title': 'Current Exchange Rates ({base} Base)',
+        'currency': 'Currency',
+        'rate': 'Rate ({code})',
+        'change': 'Change',
+        'change_percent': 'Change %',
+        'trend': 'Trend',
+        'gainers': 'Stronger vs {base}',
+        'losers': 'Weaker vs {base}',
+        'total_currencies': 'Total Currencies',
+        'page': 'Page',
+        'avg_change': 'Avg Change %',
+        'trend_title': 'Exchange Rate Trends vs {base}',
+        'select_currency': 'Select currency to view trend',
+        'indicators': 'Technical indicators',
+        'resolution': 'Bar resolution',
+        'forecast_title': 'Monte Carlo Forecast',
+        'forecast_horizon': 'Forecast horizon',
+        'holding_quantity': 'Holding (units)',
+        'value_at_risk': 'VaR 95%',
+        'expected_shortfall': 'ES',
+        'forecast_note': '{paths:,} simulated mean-reverting paths, daily volatility {volatility:.2f}%. Bands show the 5/25/50/75/95th percentiles; VaR and expected shortfall are losses on the holding.',
+        'current_rate': 'Current Rate',
+        'min_rate': 'Min Rate',
+        'max_rate': 'Max Rate',
+        'volatility': 'Volatility',
+        'no_data': 'No historical data available for',
+        'comparison_title': 'Currency Comparison vs {base}',
+        'select_currencies': 'Select currencies to compare',
+        'performance_summary': 'Performance Summary',
+        'correlation_title': 'Correlation',
+        'correlation_matrix': 'Correlation Matrix of Daily Returns',
+        'rolling_correlation': 'Rolling Correlation',
+        'correlation_window': 'Rolling window',
+        'correlation_base': 'Against',
+        'converter_title': 'Currency Converter',
+        'from_currency': 'From Currency',
+        'to_currency': 'To Currency',
+        'amount': 'Amount',
+        'exchange_rate': 'Exchange Rate',
+        'pair_history': 'Pair History',
+        'cross_rates': 'Cross Rates',
+        'cross_rates_note': 'Row currency priced in the column currency, derived from the TWD rates',
+        'market_stats': 'Market Statistics',
+        'market_overview': 'Market Overview',
+        'top_gainers': '🔝 Strongest vs {base}',
+        'top_losers': '📉 Weakest vs {base}',
+        'volatility_ranking': '📊 Volatility Ranking',
+        'trading_volume_title': 'Trading Volume Analysis',
+        'volume_period': 'Select volume period',
+        'daily_volume': 'Daily Volume',
+        'total_volume': 'Total Volume',
+        'avg_volume': 'Average Volume',
+        'volume_trend': 'Volume Trend',
+        'high_volume': 'High Volume',
+        'medium_volume': 'Medium Volume',
+        'low_volume': 'Low Volume',
+        'volume_chart_title': 'Trading Volume Chart',
+        'volume_summary': 'Volume Summary',
+        'today': 'Today',
+        '7_days': '7 Days',
+        '14_days': '14 Days',
+        '1_month': '1 Month',
+        'data_source': 'Data Source',
+        'last_updated': 'Last Updated',
+        'network_error': 'Network error',
+        'api_error': 'API Error',
+        'database_error': 'Database error for',
+        'unable_fetch': 'Unable to fetch exchange rate data. Using simulated data.',
+        'simulated_note': '* Using simulated historical data based on real market patterns',
+        'portfolio': '💼 Portfolio',
+        'portfolio_title': 'Portfolio Tracking',
+        'portfolio_select': 'Portfolio',
+        'portfolio_new': 'New portfolio name',
+        'portfolio_create': 'Create portfolio',
+        'no_portfolio': 'Create a portfolio to start tracking your foreign-currency holdings.',
+        'add_transaction': 'Add transaction',
+        'quantity': 'Quantity (negative to sell)',
+        'trade_rate': 'Rate (TWD)',
+        'trade_date': 'Date',
+        'fee': 'Fee (TWD)',
+        'market_value': 'Market Value (TWD)',
+        'cost_basis': 'Cost Basis (TWD)',
+        'unrealized_pnl': 'Unrealized P&L',
+        'realized_pnl': 'Realized P&L',
+        'holdings': 'Holdings',
+        'transactions': 'Transactions',
+        'valuation_history': 'Valuation History',
+        'avg_cost': 'Average Cost',
+        'base_currency': 'Base Currency',
+        'bases': {
+            'TWD': 'TWD',
+            'USD': 'USD',
+            'JPY': 'JPY'
+        },
+        'periods': {
+            '1 Month': '1 Month',
+            '3 Months': '3 Months', 
+            '6 Months': '6 Months',
+            '1 Year': '1 Year',
+            '3 Years': '3 Years',
+            '5 Years': '5 Years',
+            '10 Years': '10 Years'
+        }
+    },
+    'zh-TW': {
+        'title': '💱 台灣銀行匯率追蹤器',
+        'subtitle': '追蹤新台幣兌換{count}種世界貨幣的即時和歷史匯率',
+        'settings': '設定',
+        'language': '語言',
+        'auto_refresh': '自動刷新數據',
+        'refresh_interval': '刷新間隔（分鐘）',
+        'time_period': '選擇圖表時間區間',
+        'current_rates': '📊 即時匯率',
+        'trend_charts': '📈 趨勢圖表',
+        'currency_comparison': '🔍 貨幣比較',
+        'currency_converter': '🧮 貨幣轉換器',
+        'trading_volume': '📊 交易量分析',
+        'statistics': '📋 統計數據',
+        'fetching_rates': '正在獲取最新匯率...',
+        'current_rates_title': '即時匯率（以{base}為基準）',
+        'currency': '貨幣',
+        'rate': '匯率 ({code})',
+        'change': '變化',
+        'change_percent': '變化%',
+        'trend': '趨勢',
+        'gainers': '對{base}升值',
+        'losers': '對{base}貶值',
+        'total_currencies': '總貨幣數',
+        'page': '頁',
+        'avg_change': '平均變化%',
+        'trend_title': '對{base}匯率趨勢',
+        'select_currency': '選擇要查看趨勢的貨幣',
+        'indicators': '技術指標',
+        'resolution': 'K 線週期',
+        'forecast_title': '蒙地卡羅預測',
+        'forecast_horizon': '預測期間',
+        'holding_quantity': '持有數量',
+        'value_at_risk': '風險值 95%',
+        'expected_shortfall': '預期損失',
+        'forecast_note': '{paths:,} 條均值回歸模擬路徑，日波動率 {volatility:.2f}%。區間為第 5/25/50/75/95 百分位；風險值與預期損失為持有部位的損失金額。',
+        'current_rate': '目前匯率',
+        'min_rate': '最低匯率',
+        'max_rate': '最高匯率',
+        'volatility': '波動性',
+        'no_data': '沒有歷史數據可用於',
+        'comparison_title': '對{base}貨幣比較',
+        'select_currencies': '選擇要比較的貨幣',
+        'performance_summary': '表現摘要',
+        'correlation_title': '相關性',
+        'correlation_matrix': '日報酬相關係數矩陣',
+        'rolling_correlation': '滾動相關係數',
+        'correlation_window': '滾動視窗',
+        'correlation_base': '對照貨幣',
+        'converter_title': '貨幣轉換器',
+        'from_currency': '來源貨幣',
+        'to_currency': '目標貨幣',
+        'amount': '金額',
+        'exchange_rate': '匯率',
+        'pair_history': '貨幣對歷史',
+        'cross_rates': '交叉匯率',
+        'cross_rates_note': '以欄貨幣計價的列貨幣，由新台幣匯率推算',
+        'market_stats': '市場統計',
+        'market_overview': '市場概況',
+        'top_gainers': '🔝 對{base}最強勢',
+        'top_losers': '📉 對{base}最弱勢',
+        'volatility_ranking': '📊 波動性排名',
+        'trading_volume_title': '交易量分析',
+        'volume_period': '選擇交易量期間',
+        'daily_volume': '每日交易量',
+        'total_volume': '總交易量',
+        'avg_volume': '平均交易量',
+        'volume_trend': '交易量趨勢',
+        'high_volume': '高交易量',
+        'medium_volume': '中等交易量',
+        'low_volume': '低交易量',
+        'volume_chart_title': '交易量圖表',
+        'volume_summary': '交易量摘要',
+        'today': '今日',
+        '7_days': '7天',
+        '14_days': '14天',
+        '1_month': '1個月',
+        'data_source': '數據來源',
+        'last_updated': '最後更新',
+        'network_error': '網路錯誤',
+        'api_error': 'API錯誤',
+        'database_error': '資料庫錯誤',
+        'unable_fetch': '無法獲取匯率數據，使用模擬數據。',
+        'simulated_note': '* 使用基於真實市場模式的模擬歷史數據',
+        'portfolio': '💼 投資組合',
+        'portfolio_title': '投資組合追蹤',
+        'portfolio_select': '投資組合',
+        'portfolio_new': '新投資組合名稱',
+        'portfolio_create': '建立投資組合',
+        'no_portfolio': '建立投資組合以開始追蹤您的外幣部位。',
+        'add_transaction': '新增交易',
+        'quantity': '數量（負數為賣出）',
+        'trade_rate': '匯率 (TWD)',
+        'trade_date': '日期',
+        'fee': '手續費 (TWD)',
+        'market_value': '市值 (TWD)',
+        'cost_basis': '成本 (TWD)',
+        'unrealized_pnl': '未實現損益',
+        'realized_pnl': '已實現損益',
+        'holdings': '持有部位',
+        'transactions': '交易紀錄',
+        'valuation_history': '市值走勢',
+        'avg_cost': '平均成本',
+        'base_currency': '基準貨幣',
+        'bases': {
+            'TWD': '新台幣',
+            'USD': '美元',
+            'JPY': '日圓'
+        },
+        'periods': {
+            '1 Month': '1個月',
+            '3 Months': '3個月',
+            '6 Months': '6個月', 
+            '1 Year': '1年',
+            '3 Years': '3年',
+            '5 Years': '5年',
+            '10 Years': '10年'
+        }
+    },
+    'zh-CN': {
+        'title': '💱 台湾银行汇率跟踪器',
+        'subtitle': '跟踪新台币兑换{count}种世界货币的实时和历史汇率',
+        'settings': '设置',
+        'language': '语言',
+        'auto_refresh': '自动刷新数据',
+        'refresh_interval': '刷新间隔（分钟）',
+        'time_period': '选择图表时间区间',
+        'current_rates': '📊 实时汇率',
+        'trend_charts': '📈 趋势图表',
+        'currency_comparison': '🔍 货币比较',
+        'currency_converter': '🧮 货币转换器',
+        'trading_volume': '📊 交易量分析',
+        'statistics': '📋 统计数据',
+        'fetching_rates': '正在获取最新汇率...',
+        'current_rates_title': '实时汇率（以{base}为基准）',
+        'currency': '货币',
+        'rate': '汇率 ({code})',
+        'change': '变化',
+        'change_percent': '变化%',
+        'trend': '趋势',
+        'gainers': '对{base}升值',
+        'losers': '对{base}贬值',
+        'total_currencies': '总货币数',
+        'page': '页',
+        'avg_change': '平均变化%',
+        'trend_title': '对{base}汇率趋势',
+        'select_currency': '选择要查看趋势的货币',
+        'indicators': '技术指标',
+        'resolution': 'K 线周期',
+        'forecast_title': '蒙特卡洛预测',
+        'forecast_horizon': '预测期间',
+        'holding_quantity': '持有数量',
+        'value_at_risk': '风险价值 95%',
+        'expected_shortfall': '预期损失',
+        'forecast_note': '{paths:,} 条均值回归模拟路径，日波动率 {volatility:.2f}%。区间为第 5/25/50/75/95 百分位；风险价值与预期损失为持仓的损失金额。',
+        'current_rate': '当前汇率',
+        'min_rate': '最低汇率',
+        'max_rate': '最高汇率',
+        'volatility': '波动性',
+        'no_data': '没有历史数据可用于',
+        'comparison_title': '对{base}货币比较',
+        'select_currencies': '选择要比较的货币',
+        'performance_summary': '表现摘要',
+        'correlation_title': '相关性',
+        'correlation_matrix': '日收益相关系数矩阵',
+        'rolling_correlation': '滚动相关系数',
+        'correlation_window': '滚动窗口',
+        'correlation_base': '对照货币',
+        'converter_title': '货币转换器',
+        'from_currency': '源货币',
+        'to_currency': '目标货币',
+        'amount': '金额',
+        'exchange_rate': '汇率',
+        'pair_history': '货币对历史',
+        'cross_rates': '交叉汇率',
+        'cross_rates_note': '以列货币计价的行货币，由新台币汇率推算',
+        'market_stats': '市场统计',
+        'market_overview': '市场概况',
+        'top_gainers': '🔝 对{base}最强势',
+        'top_losers': '📉 对{base}最弱势',
+        'volatility_ranking': '📊 波动性排名',
+        'trading_volume_title': '交易量分析',
+        'volume_period': '选择交易量期间',
+        'daily_volume': '每日交易量',
+        'total_volume': '总交易量',
+        'avg_volume': '平均交易量',
+        'volume_trend': '交易量趋势',
+        'high_volume': '高交易量',
+        'medium_volume': '中等交易量',
+        'low_volume': '低交易量',
+        'volume_chart_title': '交易量图表',
+        'volume_summary': '交易量摘要',
+        'today': '今日',
+        '7_days': '7天',
+        '14_days': '14天',
+        '1_month': '1个月',
+        'data_source': '数据来源',
+        'last_updated': '最后更新',
+        'network_error': '网络错误',
+        'api_error': 'API错误',
+        'database_error': '数据库错误',
+        'unable_fetch': '无法获取汇率数据，使用模拟数据。',
+        'simulated_note': '* 使用基于真实市场模式的模拟历史数据',
+        'portfolio': '💼 投资组合',
+        'portfolio_title': '投资组合追踪',
+        'portfolio_select': '投资组合',
+        'portfolio_new': '新投资组合名称',
+        'portfolio_create': '创建投资组合',
+        'no_portfolio': '创建投资组合以开始追踪您的外币持仓。',
+        'add_transaction': '新增交易',
+        'quantity': '数量（负数为卖出）',
+        'trade_rate': '汇率 (TWD)',
+        'trade_date': '日期',
+        'fee': '手续费 (TWD)',
+        'market_value': '市值 (TWD)',
+        'cost_basis': '成本 (TWD)',
+        'unrealized_pnl': '未实现盈亏',
+        'realized_pnl': '已实现盈亏',
+        'holdings': '持仓',
+        'transactions': '交易记录',
+        'valuation_history': '市值走势',
+        'avg_cost': '平均成本',
+        'base_currency': '基准货币',
+        'bases': {
+            'TWD': '新台币',
+            'USD': '美元',
+            'JPY': '日元'
+        },
+        'periods': {
+            '1 Month': '1个月',
+            '3 Months': '3个月',
+            '6 Months': '6个月',
+            '1 Year': '1年',
+            '3 Years': '3年',
+            '5 Years': '5年',
+            '10 Years': '10年'
+        }
+    },
+    'ja': {
+        'title': '💱 台湾銀行為替レート追跡ツール',
+        'subtitle': '台湾ドル対{count}種類の世界通貨のリアルタイムおよび過去の為替レートを追跡',
+        'settings': '設定',
+        'language': '言語',
+        'auto_refresh': 'データの自動更新',
+        'refresh_interval': '更新間隔（分）',
+        'time_period': 'チャートの期間を選択',
+        'current_rates': '📊 現在のレート',
+        'trend_charts': '📈 トレンドチャート',
+        'currency_comparison': '🔍 通貨比較',
+        'currency_converter': '🧮 通貨コンバーター',
+        'trading_volume': '📊 取引量分析',
+        'statistics': '📋 統計',
+        'fetching_rates': '最新の為替レートを取得中...',
+        'current_rates_title': '現在の為替レート（{base}基準）',
+        'currency': '通貨',
+        'rate': 'レート ({code})',
+        'change': '変化',
+        'change_percent': '変化%',
+        'trend': 'トレンド',
+        'gainers': '{base}に対し上昇',
+        'losers': '{base}に対し下落',
+        'total_currencies': '総通貨数',
+        'page': 'ページ',
+        'avg_change': '平均変化%',
+        'trend_title': '{base}対為替レートトレンド',
+        'select_currency': 'トレンドを表示する通貨を選択',
+        'indicators': 'テクニカル指標',
+        'resolution': '足の期間',
+        'forecast_title': 'モンテカルロ予測',
+        'forecast_horizon': '予測期間',
+        'holding_quantity': '保有数量',
+        'value_at_risk': 'VaR 95%',
+        'expected_shortfall': 'ES',
+        'forecast_note': '平均回帰する {paths:,} 本の模擬パス、日次ボラティリティ {volatility:.2f}%。帯は 5/25/50/75/95 パーセンタイル、VaR と期待ショートフォールは保有ポジションの損失額です。',
+        'current_rate': '現在のレート',
+        'min_rate': '最低レート',
+        'max_rate': '最高レート',
+        'volatility': 'ボラティリティ',
+        'no_data': '利用可能な過去データがありません',
+        'comparison_title': '{base}対通貨比較',
+        'select_currencies': '比較する通貨を選択',
+        'performance_summary': 'パフォーマンス概要',
+        'correlation_title': '相関',
+        'correlation_matrix': '日次リターンの相関行列',
+        'rolling_correlation': 'ローリング相関',
+        'correlation_window': 'ローリング期間',
+        'correlation_base': '比較対象',
+        'converter_title': '通貨コンバーター',
+        'from_currency': '元の通貨',
+        'to_currency': '変換先通貨',
+        'amount': '金額',
+        'exchange_rate': '為替レート',
+        'pair_history': '通貨ペア履歴',
+        'cross_rates': 'クロスレート',
+        'cross_rates_note': '行の通貨を列の通貨で表示（台湾ドルのレートから算出）',
+        'market_stats': '市場統計',
+        'market_overview': '市場概況',
+        'top_gainers': '🔝 {base}に対し最強',
+        'top_losers': '📉 {base}に対し最弱',
+        'volatility_ranking': '📊 ボラティリティランキング',
+        'trading_volume_title': '取引量分析',
+        'volume_period': '取引量期間を選択',
+        'daily_volume': '日次取引量',
+        'total_volume': '総取引量',
+        'avg_volume': '平均取引量',
+        'volume_trend': '取引量トレンド',
+        'high_volume': '高取引量',
+        'medium_volume': '中取引量',
+        'low_volume': '低取引量',
+        'volume_chart_title': '取引量チャート',
+        'volume_summary': '取引量概要',
+        'today': '今日',
+        '7_days': '7日',
+        '14_days': '14日',
+        '1_month': '1か月',
+        'data_source': 'データソース',
+        'last_updated': '最終更新',
+        'network_error': 'ネットワークエラー',
+        'api_error': 'APIエラー',
+        'database_error': 'データベースエラー',
+        'unable_fetch': '為替レートデータを取得できません。シミュレーションデータを使用します。',
+        'simulated_note': '* 実際の市場パターンに基づくシミュレーション歴史データを使用',
+        'portfolio': '💼 ポートフォリオ',
+        'portfolio_title': 'ポートフォリオ管理',
+        'portfolio_select': 'ポートフォリオ',
+        'portfolio_new': '新しいポートフォリオ名',
+        'portfolio_create': 'ポートフォリオを作成',
+        'no_portfolio': 'ポートフォリオを作成して外貨の保有状況を追跡しましょう。',
+        'add_transaction': '取引を追加',
+        'quantity': '数量（売却はマイナス）',
+        'trade_rate': 'レート (TWD)',
+        'trade_date': '日付',
+        'fee': '手数料 (TWD)',
+        'market_value': '評価額 (TWD)',
+        'cost_basis': '取得原価 (TWD)',
+        'unrealized_pnl': '含み損益',
+        'realized_pnl': '実現損益',
+        'holdings': '保有通貨',
+        'transactions': '取引履歴',
+        'valuation_history': '評価額の推移',
+        'avg_cost': '平均取得単価',
+        'base_currency': '基準通貨',
+        'bases': {
+            'TWD': '台湾ドル',
+            'USD': '米ドル',
+            'JPY': '日本円'
+        },
+        'periods': {
+            '1 Month': '1か月',
+            '3 Months': '3か月',
+            '6 Months': '6か月',
+            '1 Year': '1年',
+            '3 Years': '3年',
+            '5 Years': '5年',
+            '10 Years': '10年'
+        }
+    }
+}
+
+LANGUAGES = {
+    'en': 'English',
+    'zh-TW': '繁體中文',
+    'zh-CN': '简体中文',
+    'ja': '日本語'
+}
+
+
+def _flatten(tree: Dict, prefix: str = '') -> Dict:
+    """Flatten nested translations into dotted keys
+
+    Sub-dictionaries are kept under their own key as well, matching what the
+    old nested walk returned for a partial path such as ``'periods'``.
+    """
+    flat = {}
+    for key, value in tree.items():
+        path = prefix + key
+        flat[path] = value
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path + '.'))
+    return flat
+
+
+def compile_translations(translations: Dict, fallback: str = DEFAULT_LANGUAGE) -> Dict[str, Dict]:
+    """Build one flat lookup table per language with the fallback merged in"""
+    fallback_table = _flatten(translations[fallback])
+    return {lang: {**fallback_table, **_flatten(tree)} for lang, tree in translations.items()}
+
+
+class LanguageManager:
+    def __init__(self, translations: Dict = TRANSLATIONS):
+        self.translations = translations
+        self.languages = LANGUAGES
+        self.tables = compile_translations(translations)
+        self._fallback = self.tables[DEFAULT_LANGUAGE]
+    
+    def detect_language(self):
+        """Detect user's language based on browser locale"""
+        import streamlit as st
+        import streamlit.components.v1 as components
+        
+        try:
+            # JavaScript to get browser language
+            browser_lang_js = """
+            <script>
+                const lang = navigator.language || navigator.userLanguage || 'zh-TW';
+                parent.window.browserLanguage = lang;
+            </script>
+            """
+            components.html(browser_lang_js, height=0)
+            
+            # Map browser locales to our supported languages
+            if hasattr(st.session_state, 'browser_language'):
+                browser_lang = st.session_state.browser_language.lower()
+            else:
+                browser_lang = 'zh-tw'  # Default to Traditional Chinese
+            
+            if browser_lang.startswith('zh-tw') or browser_lang.startswith('zh-hant'):
+                return 'zh-TW'
+            elif browser_lang.startswith('zh-cn') or browser_lang.startswith('zh-hans') or browser_lang.startswith('zh'):
+                return 'zh-CN'
+            elif browser_lang.startswith('ja'):
+                return 'ja'
+            elif browser_lang.startswith('en'):
+                return 'en'
+            else:
+                return 'zh-TW'  # Default to Traditional Chinese for Taiwan
+        except:
+            return 'zh-TW'
+    
+    def table(self, lang: str = DEFAULT_LANGUAGE) -> Dict:
+        """Flat lookup table for a language (unknown languages use the fallback)"""
+        return self.tables.get(lang, self._fallback)
+    
+    def get_text(self, key, lang='zh-TW', **fields):
+        """Get translated text, with ``fields`` filled into its placeholders (e.g. ``base``)"""
+        text = self.tables.get(lang, self._fallback).get(key, key)
+        return text.format(**fields) if fields else text
+
+
+# Shared by every session and rerun; translations never change at runtime
+language_manager = LanguageManager()
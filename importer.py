@@ -0,0 +1,247 @@
+"""Bulk import of historical exchange rates from CSV files.
+
+Two layouts are understood:
+
+* Bank of Taiwan historical downloads (``資料日期,幣別,匯率,現金,即期,...``),
+  where each row holds the bank's buy and sell quotes for one day. The stored
+  rate is the spot mid price, falling back to the cash mid price for
+  currencies without a spot quote.
+* Generic ``date,currency,rate[,volume]`` files, with or without a header.
+
+Files are streamed with the csv module and written in chunks, so memory use
+is bounded by ``chunk_rows`` no matter how long the history is. Like
+tracker.py this module only needs the standard library.
+"""
+import csv
+import gzip
+import logging
+import math
+import re
+import sqlite3
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import column_store
+import maintenance
+import metrics
+from tracker import SCHEMA_SQL
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("auto", "bot", "generic")
+
+# (currency, rate, volume, timestamp) as stored in twd_exchange_rates
+Row = Tuple[str, float, Optional[float], str]
+
+CURRENCY_RE = re.compile(r"^[A-Z]{3}$")
+DATE_RE = re.compile(r"^(\d{4})[-/]?(\d{1,2})[-/]?(\d{1,2})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?$")
+
+INSERT_SQL = {
+    False: "INSERT OR IGNORE INTO twd_exchange_rates (currency, rate, volume, timestamp) VALUES (?, ?, ?, ?)",
+    True: '''
+        INSERT INTO twd_exchange_rates (currency, rate, volume, timestamp) VALUES (?, ?, ?, ?)
+        ON CONFLICT(currency, timestamp) DO UPDATE SET rate = excluded.rate, volume = excluded.volume
+    ''',
+}
+
+
+class CSVFormatError(ValueError):
+    """Raised when a file cannot be recognised as a supported CSV layout"""
+
+
+def _open(path: str, encoding: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding=encoding, newline="")
+    return open(path, "r", encoding=encoding, newline="")
+
+
+class _DateParser:
+    """Normalise date strings to ``YYYY-MM-DD HH:MM:SS``
+
+    A history file repeats each date once per currency, so results are
+    memoised; the cache only grows with the number of distinct days.
+    """
+
+    def __init__(self):
+        self._cache: Dict[str, Optional[str]] = {}
+
+    def __call__(self, value: str) -> Optional[str]:
+        try:
+            return self._cache[value]
+        except KeyError:
+            pass
+        parsed = None
+        match = DATE_RE.match(value.strip())
+        if match:
+            year, month, day, hour, minute, second = (int(part or 0) for part in match.groups())
+            if 1 <= month <= 12 and 1 <= day <= 31 and hour < 24 and minute < 60 and second < 60:
+                parsed = f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"
+        self._cache[value] = parsed
+        return parsed
+
+
+def _number(value: str) -> Optional[float]:
+    """Parse a positive, finite quote; Bank of Taiwan uses 0 or - for no quote"""
+    try:
+        number = float(value.replace(",", ""))
+    except ValueError:
+        return None
+    return number if number > 0 and math.isfinite(number) else None
+
+
+def detect_format(header: Sequence[str]) -> str:
+    """Guess the layout of a file from its first row"""
+    cells = [cell.strip().lstrip("\ufeff") for cell in header]
+    if "幣別" in cells and "即期" in cells:
+        return "bot"
+    return "generic"
+
+
+def _bot_rows(reader: Iterator[List[str]], header: List[str], parse_date: _DateParser,
+              stats: Dict) -> Iterator[Row]:
+    cells = [cell.strip().lstrip("\ufeff") for cell in header]
+    if "資料日期" not in cells:
+        raise CSVFormatError("Bank of Taiwan file has no 資料日期 column; download the historical CSV")
+    date_col, currency_col = cells.index("資料日期"), cells.index("幣別")
+    # The buy block comes first and the sell block repeats the same column names
+    spot = [i for i, cell in enumerate(cells) if cell == "即期"]
+    cash = [i for i, cell in enumerate(cells) if cell == "現金"]
+    if len(spot) < 2 or len(cash) < 2:
+        raise CSVFormatError("Bank of Taiwan file is missing the buy/sell quote columns")
+    width = max(spot[1], cash[1]) + 1
+
+    for line in reader:
+        if len(line) < width:
+            stats["invalid"] += 1
+            continue
+        timestamp = parse_date(line[date_col])
+        currency = line[currency_col].strip().upper()
+        buy, sell = _number(line[spot[0]]), _number(line[spot[1]])
+        if buy is None or sell is None:
+            buy, sell = _number(line[cash[0]]), _number(line[cash[1]])
+        if timestamp is None or buy is None or sell is None or not CURRENCY_RE.match(currency):
+            stats["invalid"] += 1
+            continue
+        yield currency, (buy + sell) / 2, None, timestamp
+
+
+def _generic_rows(reader: Iterator[List[str]], header: List[str], parse_date: _DateParser,
+                  stats: Dict) -> Iterator[Row]:
+    names = [cell.strip().lstrip("\ufeff").lower() for cell in header]
+    if {"date", "currency", "rate"} <= set(names):
+        date_col, currency_col, rate_col = names.index("date"), names.index("currency"), names.index("rate")
+        volume_col = names.index("volume") if "volume" in names else None
+    else:
+        # Headerless file: the first row is data in date,currency,rate[,volume] order
+        date_col, currency_col, rate_col, volume_col = 0, 1, 2, 3
+        reader = _prepend(header, reader)
+
+    for line in reader:
+        try:
+            timestamp = parse_date(line[date_col])
+            currency = line[currency_col].strip().upper()
+            rate = _number(line[rate_col])
+            volume = None
+            if volume_col is not None and volume_col < len(line) and line[volume_col].strip():
+                volume = float(line[volume_col])
+        except (IndexError, ValueError):
+            timestamp = None
+        if timestamp is None or rate is None or not CURRENCY_RE.match(currency) \
+                or (volume is not None and not math.isfinite(volume)):
+            stats["invalid"] += 1
+            continue
+        yield currency, rate, volume, timestamp
+
+
+def _prepend(first: List[str], rest: Iterator[List[str]]) -> Iterator[List[str]]:
+    yield first
+    yield from rest
+
+
+def iter_rows(path: str, fmt: str = "auto", encoding: str = "utf-8-sig",
+              stats: Optional[Dict] = None) -> Iterator[Row]:
+    """Stream validated rows from one CSV file; invalid lines are counted in ``stats``"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+    stats = stats if stats is not None else {"invalid": 0}
+    with _open(path, encoding) as f:
+        reader = (line for line in csv.reader(f) if line and any(cell.strip() for cell in line))
+        header = next(reader, None)
+        if header is None:
+            return
+        if fmt == "auto":
+            fmt = detect_format(header)
+        rows = _bot_rows if fmt == "bot" else _generic_rows
+        yield from rows(reader, header, _DateParser(), stats)
+
+
+def connect(db_file: str) -> sqlite3.Connection:
+    """Open a connection tuned for bulk writes into twd_exchange_rates"""
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.execute(SCHEMA_SQL)
+    # Safe in WAL mode: a crash can lose the last chunks but never corrupt the file
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def write_rows(conn: sqlite3.Connection, rows: List[Row], replace: bool = False) -> int:
+    """Insert one chunk of rows and return how many were written
+
+    Must run inside a transaction owned by the caller, so a chunk can be
+    committed together with other bookkeeping such as a checkpoint.
+    """
+    rows.sort(key=lambda row: (row[0], row[3]))
+    before = conn.total_changes
+    with metrics.DB_OPERATION_SECONDS.time(operation='import'):
+        conn.executemany(INSERT_SQL[replace], rows)
+    return conn.total_changes - before
+
+
+def import_csv(db_file: str, paths: Sequence[str], fmt: str = "auto", chunk_rows: int = 50000,
+               currencies: Optional[Sequence[str]] = None, replace: bool = False,
+               encoding: str = "utf-8-sig") -> Dict:
+    """Bulk load historical CSV files into twd_exchange_rates
+
+    Rows are deduplicated by the ``UNIQUE(currency, timestamp)`` constraint:
+    existing rows win unless ``replace`` is set, in which case the imported
+    rate and volume overwrite them. Each chunk of ``chunk_rows`` rows is
+    sorted by key and written in its own transaction, so the dashboard can
+    keep saving snapshots while a long import runs.
+    """
+    started = time.perf_counter()
+    wanted = {code.upper() for code in currencies} if currencies else None
+    stats = {"files": 0, "read": 0, "invalid": 0, "skipped": 0, "inserted": 0, "duplicates": 0, "seconds": 0.0}
+
+    conn = connect(db_file)
+
+    def flush(chunk: List[Row]):
+        with conn:
+            written = write_rows(conn, chunk, replace)
+        stats["inserted"] += written
+        stats["duplicates"] += len(chunk) - written
+        chunk.clear()
+
+    try:
+        for path in paths:
+            stats["files"] += 1
+            chunk: List[Row] = []
+            for row in iter_rows(path, fmt, encoding, stats):
+                stats["read"] += 1
+                if wanted is not None and row[0] not in wanted:
+                    stats["skipped"] += 1
+                    continue
+                chunk.append(row)
+                if len(chunk) >= chunk_rows:
+                    flush(chunk)
+            if chunk:
+                flush(chunk)
+            logger.info("Imported %s (%d rows read so far)", path, stats["read"])
+    finally:
+        conn.close()
+
+    # Upserts rewrite rows in place, which only a rebuild picks up
+    column_store.sync_if_enabled(db_file, rebuild=replace and stats["inserted"] > 0)
+    if replace and stats["inserted"]:
+        maintenance.mark_history_rewritten(db_file)
+    stats["seconds"] = time.perf_counter() - started
+    return stats
@@ -0,0 +1,426 @@
+"""Technical indicators over stored rate history, cached and updated incrementally.
+
+Ticks are bucketed into bars (``1h`` or ``1d`` resolution) with a high,
+low and close. Each indicator is a vectorized kernel that takes a run of
+bars plus the state carried from the bars before it, and returns its output
+columns and the state after the run:
+
+    sma:N            simple moving average
+    ema:N            exponential moving average
+    bb:N:K           Bollinger bands, N-bar mean +/- K standard deviations
+    rsi:N            Wilder's relative strength index
+    macd:F:S:G       MACD line, signal line and histogram
+    atr:N            Wilder's average true range
+
+:class:`IndicatorEngine` keeps the bars of every (currency, resolution) and
+the results of every (currency, resolution, spec) it has computed. The
+newest bar is still open, so results are stored with the state from just
+before it: a new tick re-buckets only the open bar and any newer ones and
+runs the kernels over those few bars, instead of recomputing ten years of
+history. Rewrites recorded by maintenance.mark_history_rewritten, or rows
+landing before the open bar, reload the series.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# Bar width per resolution, as a numpy datetime64 unit
+RESOLUTIONS = {"1h": "h", "1d": "D"}
+DEFAULT_RESOLUTION = "1d"
+
+
+def _ewm(values: "np.ndarray", alpha: float, seed: Optional[float]) -> "np.ndarray":
+    """y[t] = (1 - alpha) * y[t-1] + alpha * x[t], continuing from ``seed`` (None starts at x[0])"""
+    import numpy as np
+    import pandas as pd
+
+    if not len(values):
+        return np.array([], dtype=float)
+    if seed is None:
+        return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    return pd.Series(np.concatenate([[seed], values])).ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+
+
+def _warm_up(out: "np.ndarray", seen: int, bars: int) -> "np.ndarray":
+    """Blank the outputs of the first ``bars`` bars of the series; ``seen`` bars came before ``out``"""
+    out[:max(0, bars - seen)] = math.nan
+    return out
+
+
+def _windowed(close: "np.ndarray", n: int, state: Optional[Dict]) -> Tuple["np.ndarray", int, "np.ndarray"]:
+    """The carried tail joined with ``close``, where the first ``offset`` values are old"""
+    import numpy as np
+
+    tail = state["tail"] if state else np.array([], dtype=float)
+    values = np.concatenate([tail, close])
+    return values, len(tail), values[max(len(values) - (n - 1), 0):] if n > 1 else values[:0]
+
+
+def _sma(bars: Dict, params: Tuple, state: Optional[Dict]) -> Tuple[Dict, Dict]:
+    import numpy as np
+
+    n = int(params[0])
+    values, offset, tail = _windowed(bars["close"], n, state)
+    out = np.full(len(bars["close"]), math.nan)
+    if len(values) >= n:
+        # Shifted cumulative sums keep the differences precise over long series
+        sums = np.concatenate([[0.0], np.cumsum(values - values[0])])
+        means = (sums[n:] - sums[:-n]) / n + values[0]
+        # means[j] closes at values[j + n - 1]; keep the windows closing on new bars
+        first = max(offset - (n - 1), 0)
+        out[len(out) - (len(means) - first):] = means[first:]
+    return {"": out}, {"tail": tail}
+
+
+def _bb(bars: Dict, params: Tuple, state: Optional[Dict]) -> Tuple[Dict, Dict]:
+    import numpy as np
+
+    n, k = int(params[0]), float(params[1])
+    values, offset, tail = _windowed(bars["close"], n, state)
+    mid = np.full(len(bars["close"]), math.nan)
+    spread = np.full(len(bars["close"]), math.nan)
+    if len(values) >= n:
+        first = max(offset - (n - 1), 0)
+        windows = np.lib.stride_tricks.sliding_window_view(values, n)[first:]
+        mid[len(mid) - len(windows):] = windows.mean(axis=1)
+        spread[len(spread) - len(windows):] = k * windows.std(axis=1)
+    return {"mid": mid, "upper": mid + spread, "lower": mid - spread}, {"tail": tail}
+
+
+def _ema(bars: Dict, params: Tuple, state: Optional[Dict]) -> Tuple[Dict, Dict]:
+    n = int(params[0])
+    seen = state["seen"] if state else 0
+    ema = _ewm(bars["close"], 2 / (n + 1), state["ema"] if state else None)
+    carried = {"ema": ema[-1] if len(ema) else (state or {}).get("ema"), "seen": seen + len(ema)}
+    return {"": _warm_up(ema.copy(), seen, n - 1)}, carried
+
+
+def _rsi(bars: Dict, params: Tuple, state: Optional[Dict]) -> Tuple[Dict, Dict]:
+    import numpy as np
+
+    n = int(params[0])
+    close = bars["close"]
+    state = state or {"prev": None, "gain": None, "loss": None, "seen": 0}
+    # The first bar of the series has no change; later runs diff against the carried close
+    changes = np.diff(close if state["prev"] is None else np.concatenate([[state["prev"]], close]))
+    gain = _ewm(np.maximum(changes, 0.0), 1 / n, state["gain"])
+    loss = _ewm(np.maximum(-changes, 0.0), 1 / n, state["loss"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(loss > 0, 100 - 100 / (1 + gain / loss), np.where(gain > 0, 100.0, 50.0))
+    out = np.concatenate([np.full(len(close) - len(rsi), math.nan), rsi])
+    carried = {
+        "prev": close[-1] if len(close) else state["prev"],
+        "gain": gain[-1] if len(gain) else state["gain"],
+        "loss": loss[-1] if len(loss) else state["loss"],
+        "seen": state["seen"] + len(close),
+    }
+    return {"": _warm_up(out, state["seen"], n)}, carried
+
+
+def _macd(bars: Dict, params: Tuple, state: Optional[Dict]) -> Tuple[Dict, Dict]:
+    fast, slow, signal = (int(p) for p in params)
+    close = bars["close"]
+    seen = state["seen"] if state else 0
+    ema_fast = _ewm(close, 2 / (fast + 1), state["fast"] if state else None)
+    ema_slow = _ewm(close, 2 / (slow + 1), state["slow"] if state else None)
+    line = ema_fast - ema_slow
+    signal_line = _ewm(line, 2 / (signal + 1), state["signal"] if state else None)
+    if not len(close):
+        return {"": line, "signal": signal_line, "hist": line.copy()}, state
+    carried = {"fast": ema_fast[-1], "slow": ema_slow[-1], "signal": signal_line[-1], "seen": seen + len(close)}
+    hist = _warm_up(line - signal_line, seen, slow + signal - 2)
+    return {"": _warm_up(line.copy(), seen, slow - 1), "signal": _warm_up(signal_line.copy(), seen, slow + signal - 2),
+            "hist": hist}, carried
+
+
+def _atr(bars: Dict, params: Tuple, state: Optional[Dict]) -> Tuple[Dict, Dict]:
+    import numpy as np
+
+    n = int(params[0])
+    high, low, close = bars["high"], bars["low"], bars["close"]
+    if not len(close):
+        return {"": close.copy()}, state
+    seen = state["seen"] if state else 0
+    previous = np.concatenate([[state["prev"] if state else close[0]], close[:-1]])
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - previous), np.abs(low - previous)))
+    if not state:
+        true_range[0] = high[0] - low[0]
+    atr = _ewm(true_range, 1 / n, state["atr"] if state else None)
+    carried = {"prev": close[-1], "atr": atr[-1], "seen": seen + len(close)}
+    return {"": _warm_up(atr.copy(), seen, n - 1)}, carried
+
+
+# name -> (kernel, default parameters, plotted on the price axis)
+INDICATORS = {
+    "sma": (_sma, (20,), True),
+    "ema": (_ema, (20,), True),
+    "bb": (_bb, (20, 2.0), True),
+    "rsi": (_rsi, (14,), False),
+    "macd": (_macd, (12, 26, 9), False),
+    "atr": (_atr, (14,), False),
+}
+
+
+def parse_spec(spec: str) -> Tuple[str, Tuple]:
+    """'bb:20:2' -> ('bb', (20, 2.0)); missing parameters take the defaults"""
+    name, *given = spec.strip().lower().split(":")
+    if name not in INDICATORS:
+        raise ValueError(f"Unknown indicator {name!r}; choose from {', '.join(INDICATORS)}")
+    defaults = INDICATORS[name][1]
+    if len(given) > len(defaults):
+        raise ValueError(f"{name} takes at most {len(defaults)} parameters")
+    params = []
+    for default, value in zip(defaults, given + [None] * (len(defaults) - len(given))):
+        number = default if value in (None, "") else float(value)
+        if number <= 0 or (isinstance(default, int) and number != int(number)):
+            raise ValueError(f"Invalid parameter {value!r} for {name}")
+        params.append(int(number) if isinstance(default, int) else number)
+    return name, tuple(params)
+
+
+def format_spec(spec: str) -> str:
+    """Canonical form of a spec, used in cache keys and column names: 'BB:20' -> 'bb:20:2'"""
+    name, params = parse_spec(spec)
+    return ":".join([name, *(f"{p:g}" for p in params)])
+
+
+def columns(spec: str) -> List[str]:
+    """Output column names of a spec, e.g. ['macd_12_26_9', 'macd_12_26_9_signal', 'macd_12_26_9_hist']"""
+    base = format_spec(spec).replace(":", "_")
+    name = parse_spec(spec)[0]
+    if name == "bb":
+        return [f"{base}_mid", f"{base}_upper", f"{base}_lower"]
+    if name == "macd":
+        return [base, f"{base}_signal", f"{base}_hist"]
+    return [base]
+
+
+def label(spec: str) -> str:
+    """Display name of a spec: 'macd' -> 'MACD(12, 26, 9)'"""
+    name, params = parse_spec(spec)
+    return f"{name.upper()}({', '.join(f'{p:g}' for p in params)})"
+
+
+def is_overlay(spec: str) -> bool:
+    """True for indicators drawn on the rate axis, False for oscillators drawn below it"""
+    return INDICATORS[parse_spec(spec)[0]][2]
+
+
+def _run(spec: str, bars: Dict, state: Optional[Dict]) -> Tuple[Dict[str, "np.ndarray"], Optional[Dict]]:
+    """Run one spec's kernel, naming its outputs like :func:`columns`"""
+    name, params = parse_spec(spec)
+    outputs, carried = INDICATORS[name][0](bars, params, state)
+    base = format_spec(spec).replace(":", "_")
+    return {f"{base}_{key}" if key else base: value for key, value in outputs.items()}, carried
+
+
+def to_bars(ts: "np.ndarray", rates: "np.ndarray", resolution: str = DEFAULT_RESOLUTION) -> Dict[str, "np.ndarray"]:
+    """Bucket time-ordered ticks into bars: time (bar start), high, low and close"""
+    import numpy as np
+
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution!r}; choose from {', '.join(RESOLUTIONS)}")
+    rates = np.asarray(rates, dtype=float)
+    keys = np.asarray(ts, dtype="datetime64[ns]").astype(f"datetime64[{RESOLUTIONS[resolution]}]")
+    if not len(keys):
+        empty = np.array([], dtype=float)
+        return {"time": keys.astype("datetime64[ns]"), "high": empty, "low": empty, "close": empty}
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    ends = np.append(starts[1:], len(keys)) - 1
+    return {
+        "time": keys[starts].astype("datetime64[ns]"),
+        "high": np.maximum.reduceat(rates, starts),
+        "low": np.minimum.reduceat(rates, starts),
+        "close": rates[ends],
+    }
+
+
+def _frame(bars: Dict, outputs: Dict[str, "np.ndarray"], start: Optional[datetime] = None,
+           end: Optional[datetime] = None) -> "pd.DataFrame":
+    import pandas as pd
+
+    frame = pd.DataFrame({"close": bars["close"], **outputs}, index=pd.DatetimeIndex(bars["time"], name="timestamp"))
+    if start is not None or end is not None:
+        frame = frame.loc[start:end]
+    return frame
+
+
+def compute(history: "pd.DataFrame", specs: Sequence[str], resolution: str = DEFAULT_RESOLUTION
+            ) -> "pd.DataFrame":
+    """Indicators over a rate frame indexed by timestamp, without caching (e.g. simulated history)"""
+    import numpy as np
+
+    if history.empty:
+        return _frame(to_bars(np.array([], dtype="datetime64[ns]"), []), {})
+    history = history.sort_index()
+    bars = to_bars(history.index.values, history["rate"].to_numpy(), resolution)
+    outputs = {}
+    for spec in specs:
+        outputs.update(_run(spec, bars, None)[0])
+    return _frame(bars, outputs)
+
+
+def _slice(bars: Dict, lo: int, hi: Optional[int] = None) -> Dict:
+    return {key: values[lo:hi] for key, values in bars.items()}
+
+
+class IndicatorEngine:
+    """Bars and indicator results of one database, kept current between calls
+
+    Bars are held per (currency, resolution) with the id watermark they
+    reflect; results per (currency, resolution, spec) with the bar version
+    they were computed for and the kernel state just before the open bar.
+    """
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._series: Dict[Tuple[str, str], Dict] = {}
+        self._results: Dict[Tuple[str, str, str], Dict] = {}
+        self._lock = threading.Lock()
+
+    def _load_ticks(self, conn: sqlite3.Connection, currency: str, since: Optional[str] = None
+                    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Time-ordered (ts, rate) of a currency, from the column store when loading everything"""
+        import numpy as np
+
+        from column_store import ColumnStore
+
+        if since is None:
+            store = ColumnStore.from_env(self.db_file)
+            if store is not None:
+                store.sync()
+                columns = store.columns(currency)
+                if columns is not None:
+                    return columns[0].view("datetime64[ns]").copy(), np.array(columns[1], dtype=float)
+        query = "SELECT timestamp, rate FROM twd_exchange_rates WHERE currency = ?"
+        params: Tuple = (currency,)
+        if since is not None:
+            query += " AND timestamp >= ?"
+            params += (since,)
+        rows = conn.execute(query + " ORDER BY timestamp", params).fetchall()
+        if not rows:
+            return np.array([], dtype="datetime64[ns]"), np.array([], dtype=float)
+        ts, rates = zip(*rows)
+        return np.array(ts, dtype="datetime64[ns]"), np.array(rates, dtype=float)
+
+    def _sync(self, conn: sqlite3.Connection, currency: str, resolution: str) -> Dict:
+        """Bring the bars of (currency, resolution) up to the committed rows"""
+        import numpy as np
+
+        # maintenance imports tracker, which imports this module
+        import maintenance
+
+        key = (currency, resolution)
+        series = self._series.get(key)
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM twd_exchange_rates").fetchone()[0]
+        generation = maintenance.history_generation(conn)
+        if series is not None and series["last_id"] == max_id and series["generation"] == generation:
+            return series
+
+        if series is not None and series["generation"] == generation and max_id > series["last_id"]:
+            # +currency keeps SQLite on the rowid range instead of scanning the currency index
+            earliest = conn.execute(
+                "SELECT MIN(timestamp) FROM twd_exchange_rates WHERE id > ? AND +currency = ?",
+                (series["last_id"], currency)
+            ).fetchone()[0]
+            bars = series["bars"]
+            if earliest is None:
+                series["last_id"] = max_id
+                return series
+            open_bar = str(bars["time"][-1]).replace("T", " ")[:19] if len(bars["time"]) else None
+            if open_bar is not None and earliest >= open_bar:
+                # Only the open bar and newer ones change: re-bucket them and keep the rest
+                ts, rates = self._load_ticks(conn, currency, since=open_bar)
+                fresh = to_bars(ts, rates, resolution)
+                kept = len(bars["time"]) - 1
+                series["bars"] = {name: np.concatenate([values[:kept], fresh[name]]) for name, values in bars.items()}
+                series["version"] += 1
+                series["last_id"] = max_id
+                return series
+
+        ts, rates = self._load_ticks(conn, currency)
+        series = self._series[key] = {
+            "bars": to_bars(ts, rates, resolution),
+            "last_id": max_id,
+            "generation": generation,
+            "epoch": (series["epoch"] + 1) if series is not None else 0,
+            "version": 0,
+        }
+        return series
+
+    def _result(self, currency: str, resolution: str, spec: str, series: Dict) -> Dict:
+        """Outputs of a spec over the series, recomputing only from the open bar on"""
+        import numpy as np
+
+        key = (currency, resolution, spec)
+        result = self._results.get(key)
+        bars = series["bars"]
+        if result is not None and result["epoch"] == series["epoch"] and result["version"] == series["version"]:
+            return result
+        if result is not None and result["epoch"] == series["epoch"]:
+            # Bars before the previous open bar are unchanged
+            lo, state, kept = result["length"] - 1, result["state"], result["outputs"]
+        else:
+            lo, state, kept = 0, None, None
+        closed, carried = _run(spec, _slice(bars, lo, -1), state)
+        last, _ = _run(spec, _slice(bars, -1), carried)
+        outputs = {}
+        for name in closed:
+            parts = [closed[name], last[name]]
+            if kept is not None:
+                parts.insert(0, kept[name][:lo])
+            outputs[name] = np.concatenate(parts)
+        result = self._results[key] = {
+            "epoch": series["epoch"], "version": series["version"],
+            "length": len(bars["close"]), "state": carried, "outputs": outputs,
+        }
+        return result
+
+    def frame(self, currency: str, specs: Sequence[str], resolution: str = DEFAULT_RESOLUTION,
+              start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional["pd.DataFrame"]:
+        """Bars' close and indicator columns from ``start``; None when the currency has no stored rows"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution!r}; choose from {', '.join(RESOLUTIONS)}")
+        specs = [format_spec(spec) for spec in specs]
+        with self._lock:
+            started = time.perf_counter()
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            try:
+                # One snapshot for the watermark and the rows it covers
+                conn.execute("BEGIN")
+                series = self._sync(conn, currency, resolution)
+            except sqlite3.OperationalError:
+                return None
+            finally:
+                conn.close()
+            if not len(series["bars"]["close"]):
+                return None
+            outputs = {}
+            for spec in specs:
+                outputs.update(self._result(currency, resolution, spec, series)["outputs"])
+            frame = _frame(series["bars"], outputs, start, end)
+            metrics.DB_OPERATION_SECONDS.observe(time.perf_counter() - started, operation='indicators')
+            return frame
+
+
+_ENGINES: Dict[str, IndicatorEngine] = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def engine(db_file: str) -> IndicatorEngine:
+    """The shared indicator engine of a database"""
+    key = os.path.abspath(db_file)
+    with _ENGINES_LOCK:
+        if key not in _ENGINES:
+            _ENGINES[key] = IndicatorEngine(db_file)
+        return _ENGINES[key]
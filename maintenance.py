@@ -0,0 +1,380 @@
+"""Maintenance jobs for the twd_exchange_rates SQLite database.
+
+Like tracker.py this module only needs the standard library, so the jobs run
+from cli.py without loading the dashboard.
+"""
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import analytics
+import column_store
+from tracker import SCHEMA_SQL
+
+logger = logging.getLogger(__name__)
+
+# Tick-level rows older than this many days are downsampled to daily bars
+DEFAULT_RETENTION_DAYS = int(os.environ.get("TRACKER_RETENTION_DAYS", "90"))
+
+META_TABLE = "tracker_maintenance"
+HISTORY_GENERATION_KEY = "history_generation"
+
+# Snapshots taken by the dashboard and CLI go here unless a path is given
+DEFAULT_BACKUP_DIR = os.environ.get("TRACKER_BACKUP_DIR", "backups")
+
+
+def _ensure_meta_table(conn: sqlite3.Connection):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+    conn.commit()
+
+
+def _get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute(f"SELECT value FROM {META_TABLE} WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_meta(conn: sqlite3.Connection, key: str, value: str):
+    conn.execute(f"INSERT OR REPLACE INTO {META_TABLE} (key, value) VALUES (?, ?)", (key, value))
+
+
+def mark_history_rewritten(db_file: str):
+    """Record that stored rows were deleted or changed in place
+
+    Readers that follow new rows by id (the Parquet mirror, portfolio rate
+    matrices) cannot see such changes and reload when the marker moves.
+    """
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        _ensure_meta_table(conn)
+        with conn:
+            _set_meta(conn, HISTORY_GENERATION_KEY, str(time.time_ns()))
+    finally:
+        conn.close()
+    analytics.invalidate_mirror(db_file)
+
+
+def history_generation(conn: sqlite3.Connection) -> Optional[str]:
+    """The marker set by mark_history_rewritten, or None if history was never rewritten"""
+    try:
+        return _get_meta(conn, HISTORY_GENERATION_KEY)
+    except sqlite3.OperationalError:
+        # No meta table yet
+        return None
+
+
+def _next_day(day: str) -> str:
+    return (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def _db_size(db_file: str) -> int:
+    return os.path.getsize(db_file) if os.path.exists(db_file) else 0
+
+
+def _compact_window(conn: sqlite3.Connection, currency: str, start: str, end: str) -> Dict:
+    """Replace the rows of one currency in [start, end) with one bar per day
+
+    Must run inside a write transaction. The daily bar keeps the day's closing
+    rate in ``rate`` and the summed volume in ``volume`` at midnight, so
+    existing readers see it as an ordinary row.
+    """
+    # With a single max() aggregate SQLite takes the bare ``rate`` column from
+    # the row holding the latest timestamp, i.e. the day's close
+    bars = conn.execute('''
+        SELECT date(timestamp) AS day, rate, MAX(timestamp), COALESCE(SUM(volume), 0), COUNT(*)
+        FROM twd_exchange_rates
+        WHERE currency = ? AND timestamp >= ? AND timestamp < ?
+        GROUP BY day
+    ''', (currency, start, end)).fetchall()
+
+    raw_rows = sum(bar[4] for bar in bars)
+    already_compacted = all(count == 1 and last == f"{day} 00:00:00" for day, _, last, _, count in bars)
+    if not bars or already_compacted:
+        return {"raw_rows": raw_rows, "deleted": 0, "bars": 0}
+
+    deleted = conn.execute(
+        "DELETE FROM twd_exchange_rates WHERE currency = ? AND timestamp >= ? AND timestamp < ?",
+        (currency, start, end)
+    ).rowcount
+    conn.executemany(
+        "INSERT INTO twd_exchange_rates (currency, rate, volume, timestamp) VALUES (?, ?, ?, ?)",
+        [(currency, rate, volume, f"{day} 00:00:00") for day, rate, _, volume, _ in bars]
+    )
+    return {"raw_rows": raw_rows, "deleted": deleted, "bars": len(bars)}
+
+
+def incremental_vacuum(conn: sqlite3.Connection, pages_per_step: int = 1000, pause: float = 0.0) -> int:
+    """Return free pages to the OS in small steps; returns the pages freed
+
+    Only works when the database uses ``auto_vacuum = INCREMENTAL``. Each step
+    is a short write transaction, so other sessions are never blocked for long.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    freed = 0
+    while True:
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages == 0:
+            return freed
+        # execute() steps a statement only once, which frees a single page;
+        # executescript() runs the pragma to completion
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages_per_step)});")
+        freed += free_pages - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if pause:
+            time.sleep(pause)
+
+
+def enable_incremental_vacuum(conn: sqlite3.Connection):
+    """Switch an existing database to incremental auto-vacuum
+
+    This needs one full VACUUM, which rewrites the file under an exclusive lock,
+    so it is an explicit opt-in rather than part of every compaction run.
+    """
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def compact_history(db_file: str, older_than_days: int = DEFAULT_RETENTION_DAYS, batch_rows: int = 5000,
+                    pause: float = 0.0, vacuum_pages: int = 1000, full: bool = False,
+                    convert_auto_vacuum: bool = False, now: Optional[datetime] = None) -> Dict:
+    """Downsample tick-level rows older than ``older_than_days`` into daily bars
+
+    Work is split into windows of whole days holding about ``batch_rows`` raw
+    rows per currency, each in its own short transaction, with an optional
+    ``pause`` between them so dashboard sessions can write in between. Progress
+    is checkpointed per currency, so repeated runs only touch newly expired
+    days; ``full`` rescans everything (e.g. after importing older history).
+    """
+    started = time.perf_counter()
+    now = now or datetime.now()
+    cutoff = (now - timedelta(days=older_than_days)).strftime("%Y-%m-%d") + " 00:00:00"
+    size_before = _db_size(db_file)
+
+    conn = sqlite3.connect(db_file, timeout=30)
+    _ensure_meta_table(conn)
+    if convert_auto_vacuum and conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        logger.info("Converting %s to incremental auto-vacuum (full VACUUM)", db_file)
+        enable_incremental_vacuum(conn)
+
+    result = {"cutoff": cutoff, "currencies": 0, "windows": 0, "raw_rows": 0, "deleted": 0, "bars": 0}
+    currencies = [row[0] for row in conn.execute("SELECT DISTINCT currency FROM twd_exchange_rates")]
+    for currency in currencies:
+        watermark_key = f"compacted_through:{currency}"
+        start = "" if full else (_get_meta(conn, watermark_key) or "")
+        if start >= cutoff:
+            continue
+        result["currencies"] += 1
+        while start < cutoff:
+            # End the window on the day boundary after about batch_rows rows
+            row = conn.execute('''
+                SELECT timestamp FROM twd_exchange_rates
+                WHERE currency = ? AND timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp LIMIT 1 OFFSET ?
+            ''', (currency, start, cutoff, batch_rows)).fetchone()
+            if row is None:
+                end = cutoff
+            else:
+                end = row[0][:10] + " 00:00:00"
+                if end <= start:
+                    # A single day holds more than batch_rows rows
+                    end = _next_day(row[0][:10]) + " 00:00:00"
+                end = min(end, cutoff)
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                window = _compact_window(conn, currency, start, end)
+                _set_meta(conn, watermark_key, end)
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            result["windows"] += 1
+            for key in ("raw_rows", "deleted", "bars"):
+                result[key] += window[key]
+            start = end
+            if pause:
+                time.sleep(pause)
+
+    result["pages_freed"] = incremental_vacuum(conn, vacuum_pages, pause)
+    conn.close()
+    # Bars replace ticks in the past, so the affected currencies are rebuilt
+    column_store.sync_if_enabled(db_file)
+    if result["deleted"]:
+        mark_history_rewritten(db_file)
+    result["size_before"] = size_before
+    result["size_after"] = _db_size(db_file)
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def snapshot_path(db_file: str, backup_dir: str = DEFAULT_BACKUP_DIR, now: Optional[datetime] = None) -> str:
+    """Timestamped snapshot file name for ``db_file`` inside ``backup_dir``
+
+    Stamps go down to the microsecond and a ``-N`` suffix is added if the name
+    is still taken, so two snapshots never share a file.
+    """
+    name, ext = os.path.splitext(os.path.basename(db_file))
+    stamp = (now or datetime.now()).strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(backup_dir, f"{name}-{stamp}{ext or '.db'}")
+    counter = 1
+    while os.path.exists(path):
+        path = os.path.join(backup_dir, f"{name}-{stamp}-{counter}{ext or '.db'}")
+        counter += 1
+    return path
+
+
+def list_snapshots(db_file: str, backup_dir: str = DEFAULT_BACKUP_DIR) -> List[str]:
+    """Snapshots of ``db_file`` in ``backup_dir``, newest first"""
+    if not os.path.isdir(backup_dir):
+        return []
+    name, ext = os.path.splitext(os.path.basename(db_file))
+    snapshots = [os.path.join(backup_dir, f) for f in os.listdir(backup_dir)
+                 if f.startswith(f"{name}-") and f.endswith(ext or ".db")]
+    return sorted(snapshots, reverse=True)
+
+
+class _BackupRestarted(Exception):
+    """Raised from the progress callback to abandon a copy SQLite restarted"""
+
+
+def backup_database(db_file: str, dest: Optional[str] = None, pages_per_step: int = 1024, sleep: float = 0.005,
+                    verify: bool = False, progress: Optional[Callable[[int, int, int], None]] = None) -> str:
+    """Take a consistent online snapshot with the SQLite backup API
+
+    Pages are copied in steps of ``pages_per_step`` with a ``sleep`` between
+    them, so the live database is only locked for one short step at a time and
+    dashboard sessions keep reading and writing. A write from another session
+    makes SQLite restart the copy; when that happens the step size is
+    quadrupled, ending in a single-step copy that readers never wait for and
+    writers wait for only once. The copy goes to a temporary file first and is
+    renamed into place when complete; an existing ``dest`` is never replaced.
+    """
+    dest = dest or snapshot_path(db_file)
+    if os.path.exists(dest):
+        raise FileExistsError(f"Snapshot {dest} already exists")
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    partial = f"{dest}.partial"
+
+    source = sqlite3.connect(db_file, timeout=30)
+    try:
+        total_pages = source.execute("PRAGMA page_count").fetchone()[0]
+        pages = pages_per_step
+        while True:
+            if os.path.exists(partial):
+                os.remove(partial)
+            target = sqlite3.connect(partial)
+            copied = [0]
+
+            def on_progress(status, remaining, total):
+                done = total - remaining
+                if done < copied[0]:
+                    raise _BackupRestarted()
+                copied[0] = done
+                if progress:
+                    progress(status, remaining, total)
+
+            try:
+                source.backup(target, pages=pages, progress=on_progress, sleep=sleep)
+                break
+            except _BackupRestarted:
+                pages = -1 if pages <= 0 or pages * 4 >= total_pages else pages * 4
+                logger.info("Backup of %s restarted by a concurrent write; retrying with %s pages per step",
+                            db_file, "all" if pages < 0 else pages)
+            finally:
+                target.close()
+
+        if verify:
+            check = sqlite3.connect(partial)
+            try:
+                status = check.execute("PRAGMA quick_check").fetchone()[0]
+            finally:
+                check.close()
+            if status != "ok":
+                raise sqlite3.DatabaseError(f"Snapshot failed integrity check: {status}")
+    except Exception:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        source.close()
+    try:
+        # Unlike os.replace, a hard link fails if dest appeared meanwhile
+        os.link(partial, dest)
+    finally:
+        os.remove(partial)
+    return dest
+
+
+def _copy_into_live(source_file: str, db_file: str):
+    """Overwrite the live database in place with ``source_file``
+
+    A single-step backup replaces every page inside one write transaction, so
+    sessions see either the old or the new database, never a mix. Because the
+    file itself is not deleted, open connections stay valid.
+    """
+    source = sqlite3.connect(source_file)
+    target = sqlite3.connect(db_file, timeout=30)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def restore_database(db_file: str, snapshot: str, safety_backup: bool = True) -> Optional[str]:
+    """Replace the live database with ``snapshot``; returns the safety backup path
+
+    The snapshot is checked before anything is touched. Unless disabled, the
+    current database is snapshotted first so a restore can be undone.
+    """
+    conn = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+    try:
+        status = conn.execute("PRAGMA quick_check").fetchone()[0]
+        has_table = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'twd_exchange_rates'"
+        ).fetchone()
+    finally:
+        conn.close()
+    if status != "ok" or not has_table:
+        raise ValueError(f"{snapshot} is not a valid tracker database ({status})")
+
+    previous = None
+    if safety_backup and os.path.exists(db_file):
+        dest = snapshot_path(db_file)
+        if os.path.abspath(dest) == os.path.abspath(snapshot):
+            raise ValueError(f"Safety backup would overwrite the snapshot being restored: {snapshot}")
+        previous = backup_database(db_file, dest)
+    _copy_into_live(snapshot, db_file)
+    column_store.sync_if_enabled(db_file, rebuild=True)
+    mark_history_rewritten(db_file)
+    return previous
+
+
+def reset_database(db_file: str, safety_backup: bool = True) -> Optional[str]:
+    """Atomically swap in an empty database for all sessions
+
+    Replaces the old delete-the-file reset: the fresh schema is built in a
+    temporary file and copied over the live database in one transaction, and
+    by default the old contents are snapshotted first. Returns the snapshot path.
+    """
+    previous = backup_database(db_file) if safety_backup and os.path.exists(db_file) else None
+
+    fresh = f"{db_file}.fresh"
+    if os.path.exists(fresh):
+        os.remove(fresh)
+    conn = sqlite3.connect(fresh)
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute(SCHEMA_SQL)
+        conn.commit()
+    finally:
+        conn.close()
+    try:
+        _copy_into_live(fresh, db_file)
+    finally:
+        os.remove(fresh)
+    column_store.sync_if_enabled(db_file, rebuild=True)
+    mark_history_rewritten(db_file)
+    return previous
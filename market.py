@@ -0,0 +1,222 @@
+"""Shared, read-only market snapshot: built once per ingest, used by every dashboard session.
+
+Streamlit reruns the script for every interaction of every session. Rather
+than each run fetching upstream rates, saving them and rebuilding the same
+frames, :func:`current` hands every session the database's current
+:class:`MarketSnapshot`, which holds
+
+* ``rates``: the last fetched TWD rates of every quoted currency;
+* ``previous``: each tracked currency's previous stored tick;
+* the forward-filled daily closes (date x currency) over CLOSE_DAYS, one
+  read-only array wrapped in a DataFrame without copying;
+* statistics, volume rankings and rebased closes, computed on first
+  request and memoized.
+
+Everything handed out is read-only: mappings are MappingProxyType and the
+arrays are marked unwriteable. pandas 3 always copies on write (hence the
+pandas>=3 requirement), so the row windows and column selections returned
+by :meth:`MarketSnapshot.closes` are views, and a session that modifies one
+gets a private copy instead of changing the shared array. Memory therefore grows with the distinct views requested
+per snapshot, not with the number of sessions.
+
+Upstream is fetched at most every TRACKER_SNAPSHOT_SECONDS (default 60)
+across sessions, and the rates are saved as before. A new snapshot, one
+version up, is built when the database gained rows (from that fetch or the
+collector CLI) or history was rewritten. Sessions still holding the old
+snapshot keep a consistent view until their next run.
+"""
+import os
+import sqlite3
+import threading
+import time
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, Mapping, Optional, Sequence, Tuple
+
+import crosses
+import maintenance
+import metrics
+import trading_volume
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from tracker import TWDCurrencyTracker
+
+DEFAULT_TTL_SECONDS = 60
+# The longest dashboard period plus the longest rolling correlation window
+CLOSE_DAYS = 3650 + 365
+
+
+def ttl_from_env() -> float:
+    """TRACKER_SNAPSHOT_SECONDS: minimum seconds between upstream fetches"""
+    try:
+        return max(float(os.environ.get("TRACKER_SNAPSHOT_SECONDS", DEFAULT_TTL_SECONDS)), 0.0)
+    except ValueError:
+        return DEFAULT_TTL_SECONDS
+
+
+def _freeze(value):
+    """Nested dicts as read-only mappings"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    return value
+
+
+def _read_only(frame: "pd.DataFrame") -> "pd.DataFrame":
+    """``frame`` over one unwriteable float array, shared rather than copied by later selections"""
+    import pandas as pd
+
+    values = frame.to_numpy(dtype=float, copy=True)
+    values.flags.writeable = False
+    return pd.DataFrame(values, index=frame.index, columns=frame.columns, copy=False)
+
+
+def _watermark(db_file: str) -> Tuple[int, Optional[str]]:
+    """(highest row id, history generation): changes whenever stored history does"""
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        conn.execute("BEGIN")
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM twd_exchange_rates").fetchone()[0]
+        return max_id, maintenance.history_generation(conn)
+    finally:
+        conn.close()
+
+
+class MarketSnapshot:
+    """Rates, previous ticks and daily closes at one version of the database"""
+
+    def __init__(self, version: int, watermark: Tuple[int, Optional[str]], fetched_at: float,
+                 rates: Mapping[str, float], previous: Mapping[str, float], closes: "pd.DataFrame"):
+        self.version = version
+        self.watermark = watermark
+        self.fetched_at = fetched_at
+        self.rates = MappingProxyType(dict(rates))
+        self.previous = MappingProxyType(dict(previous))
+        self._closes = _read_only(closes)
+        self._memo: Dict[Hashable, object] = {}
+        self._building: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _memoized(self, key: Hashable, build: Callable[[], object]):
+        """``build()`` once per key, however many sessions ask for it at the same time"""
+        with self._lock:
+            if key in self._memo:
+                metrics.record_cache('market_snapshot', True)
+                return self._memo[key]
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            if key not in self._memo:
+                metrics.record_cache('market_snapshot', False)
+                value = build()
+                with self._lock:
+                    self._memo[key] = value
+            return self._memo[key]
+
+    def display_rates(self, base: str = crosses.HOME_CURRENCY) -> Mapping[str, float]:
+        """``rates`` priced in ``base``, TWD included"""
+        return self._memoized(("rates", base), lambda: MappingProxyType(crosses.rebase_rates(self.rates, base)))
+
+    def previous_rates(self, base: str = crosses.HOME_CURRENCY) -> Mapping[str, float]:
+        """``previous`` priced in ``base``; empty without a previous tick of ``base``"""
+        return self._memoized(("previous", base),
+                              lambda: MappingProxyType(crosses.rebase_rates(self.previous, base)))
+
+    def closes(self, currencies: Sequence[str], days: int, base: str = crosses.HOME_CURRENCY) -> "pd.DataFrame":
+        """Daily closes over the last ``days`` days (at most CLOSE_DAYS) priced in ``base``, as a view
+
+        Currencies outside the snapshot are NaN columns.
+        """
+        full = self._closes
+        if base != crosses.HOME_CURRENCY:
+            full = self._memoized(("closes", base), lambda: _read_only(crosses.rebase(self._closes, base)))
+        window = full.iloc[-(days + 1):]
+        if all(currency in full.columns for currency in currencies):
+            return window[list(currencies)]
+        return window.reindex(columns=list(currencies))
+
+    def statistics(self, tracker: "TWDCurrencyTracker", currencies: Sequence[str], days: int,
+                   base: str = crosses.HOME_CURRENCY) -> Mapping[str, Mapping]:
+        """tracker.get_statistics, computed once per snapshot and shared read-only"""
+        return self._memoized(
+            ("statistics", tuple(currencies), days, base),
+            lambda: _freeze(tracker.get_statistics(list(currencies), days, base))
+        )
+
+    def volume_ranking(self, tracker: "TWDCurrencyTracker", currencies: Sequence[str], days: int) -> "pd.DataFrame":
+        """Total, average and change of volume over ``days`` days per currency, unsorted (see trading_volume.top)
+
+        Stored volumes come from the volume leaderboard; currencies it cannot
+        answer for use :meth:`statistics`, with simulated volumes.
+        """
+        def build() -> "pd.DataFrame":
+            import pandas as pd
+
+            ranking = trading_volume.leaderboard(tracker.db_file).ranking(currencies, days)
+            missing = [currency for currency in currencies if currency not in ranking.index]
+            if missing:
+                ranking = pd.concat([ranking, trading_volume.from_statistics(self.statistics(tracker, missing, days))])
+            return _read_only(ranking)
+
+        return self._memoized(("volume_ranking", tuple(currencies), days), build)
+
+
+class _Market:
+    """Latest fetch and snapshot of one database"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rates: Optional[Dict[str, float]] = None
+        self.fetched_at = 0.0
+        self.snapshot: Optional[MarketSnapshot] = None
+
+
+_MARKETS: Dict[str, _Market] = {}
+_MARKETS_LOCK = threading.Lock()
+
+
+def _build(tracker: "TWDCurrencyTracker", market: _Market, watermark: Tuple[int, Optional[str]]) -> MarketSnapshot:
+    started = time.perf_counter()
+    # Display bases are kept even when untracked, so any session can rebase
+    currencies = list(dict.fromkeys([
+        *tracker.popular_currencies,
+        *(base for base in crosses.DISPLAY_BASES if base != crosses.HOME_CURRENCY),
+    ]))
+    snapshot = MarketSnapshot(
+        version=market.snapshot.version + 1 if market.snapshot else 1,
+        watermark=watermark,
+        fetched_at=market.fetched_at,
+        rates=market.rates,
+        previous=tracker.get_previous_rates(currencies),
+        closes=tracker.get_daily_closes(currencies, CLOSE_DAYS),
+    )
+    metrics.DB_OPERATION_SECONDS.observe(time.perf_counter() - started, operation='market_snapshot')
+    return snapshot
+
+
+def current(tracker: "TWDCurrencyTracker", ttl: Optional[float] = None) -> Optional[MarketSnapshot]:
+    """The shared snapshot of ``tracker``'s database, fetching and saving rates when they are ``ttl`` seconds old
+
+    While another session is fetching or building, an existing snapshot is
+    returned instead of waiting for it. None only if no rates were ever fetched.
+    """
+    ttl = ttl_from_env() if ttl is None else ttl
+    key = os.path.abspath(tracker.db_file)
+    with _MARKETS_LOCK:
+        market = _MARKETS.setdefault(key, _Market())
+    if not market.lock.acquire(blocking=market.snapshot is None):
+        return market.snapshot
+    try:
+        if market.rates is None or time.time() - market.fetched_at >= ttl:
+            rates = tracker.get_current_rates()
+            if rates:
+                tracker.save_rates_to_db(rates)
+                market.rates, market.fetched_at = rates, time.time()
+        if market.rates is None:
+            return market.snapshot
+        watermark = _watermark(tracker.db_file)
+        snapshot = market.snapshot
+        if snapshot is None or snapshot.watermark != watermark or snapshot.fetched_at != market.fetched_at:
+            market.snapshot = _build(tracker, market, watermark)
+        return market.snapshot
+    finally:
+        market.lock.release()
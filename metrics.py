@@ -0,0 +1,349 @@
+"""Prometheus text-format metrics for the TWD exchange rate tracker.
+
+Only the standard library is used, so the exporter adds no dependencies and
+needs no external services. Metrics can be scraped from a small HTTP endpoint
+(``TRACKER_METRICS_PORT``) or written to a node_exporter textfile collector
+(``TRACKER_METRICS_TEXTFILE``).
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from fast local SQLite calls to slow upstream APIs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    """Render a label set such as {source="exchangerate.host"}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value, keeping integers free of a trailing .0"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class holding the metric name, help text and label names"""
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        lines.extend(self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, optionally computed at scrape time"""
+    metric_type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 callback: Optional[Callable[[], Optional[float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def set_callback(self, callback: Optional[Callable[[], Optional[float]]]):
+        """Compute the (unlabelled) value lazily whenever metrics are rendered"""
+        self._callback = callback
+
+    def samples(self) -> List[str]:
+        if self._callback is not None:
+            try:
+                value = self._callback()
+            except Exception:
+                value = None
+            if value is not None:
+                self.set(value)
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds"""
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the wrapped block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def sum(self, **labels) -> float:
+        return self._sums.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+UPSTREAM_FETCH_SECONDS = REGISTRY.histogram(
+    'tracker_upstream_fetch_seconds',
+    'Latency of upstream exchange rate API requests',
+    ('source',)
+)
+UPSTREAM_FETCH_FAILURES = REGISTRY.counter(
+    'tracker_upstream_fetch_failures_total',
+    'Failed upstream exchange rate API requests by reason',
+    ('source', 'reason')
+)
+SIMULATED_FALLBACKS = REGISTRY.counter(
+    'tracker_simulated_fallbacks_total',
+    'Times simulated data was used because no real data was available',
+    ('kind',)
+)
+DB_OPERATION_SECONDS = REGISTRY.histogram(
+    'tracker_db_operation_seconds',
+    'Latency of SQLite operations on twd_exchange_rates',
+    ('operation',)
+)
+COMPUTE_SECONDS = REGISTRY.histogram(
+    'tracker_compute_seconds',
+    'Time spent in CPU-bound computations that do not touch the database',
+    ('operation',)
+)
+DB_LOCK_WAIT_SECONDS = REGISTRY.histogram(
+    'tracker_db_lock_wait_seconds',
+    'Time spent waiting for the SQLite write lock before saving a snapshot'
+)
+DB_LOCK_TIMEOUTS = REGISTRY.counter(
+    'tracker_db_lock_timeouts_total',
+    'Snapshots skipped because the SQLite write lock could not be acquired'
+)
+DB_ROWS = REGISTRY.gauge(
+    'tracker_db_rows',
+    'Rows currently stored in twd_exchange_rates'
+)
+HISTORY_CACHE_BYTES = REGISTRY.gauge(
+    'tracker_history_cache_bytes',
+    'Bytes held by the in-memory rate history cache'
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    'tracker_cache_requests_total',
+    'Cache lookups by cache name and result (hit or miss)',
+    ('cache', 'result')
+)
+
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache lookup; the hit ratio is hits / (hits + misses)"""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def write_textfile(path: str, registry: Registry = REGISTRY):
+    """Write metrics for the node_exporter textfile collector
+
+    The file is written next to its destination and renamed into place so the
+    collector never reads a partially written file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+def _make_handler(registry: Registry):
+    """Build the /metrics request handler; http.server is imported on first use"""
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would otherwise flood stderr
+            pass
+
+    return MetricsHandler
+
+
+_server: Optional["ThreadingHTTPServer"] = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port: int, addr: str = '0.0.0.0', registry: Registry = REGISTRY) -> "ThreadingHTTPServer":
+    """Serve /metrics from a daemon thread; repeated calls reuse the first server"""
+    global _server
+    from http.server import ThreadingHTTPServer
+
+    with _server_lock:
+        if _server is None:
+            server = ThreadingHTTPServer((addr, port), _make_handler(registry))
+            server.daemon_threads = True
+            thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+            thread.start()
+            _server = server
+        return _server
+
+
+def setup_from_env():
+    """Start the exporter configured through environment variables
+
+    TRACKER_METRICS_PORT starts the HTTP endpoint. It is safe to call on every
+    Streamlit rerun because the server is only started once per process.
+    """
+    port = os.environ.get('TRACKER_METRICS_PORT')
+    if port:
+        try:
+            start_http_server(int(port), os.environ.get('TRACKER_METRICS_ADDR', '0.0.0.0'))
+        except (OSError, ValueError):
+            # Another process already owns the port; metrics stay in-process
+            pass
+
+
+def flush_textfile():
+    """Write the textfile collector output if TRACKER_METRICS_TEXTFILE is set"""
+    path = os.environ.get('TRACKER_METRICS_TEXTFILE')
+    if path:
+        try:
+            write_textfile(path)
+        except OSError:
+            pass
@@ -0,0 +1,462 @@
+"""Portfolios of foreign-currency holdings, valued in TWD over time.
+
+Portfolios and their transactions are stored next to the rates, in the
+``portfolios`` and ``portfolio_transactions`` tables. A transaction buys
+(positive quantity) or sells (negative quantity) an amount of one currency
+at a TWD rate, with an optional TWD fee.
+
+Valuation is done on a daily grid. :class:`RateMatrix` holds the daily
+closing rate of every stored currency as a (day x currency) array and keeps
+it current incrementally: new ticks only reload the days they touch. The
+holdings of a portfolio become a matching (day x currency) array of
+cumulative quantities, and its value history is their row-wise product,
+``einsum('dc,dc->d')``, with no per-day Python loop.
+
+Cost is tracked with the average cost method. Selling releases the average
+cost of the units sold; the difference to the sale proceeds (less fees) is
+realized P&L. Unrealized P&L is market value minus remaining cost.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import maintenance
+import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+PORTFOLIO_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS portfolios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        created_at DATETIME
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS portfolio_transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        portfolio_id INTEGER NOT NULL REFERENCES portfolios(id),
+        currency TEXT NOT NULL,
+        quantity REAL NOT NULL,
+        rate REAL NOT NULL,
+        fee REAL NOT NULL DEFAULT 0,
+        timestamp DATETIME NOT NULL,
+        note TEXT
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_portfolio_transactions
+    ON portfolio_transactions (portfolio_id, timestamp)
+    ''',
+)
+
+
+def ensure_tables(conn: sqlite3.Connection):
+    for statement in PORTFOLIO_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+def _connect(db_file: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.row_factory = sqlite3.Row
+    ensure_tables(conn)
+    return conn
+
+
+def create_portfolio(db_file: str, name: str) -> int:
+    """Create a portfolio and return its id"""
+    name = name.strip()
+    if not name:
+        raise ValueError("Portfolio name must not be empty")
+    conn = _connect(db_file)
+    try:
+        with conn:
+            cursor = conn.execute("INSERT INTO portfolios (name, created_at) VALUES (?, ?)",
+                                  (name, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        return cursor.lastrowid
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Portfolio {name!r} already exists") from None
+    finally:
+        conn.close()
+
+
+def list_portfolios(db_file: str) -> List[Dict]:
+    conn = _connect(db_file)
+    try:
+        return [dict(row) for row in conn.execute("SELECT * FROM portfolios ORDER BY name")]
+    finally:
+        conn.close()
+
+
+def transactions(db_file: str, portfolio_id: int) -> List[Dict]:
+    """A portfolio's transactions in time order"""
+    conn = _connect(db_file)
+    try:
+        return [dict(row) for row in conn.execute(
+            "SELECT * FROM portfolio_transactions WHERE portfolio_id = ? ORDER BY timestamp, id", (portfolio_id,)
+        )]
+    finally:
+        conn.close()
+
+
+def add_transaction(db_file: str, portfolio_id: int, currency: str, quantity: float, rate: float,
+                    timestamp: Optional[str] = None, fee: float = 0.0, note: Optional[str] = None) -> int:
+    """Record a buy (quantity > 0) or sell (quantity < 0) at ``rate`` TWD per unit
+
+    Raises ValueError when a sale would leave the position negative at any
+    point in time, which also covers backdated sales.
+    """
+    if not quantity:
+        raise ValueError("Quantity must not be zero")
+    if rate <= 0:
+        raise ValueError("Rate must be positive")
+    timestamp = timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    currency = currency.upper()
+    conn = _connect(db_file)
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO portfolio_transactions (portfolio_id, currency, quantity, rate, fee, timestamp, note) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (portfolio_id, currency, float(quantity), float(rate), float(fee), timestamp, note)
+            )
+            if quantity < 0:
+                if _oversold_at(conn, portfolio_id, currency):
+                    raise ValueError(f"Selling {-quantity:g} {currency} exceeds the position held at {timestamp}")
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def _oversold_at(conn: sqlite3.Connection, portfolio_id: int, currency: str) -> Optional[str]:
+    """Timestamp of the first sale that takes the position negative, or None"""
+    position = 0.0
+    for change, timestamp in conn.execute(
+        "SELECT quantity, timestamp FROM portfolio_transactions WHERE portfolio_id = ? AND currency = ? "
+        "ORDER BY timestamp, id", (portfolio_id, currency)
+    ):
+        position += change
+        if position < -1e-9:
+            return timestamp
+    return None
+
+
+def delete_transaction(db_file: str, transaction_id: int) -> bool:
+    """Remove a transaction; returns False if there was none
+
+    Raises ValueError, leaving the transaction in place, when removing a buy
+    would leave a later sale without the position it sold from.
+    """
+    conn = _connect(db_file)
+    try:
+        with conn:
+            row = conn.execute("SELECT portfolio_id, currency, quantity FROM portfolio_transactions WHERE id = ?",
+                               (transaction_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM portfolio_transactions WHERE id = ?", (transaction_id,))
+            portfolio_id, currency, quantity = row
+            if quantity > 0:
+                oversold = _oversold_at(conn, portfolio_id, currency)
+                if oversold:
+                    raise ValueError(f"Removing this {currency} purchase leaves the sale at {oversold} "
+                                     "exceeding the position held")
+        return True
+    finally:
+        conn.close()
+
+
+def _ffill(values: "np.ndarray") -> "np.ndarray":
+    """Forward-fill NaNs down each column"""
+    import numpy as np
+
+    index = np.where(np.isnan(values), 0, np.arange(len(values))[:, None])
+    np.maximum.accumulate(index, axis=0, out=index)
+    return values[index, np.arange(values.shape[1])]
+
+
+class RateMatrix:
+    """Daily closing rates of every stored currency, as a (day x currency) array
+
+    ``closes`` holds the last rate of each day and NaN on days without a
+    row. :meth:`update` applies rows committed since the last call: rows on
+    or after the newest loaded day reload just those days of the affected
+    currencies. Anything older, or a rewrite recorded by
+    maintenance.mark_history_rewritten, reloads everything (from the column
+    store when it is enabled).
+    """
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self.first_day: Optional[date] = None
+        self.currencies: List[str] = []
+        self.closes: Optional["np.ndarray"] = None
+        self.last_id: Optional[int] = None
+        self.generation: Optional[str] = None
+        self._filled: Optional["np.ndarray"] = None
+        self._lock = threading.Lock()
+
+    def _column(self, currency: str) -> int:
+        import numpy as np
+
+        if currency not in self.currencies:
+            self.currencies.append(currency)
+            self.closes = np.hstack([self.closes, np.full((len(self.closes), 1), np.nan)])
+        return self.currencies.index(currency)
+
+    def _extend_to(self, day: date):
+        import numpy as np
+
+        missing = day.toordinal() - self.first_day.toordinal() + 1 - len(self.closes)
+        if missing > 0:
+            self.closes = np.vstack([self.closes, np.full((missing, len(self.currencies)), np.nan)])
+
+    def _apply(self, rows: Sequence[Tuple[str, str, float]]):
+        """Store (currency, YYYY-MM-DD, close) rows, growing the grid as needed"""
+        for currency, day, rate in rows:
+            parsed = date.fromisoformat(day)
+            self._extend_to(parsed)
+            column = self._column(currency)
+            self.closes[parsed.toordinal() - self.first_day.toordinal(), column] = rate
+
+    def _daily_closes(self, conn: sqlite3.Connection) -> Tuple[List[str], "np.ndarray", "np.ndarray"]:
+        """(currency, day, close) of every stored day, from the column store when enabled"""
+        import numpy as np
+
+        from column_store import ColumnStore
+
+        store = ColumnStore.from_env(self.db_file)
+        if store is not None:
+            store.sync()
+            currencies, days, rates = [], [], []
+            for currency in store.info():
+                ts, rate, _ = store.columns(currency)
+                day = ts.view("datetime64[ns]").astype("datetime64[D]")
+                # The last row of each day is its close
+                last = np.append(day[1:] != day[:-1], True)
+                currencies += [currency] * int(last.sum())
+                days.append(day[last])
+                rates.append(rate[last])
+            if currencies:
+                return currencies, np.concatenate(days), np.concatenate(rates)
+
+        # SQLite takes the bare rate column from the row holding MAX(timestamp)
+        rows = conn.execute(
+            "SELECT currency, substr(timestamp, 1, 10) AS day, rate, MAX(timestamp) "
+            "FROM twd_exchange_rates GROUP BY currency, day"
+        ).fetchall()
+        if not rows:
+            return [], np.array([], dtype="datetime64[D]"), np.array([])
+        currencies, days, rates, _ = zip(*rows)
+        return list(currencies), np.array(days, dtype="datetime64[D]"), np.array(rates, dtype=float)
+
+    def _load_all(self, conn: sqlite3.Connection):
+        import numpy as np
+
+        currencies, days, rates = self._daily_closes(conn)
+        if not currencies:
+            self.first_day, self.currencies, self.closes = date.today(), [], np.full((1, 0), np.nan)
+            return
+        self.currencies = sorted(set(currencies))
+        columns = np.searchsorted(self.currencies, currencies)
+        first = days.min()
+        self.first_day = first.astype(date)
+        offsets = (days - first).astype(np.int64)
+        self.closes = np.full((int(offsets.max()) + 1, len(self.currencies)), np.nan)
+        self.closes[offsets, columns] = rates
+
+    def _load_recent(self, conn: sqlite3.Connection, since_id: int) -> bool:
+        """Reload the days touched by rows above ``since_id``; False when they reach into the past"""
+        touched = conn.execute(
+            # +currency keeps SQLite on the rowid range instead of scanning the currency index
+            "SELECT currency, MIN(substr(timestamp, 1, 10)) FROM twd_exchange_rates WHERE id > ? GROUP BY +currency",
+            (since_id,)
+        ).fetchall()
+        newest = self.first_day.toordinal() + len(self.closes) - 1
+        if any(date.fromisoformat(day).toordinal() < newest for _, day in touched):
+            return False
+        for currency, day in touched:
+            self._apply([row[:3] for row in conn.execute(
+                "SELECT currency, substr(timestamp, 1, 10) AS day, rate, MAX(timestamp) "
+                "FROM twd_exchange_rates WHERE currency = ? AND timestamp >= ? GROUP BY day",
+                (currency, day)
+            )])
+        return True
+
+    def update(self) -> bool:
+        """Catch up with committed rows; returns True when anything changed"""
+        with self._lock:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            try:
+                # One snapshot for the watermark and the rows it covers
+                conn.execute("BEGIN")
+                max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM twd_exchange_rates").fetchone()[0]
+                generation = maintenance.history_generation(conn)
+                if max_id == self.last_id and generation == self.generation:
+                    return False
+                started = time.perf_counter()
+                if self.last_id is None or max_id < self.last_id or generation != self.generation \
+                        or not self._load_recent(conn, self.last_id):
+                    self._load_all(conn)
+                self.last_id, self.generation = max_id, generation
+                self._filled = None
+                metrics.DB_OPERATION_SECONDS.observe(time.perf_counter() - started, operation='rate_matrix')
+                return True
+            finally:
+                conn.close()
+
+    def aligned(self, currencies: Sequence[str], start: date, end: date) -> "np.ndarray":
+        """Forward-filled closes for ``currencies`` on every day in [start, end]; NaN before any rate"""
+        import numpy as np
+
+        with self._lock:
+            if self._filled is None:
+                self._filled = _ffill(self.closes)
+            filled = self._filled
+            offset = start.toordinal() - self.first_day.toordinal()
+            length = end.toordinal() - start.toordinal() + 1
+            out = np.full((length, len(currencies)), np.nan)
+            # Rows of the requested range that fall inside the loaded grid
+            src_lo, src_hi = max(offset, 0), min(offset + length, len(filled))
+            for j, currency in enumerate(currencies):
+                if currency not in self.currencies:
+                    continue
+                column = filled[:, self.currencies.index(currency)]
+                if src_hi > src_lo:
+                    out[src_lo - offset:src_hi - offset, j] = column[src_lo:src_hi]
+                if offset + length > len(filled) and len(filled):
+                    # Days after the newest row keep its close
+                    out[max(len(filled) - offset, 0):, j] = column[-1]
+            return out
+
+
+_MATRICES: Dict[str, RateMatrix] = {}
+_MATRICES_LOCK = threading.Lock()
+
+
+def rate_matrix(db_file: str) -> RateMatrix:
+    """The shared, up-to-date rate matrix of a database"""
+    key = os.path.abspath(db_file)
+    with _MATRICES_LOCK:
+        matrix = _MATRICES.get(key)
+        if matrix is None:
+            matrix = _MATRICES[key] = RateMatrix(db_file)
+    matrix.update()
+    return matrix
+
+
+def _ledger(txs: Sequence[Dict]) -> List[Tuple[float, float]]:
+    """(cost change, realized P&L) of each transaction under the average cost method"""
+    positions: Dict[str, Tuple[float, float]] = {}
+    ledger = []
+    for tx in txs:
+        quantity, basis = positions.get(tx["currency"], (0.0, 0.0))
+        if tx["quantity"] > 0:
+            cost = tx["quantity"] * tx["rate"] + tx["fee"]
+            realized = 0.0
+            quantity, basis = quantity + tx["quantity"], basis + cost
+        else:
+            sold = min(-tx["quantity"], quantity)
+            released = basis * sold / quantity if quantity else 0.0
+            cost = -released
+            realized = sold * tx["rate"] - released - tx["fee"]
+            quantity, basis = quantity - sold, basis - released
+        positions[tx["currency"]] = (quantity, basis)
+        ledger.append((cost, realized))
+    return ledger
+
+
+def valuation(db_file: str, portfolio_id: int, start: Optional[date] = None,
+              end: Optional[date] = None) -> "pd.DataFrame":
+    """Daily TWD valuation of a portfolio
+
+    Columns: ``value``, ``cost``, ``unrealized``, ``realized`` (cumulative)
+    and ``pnl``, plus ``value_<CUR>`` per currency. The range defaults to
+    the first transaction through today.
+    """
+    import numpy as np
+    import pandas as pd
+
+    txs = transactions(db_file, portfolio_id)
+    if not txs:
+        return pd.DataFrame(columns=["value", "cost", "unrealized", "realized", "pnl"])
+    started = time.perf_counter()
+    currencies = sorted({tx["currency"] for tx in txs})
+    first = date.fromisoformat(txs[0]["timestamp"][:10])
+    start = start or first
+    end = end or date.today()
+    days = end.toordinal() - start.toordinal() + 1
+
+    # Transaction deltas binned by day; anything before the range lands on its first day
+    day_index = np.clip([date.fromisoformat(tx["timestamp"][:10]).toordinal() - start.toordinal() for tx in txs],
+                        0, days)
+    column = np.array([currencies.index(tx["currency"]) for tx in txs])
+    ledger = np.array(_ledger(txs))
+    inside = day_index < days
+    quantity = np.zeros((days, len(currencies)))
+    cost = np.zeros((days, len(currencies)))
+    realized = np.zeros(days)
+    np.add.at(quantity, (day_index[inside], column[inside]), np.array([tx["quantity"] for tx in txs])[inside])
+    np.add.at(cost, (day_index[inside], column[inside]), ledger[inside, 0])
+    np.add.at(realized, day_index[inside], ledger[inside, 1])
+    holdings = np.cumsum(quantity, axis=0)
+    basis = np.cumsum(cost, axis=0)
+
+    # Stored closes, falling back to the traded rates where no rate is stored yet
+    rates = rate_matrix(db_file).aligned(currencies, start, end)
+    traded = np.full((days, len(currencies)), np.nan)
+    traded[day_index[inside], column[inside]] = np.array([tx["rate"] for tx in txs])[inside]
+    traded = _ffill(traded)
+    rates = np.where(np.isnan(rates), traded, rates)
+    rates = np.nan_to_num(rates)
+
+    values = holdings * rates
+    frame = pd.DataFrame({
+        "value": np.einsum("dc,dc->d", holdings, rates),
+        "cost": basis.sum(axis=1),
+    }, index=pd.date_range(start, periods=days, freq="D", name="date"))
+    frame["unrealized"] = frame["value"] - frame["cost"]
+    frame["realized"] = np.cumsum(realized)
+    frame["pnl"] = frame["unrealized"] + frame["realized"]
+    for j, currency in enumerate(currencies):
+        frame[f"value_{currency}"] = values[:, j]
+    metrics.DB_OPERATION_SECONDS.observe(time.perf_counter() - started, operation='portfolio_valuation')
+    return frame
+
+
+def positions(db_file: str, portfolio_id: int) -> List[Dict]:
+    """Current position per currency: quantity, average cost, rate, value and P&L"""
+    txs = transactions(db_file, portfolio_id)
+    if not txs:
+        return []
+    ledger = _ledger(txs)
+    summary: Dict[str, Dict] = {}
+    for tx, (cost, realized) in zip(txs, ledger):
+        entry = summary.setdefault(tx["currency"], {"currency": tx["currency"], "quantity": 0.0, "cost": 0.0,
+                                                    "realized": 0.0, "last_trade_rate": tx["rate"]})
+        entry["quantity"] += tx["quantity"]
+        entry["cost"] += cost
+        entry["realized"] += realized
+        entry["last_trade_rate"] = tx["rate"]
+    currencies = sorted(summary)
+    today = date.today()
+    latest = rate_matrix(db_file).aligned(currencies, today, today)[0]
+    result = []
+    for currency, rate in zip(currencies, latest):
+        entry = summary[currency]
+        # Currencies without stored rates are valued at their last traded rate
+        fallback = entry.pop("last_trade_rate")
+        entry["rate"] = fallback if math.isnan(rate) else float(rate)
+        entry["avg_cost"] = entry["cost"] / entry["quantity"] if entry["quantity"] > 1e-12 else 0.0
+        entry["value"] = entry["quantity"] * entry["rate"]
+        entry["unrealized"] = entry["value"] - entry["cost"]
+        result.append(entry)
+    return result
@@ -0,0 +1,159 @@
+"""Query-result cache for history reads, invalidated by per-currency write versions.
+
+Reads such as ``get_historical_data`` used to hit SQLite on every call,
+even when nothing had been written since the last identical query. Results
+are now kept in a bounded LRU keyed on what was asked (kind, currency set,
+day range, resolution or base) and stamped with the write versions of the
+currencies involved. A hit needs the stamp to still match; anything else is
+recomputed and replaces the entry.
+
+:class:`WriteVersions` keeps those versions for one database. It holds one
+read-only connection and polls ``PRAGMA data_version``, which changes only
+when another connection commits, so an unchanged database costs one pragma
+per lookup. When it changes, the rows added since the last seen id bump the
+versions of their currencies only, so a snapshot of USD does not evict
+cached EUR queries. A rewrite recorded by maintenance.mark_history_rewritten,
+fewer rows than before or a replaced database file bump every currency.
+
+TRACKER_QUERY_CACHE_SIZE sets the number of entries per database (default
+256); 0 turns the cache off.
+"""
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+import maintenance
+import metrics
+
+DEFAULT_SIZE = 256
+
+
+def size_from_env() -> int:
+    """TRACKER_QUERY_CACHE_SIZE: cached results per database (0 disables the cache)"""
+    try:
+        return max(int(os.environ.get("TRACKER_QUERY_CACHE_SIZE", DEFAULT_SIZE)), 0)
+    except ValueError:
+        return DEFAULT_SIZE
+
+
+class WriteVersions:
+    """Monotonic write version per currency of one database"""
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self.epoch = 0
+        self._versions: Dict[str, int] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._file: Optional[Tuple[int, int]] = None
+        self._data_version: Optional[int] = None
+        self._last_id = 0
+        self._generation: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True, check_same_thread=False)
+        stat = os.stat(self.db_file)
+        self._file = (stat.st_dev, stat.st_ino)
+        self._data_version = None
+
+    def _bump_all(self):
+        self.epoch += 1
+        self._versions.clear()
+
+    def refresh(self):
+        """Bump the versions of currencies written since the last call"""
+        with self._lock:
+            try:
+                stat = os.stat(self.db_file)
+                if self._conn is None or (stat.st_dev, stat.st_ino) != self._file:
+                    self._open()
+                    self._bump_all()
+                data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                if data_version == self._data_version:
+                    return
+                self._conn.execute("BEGIN")
+                try:
+                    max_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM twd_exchange_rates").fetchone()[0]
+                    generation = maintenance.history_generation(self._conn)
+                    if self._data_version is None:
+                        # Freshly opened: the epoch bump already invalidated everything
+                        pass
+                    elif generation != self._generation or max_id < self._last_id:
+                        self._bump_all()
+                    else:
+                        for (currency,) in self._conn.execute(
+                            # +currency keeps SQLite on the rowid range instead of scanning the currency index
+                            "SELECT DISTINCT +currency FROM twd_exchange_rates WHERE id > ?", (self._last_id,)
+                        ):
+                            self._versions[currency] = self._versions.get(currency, 0) + 1
+                finally:
+                    self._conn.execute("COMMIT")
+                self._data_version, self._last_id, self._generation = data_version, max_id, generation
+            except (OSError, sqlite3.Error):
+                # No database yet, or it is being replaced: nothing cached stays valid
+                if self._conn is not None:
+                    self._conn.close()
+                self._conn = None
+                self._bump_all()
+
+    def stamp(self, currencies: Iterable[str]) -> Tuple[int, ...]:
+        """Versions of ``currencies`` (after the database epoch); changes whenever one of them is written"""
+        with self._lock:
+            return (self.epoch, *(self._versions.get(currency, 0) for currency in currencies))
+
+
+class QueryCache:
+    """LRU of query results, each valid while its currencies' write versions are unchanged"""
+
+    def __init__(self, db_file: str, size: int = DEFAULT_SIZE):
+        self.size = size
+        self.versions = WriteVersions(db_file)
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[int, ...], object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, currencies: Iterable[str], compute: Callable[[], object]):
+        """The cached result of ``key`` if none of ``currencies`` was written since, else ``compute()``"""
+        if self.size <= 0:
+            return compute()
+        currencies = tuple(currencies)
+        self.versions.refresh()
+        stamp = self.versions.stamp(currencies)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                metrics.record_cache('query', True)
+                return entry[1]
+        metrics.record_cache('query', False)
+        value = compute()
+        with self._lock:
+            self._entries[key] = (stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_CACHES: Dict[str, QueryCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def shared(db_file: str) -> QueryCache:
+    """The process-wide query cache of a database"""
+    key = os.path.abspath(db_file)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = _CACHES[key] = QueryCache(db_file, size_from_env())
+    return cache
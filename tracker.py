@@ -0,0 +1,772 @@
+"""Data layer of the TWD exchange rate tracker: upstream fetches and SQLite history.
+
+This module deliberately imports no Streamlit or Plotly, and loads requests,
+pandas and NumPy only inside the methods that need them, so the collector
+CLI starts quickly. The dashboard lives in currency_tracker.py.
+"""
+import logging
+import math
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import alerts
+import analytics
+import crosses
+import currencies
+import indicators
+import metrics
+import trading_volume
+from column_store import ColumnStore
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from history_cache import HistoryCache
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_SQL = '''
+    CREATE TABLE IF NOT EXISTS twd_exchange_rates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        currency TEXT,
+        rate REAL,
+        volume REAL DEFAULT 0,
+        timestamp DATETIME,
+        UNIQUE(currency, timestamp)
+    )
+'''
+
+# Look-back of each volume ranking period, in days
+VOLUME_PERIOD_DAYS = {
+    'today': 1,
+    '7_days': 7,
+    '14_days': 14,
+    '1_month': 30
+}
+
+# Typical daily volatility per currency, used for simulated history and uncalibrated forecasts
+DAILY_VOLATILITY = currencies.volatilities()
+DEFAULT_DAILY_VOLATILITY = currencies.DEFAULT_DAILY_VOLATILITY
+# Base daily trading volume per currency, in millions of TWD
+BASE_VOLUMES = currencies.base_volumes()
+
+
+def log_notice(level: str, message: str):
+    """Default notify hook: send tracker status messages to logging"""
+    logger.log(logging.WARNING if level in ("warning", "error") else logging.INFO, message)
+
+
+class TWDCurrencyTracker:
+    def __init__(self, notify: Optional[Callable[[str, str], None]] = None):
+        # notify(level, message) surfaces status messages; the dashboard routes
+        # them to st.info/st.success/st.warning, the CLI to logging
+        self.notify = notify or log_notice
+        self.base_currency = "TWD"
+        self.db_file = os.environ.get("TRACKER_DB_FILE", "twd_currency_data.db")
+        self.init_database()
+        metrics.DB_ROWS.set_callback(self.count_rows)
+        # Optional memory-mapped copy of the history for fast reads (TRACKER_COLUMN_STORE)
+        self.column_store = ColumnStore.from_env(self.db_file)
+        # Shared compact copy of the whole history, on unless TRACKER_HISTORY_CACHE=0;
+        # history_cache imports maintenance, which imports this module
+        import history_cache
+        import query_cache
+        self.use_history_cache = history_cache.enabled()
+        # Results of repeated reads, kept until a write touches their currencies (TRACKER_QUERY_CACHE_SIZE)
+        self.query_cache = query_cache.shared(self.db_file)
+        # Aggregates for the statistics views (TRACKER_ANALYTICS_BACKEND)
+        self.analytics = analytics.backend_from_env(self)
+        # Rate alerts are checked against every saved snapshot
+        self.alert_engine = alerts.AlertEngine(
+            self.db_file, [alerts.notify_sink(self.notify), *alerts.sinks_from_env()]
+        )
+        
+        # Tracked currencies from the registry (TRACKER_CURRENCIES), by default the 23 most traded
+        self.popular_currencies = currencies.tracked()
+        self._tracked = frozenset(self.popular_currencies)
+        
+        # Currency names for better display, for every currency in the registry
+        self.currency_names = currencies.names()
+        
+        # Approximate TWD rates (how much TWD you get for 1 unit of foreign currency)
+        # Every registry currency has one, so any pair can be simulated
+        self.reference_rates = currencies.twd_rates()
+        self.base_rates = {currency: self.reference_rates[currency] for currency in self.popular_currencies}
+        
+        # Upstream APIs returning USD-based rates, tried in order.
+        # TRACKER_RATE_APIS (comma separated) overrides them, e.g. for a local stub.
+        default_apis = [
+            'https://api.exchangerate.host/latest?base=USD',
+            'https://api.fxratesapi.com/latest?base=USD'
+        ]
+        env_apis = os.environ.get("TRACKER_RATE_APIS", "")
+        self.api_urls = [url.strip() for url in env_apis.split(",") if url.strip()] or default_apis
+
+    def init_database(self):
+        """Initialize SQLite database for storing historical data"""
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        
+        # New databases free space incrementally after compaction (see maintenance.py);
+        # this is a no-op for files that already contain tables
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        
+        # WAL lets sessions keep reading and writing while online backups copy the file
+        try:
+            cursor.execute("PRAGMA journal_mode = WAL")
+        except sqlite3.OperationalError:
+            # Another connection holds a lock; the mode is persistent, retried next start
+            pass
+        
+        # Create table with new structure
+        cursor.execute(SCHEMA_SQL)
+        
+        # Check if volume column exists, if not add it
+        cursor.execute("PRAGMA table_info(twd_exchange_rates)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'volume' not in columns:
+            try:
+                cursor.execute('ALTER TABLE twd_exchange_rates ADD COLUMN volume REAL DEFAULT 0')
+                self.notify("info", "資料庫已升級，新增交易量欄位 / Database upgraded with volume column")
+            except sqlite3.Error as e:
+                # If ALTER TABLE fails, create a backup and recreate table
+                try:
+                    # Backup existing data
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS twd_exchange_rates_backup AS 
+                        SELECT * FROM twd_exchange_rates
+                    ''')
+                    
+                    # Drop old table
+                    cursor.execute('DROP TABLE IF EXISTS twd_exchange_rates')
+                    
+                    # Create new table with volume column
+                    cursor.execute('''
+                        CREATE TABLE twd_exchange_rates (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            currency TEXT,
+                            rate REAL,
+                            volume REAL DEFAULT 0,
+                            timestamp DATETIME,
+                            UNIQUE(currency, timestamp)
+                        )
+                    ''')
+                    
+                    # Restore data with default volume
+                    cursor.execute('''
+                        INSERT INTO twd_exchange_rates (currency, rate, volume, timestamp)
+                        SELECT currency, rate, 0, timestamp FROM twd_exchange_rates_backup
+                    ''')
+                    
+                    # Drop backup table
+                    cursor.execute('DROP TABLE IF EXISTS twd_exchange_rates_backup')
+                    
+                    self.notify("success", "資料庫結構已重建並保留歷史數據 / Database structure rebuilt with historical data preserved")
+                    
+                except sqlite3.Error as backup_error:
+                    self.notify("warning", f"資料庫升級失敗，使用新結構 / Database upgrade failed, using new structure: {backup_error}")
+        
+        conn.commit()
+        conn.close()
+
+    def get_current_rates(self) -> Optional[Dict]:
+        """Fetch current exchange rates with TWD as base currency"""
+        import requests
+        
+        try:
+            # Try to get USD to other currencies first, then convert to TWD base
+            for api_url in self.api_urls:
+                source = urlparse(api_url).hostname
+                start = time.perf_counter()
+                try:
+                    try:
+                        response = requests.get(api_url, timeout=10)
+                    finally:
+                        metrics.UPSTREAM_FETCH_SECONDS.observe(time.perf_counter() - start, source=source)
+                    if response.status_code == 200:
+                        data = response.json()
+                        usd_rates = data.get('rates', {})
+                        
+                        if 'TWD' in usd_rates:
+                            return self.usd_to_twd_rates(usd_rates)
+                        metrics.UPSTREAM_FETCH_FAILURES.inc(source=source, reason='missing_twd')
+                    else:
+                        metrics.UPSTREAM_FETCH_FAILURES.inc(source=source, reason=f'http_{response.status_code}')
+                            
+                except ValueError:
+                    # Includes requests' JSONDecodeError for malformed bodies
+                    metrics.UPSTREAM_FETCH_FAILURES.inc(source=source, reason='invalid_response')
+                    continue
+                except requests.exceptions.RequestException:
+                    metrics.UPSTREAM_FETCH_FAILURES.inc(source=source, reason='network')
+                    continue
+                except Exception:
+                    metrics.UPSTREAM_FETCH_FAILURES.inc(source=source, reason='invalid_response')
+                    continue
+        except Exception:
+            pass
+        
+        # If all APIs fail, return rates based on base_rates with some variation
+        metrics.SIMULATED_FALLBACKS.inc(kind='current_rates')
+        self.notify("warning", "API 連接失敗，使用模擬數據 / API connection failed, using simulated data")
+        return self._get_simulated_rates()
+
+    def usd_to_twd_rates(self, usd_rates: Dict) -> Dict:
+        """Convert an upstream units-per-USD table (which must include TWD) to TWD base
+        
+        Every quoted currency is kept, tracked or not, so conversions can use
+        any of them; only tracked currencies are saved.
+        """
+        twd_usd_rate = usd_rates['TWD']  # How much TWD for 1 USD
+        
+        # TWD per unit of foreign currency = (TWD per USD) / (foreign currency per USD)
+        twd_rates = {
+            currency: twd_usd_rate / usd_rate
+            for currency, usd_rate in usd_rates.items()
+            if currency != 'TWD' and isinstance(usd_rate, (int, float)) and usd_rate > 0
+        }
+        twd_rates['USD'] = twd_usd_rate
+        
+        return twd_rates
+
+    def tracked_twd_rates(self, twd_rates: Dict) -> Dict:
+        """The part of a TWD rate table that is stored: tracked currencies only"""
+        return {currency: rate for currency, rate in twd_rates.items() if currency in self._tracked}
+
+    def _get_simulated_rates(self) -> Dict:
+        """Generate simulated rates based on realistic TWD exchange rates"""
+        simulated_rates = {}
+        for currency, base_rate in self.base_rates.items():
+            # Add small random variation (-3% to +3%)
+            variation = random.uniform(-0.03, 0.03)
+            simulated_rates[currency] = base_rate * (1 + variation)
+        
+        return simulated_rates
+
+    def save_rates_to_db(self, rates: Dict, volumes: Dict = None):
+        """Save current rates and volumes to database"""
+        if not rates:
+            return
+            
+        start = time.perf_counter()
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        
+        # Check if volume column exists
+        cursor.execute("PRAGMA table_info(twd_exchange_rates)")
+        columns = [column[1] for column in cursor.fetchall()]
+        has_volume = 'volume' in columns
+        
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        # Take the write lock up front so time spent waiting on other sessions
+        # is measured separately from the inserts themselves
+        lock_start = time.perf_counter()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            # Another session held the lock past the busy timeout; skip this snapshot
+            metrics.DB_LOCK_WAIT_SECONDS.observe(time.perf_counter() - lock_start)
+            metrics.DB_LOCK_TIMEOUTS.inc()
+            conn.close()
+            return
+        metrics.DB_LOCK_WAIT_SECONDS.observe(time.perf_counter() - lock_start)
+        
+        # One batched insert per snapshot, whatever the number of tracked currencies
+        saved = self.tracked_twd_rates(rates)
+        try:
+            if has_volume:
+                if volumes:
+                    snapshot_volumes = [volumes.get(currency, 0) for currency in saved]
+                else:
+                    # Simulated volumes for the whole snapshot in one draw
+                    snapshot_volumes = trading_volume.synthesize(
+                        [self._get_base_volume(currency) for currency in saved], datetime.now().hour
+                    ).tolist()
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO twd_exchange_rates (currency, rate, volume, timestamp) VALUES (?, ?, ?, ?)",
+                    [(currency, rate, volume, timestamp)
+                     for (currency, rate), volume in zip(saved.items(), snapshot_volumes)]
+                )
+            else:
+                # Fallback for old database structure
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO twd_exchange_rates (currency, rate, timestamp) VALUES (?, ?, ?)",
+                    [(currency, rate, timestamp) for currency, rate in saved.items()]
+                )
+        except sqlite3.Error as e:
+            conn.rollback()
+            conn.close()
+            logger.warning("Could not save snapshot: %s", e)
+            return
+        
+        conn.commit()
+        conn.close()
+        metrics.DB_OPERATION_SECONDS.observe(time.perf_counter() - start, operation='insert')
+        
+        if self.column_store is not None:
+            self.column_store.sync()
+        
+        try:
+            self.alert_engine.evaluate(saved, timestamp)
+        except sqlite3.Error as e:
+            # The snapshot is stored; its crossings are caught up on the next one
+            logger.warning("Alert evaluation failed: %s", e)
+
+    def count_rows(self) -> Optional[int]:
+        """Count rows in twd_exchange_rates (used by the metrics exporter)"""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            try:
+                return conn.execute("SELECT COUNT(*) FROM twd_exchange_rates").fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+
+    def generate_historical_data(self, currency: str, days: int) -> "pd.DataFrame":
+        """Generate realistic historical data with rates and volumes based on current rates and market patterns"""
+        import numpy as np
+        import pandas as pd
+        
+        if currency not in self.reference_rates:
+            return pd.DataFrame()
+        
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        
+        # Generate date range
+        date_range = pd.date_range(start=start_date, end=end_date, freq='D')
+        
+        # Base rate and volume for this currency
+        base_rate = self.reference_rates[currency]
+        base_volume = self._get_base_volume(currency)
+        
+        # Generate realistic price movements
+        rates = []
+        changes = []
+        current_rate = base_rate
+        
+        # Different volatility for different currencies
+        volatility = DAILY_VOLATILITY.get(currency, DEFAULT_DAILY_VOLATILITY)
+        
+        # Generate realistic price walk; only the clipped compounding needs the loop
+        random_changes = np.random.normal(0, volatility, len(date_range)).tolist()
+        for i, random_change in enumerate(random_changes):
+            # Price movement
+            trend = math.sin(i * 2 * math.pi / 365) * 0.001  # Annual cycle
+            mean_reversion = (base_rate - current_rate) * 0.001  # Mean reversion
+            
+            change = random_change + trend + mean_reversion
+            current_rate = current_rate * (1 + change)
+            
+            # Ensure rate doesn't go negative or too extreme
+            current_rate = max(current_rate, base_rate * 0.5)
+            current_rate = min(current_rate, base_rate * 2.0)
+            
+            rates.append(current_rate)
+            changes.append(change)
+        
+        # Volume rises with the size of the move and drops at weekends, drawn for all days at once
+        volumes = trading_volume.daily(base_volume, changes, date_range.weekday)
+        
+        # Create DataFrame
+        df = pd.DataFrame({
+            'timestamp': date_range,
+            'rate': rates,
+            'volume': volumes
+        })
+        
+        df.set_index('timestamp', inplace=True)
+        return df
+
+    def _get_base_volume(self, currency: str) -> float:
+        """Get base trading volume for a currency (millions of TWD equivalent)"""
+        return BASE_VOLUMES.get(currency, currencies.DEFAULT_BASE_VOLUME)
+
+    def _history_cache(self) -> Optional["HistoryCache"]:
+        """The shared, up-to-date history cache, or None when it is turned off"""
+        if not self.use_history_cache:
+            return None
+        import history_cache
+        return history_cache.shared(self.db_file)
+
+    def get_historical_data(self, currency: str, days: int) -> "pd.DataFrame":
+        """Get historical data with rates and volumes (generated if not in database)
+        
+        Served from the query cache until ``currency`` is written again.
+        """
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        df = self.query_cache.get(
+            ('history', currency, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")),
+            [currency],
+            lambda: self._read_historical_data(currency, days, start_date, end_date)
+        )
+        # Callers may add or fill columns; copy-on-write keeps that off the cached frame
+        return df.copy(deep=False)
+
+    def _read_historical_data(self, currency: str, days: int, start_date: datetime, end_date: datetime
+                              ) -> "pd.DataFrame":
+        """get_historical_data without the query cache"""
+        df = None
+        cache = self._history_cache()
+        if cache is not None:
+            # Whole-day bounds with the end day excluded, like the SQL string comparison
+            df = cache.frame(
+                currency,
+                start_date.replace(hour=0, minute=0, second=0, microsecond=0),
+                end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            )
+        elif self.column_store is not None:
+            # Whole-day bounds with the end day excluded, like the SQL string comparison
+            df = self.column_store.frame(
+                currency,
+                start_date.replace(hour=0, minute=0, second=0, microsecond=0),
+                end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            )
+        if df is None:
+            df = self._query_history(currency, start_date, end_date)
+            if df is None:
+                # If query fails, generate historical data
+                metrics.SIMULATED_FALLBACKS.inc(kind='history')
+                return self.generate_historical_data(currency, days)
+        
+        if not df.empty:
+            # Simulate missing volumes (or the whole column) at each row's hour, in one array call
+            if 'volume' not in df.columns:
+                df['volume'] = trading_volume.synthesize(self._get_base_volume(currency), df.index.hour)
+            elif df['volume'].isnull().any():
+                df['volume'] = trading_volume.fill(df['volume'].to_numpy(), self._get_base_volume(currency),
+                                                   df.index.hour)
+        else:
+            # Generate historical data if not in database
+            metrics.SIMULATED_FALLBACKS.inc(kind='history')
+            df = self.generate_historical_data(currency, days)
+        
+        return df
+
+    def _query_history(self, currency: str, start_date: datetime, end_date: datetime) -> Optional["pd.DataFrame"]:
+        """Read one currency's rows from SQLite, indexed by timestamp; None if the query fails"""
+        import pandas as pd
+        
+        conn = sqlite3.connect(self.db_file)
+        
+        # First check if volume column exists
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info(twd_exchange_rates)")
+        columns = [column[1] for column in cursor.fetchall()]
+        has_volume = 'volume' in columns
+        
+        if has_volume:
+            query = """
+                SELECT timestamp, rate, volume 
+                FROM twd_exchange_rates 
+                WHERE currency = ? 
+                AND timestamp >= ? 
+                AND timestamp <= ?
+                ORDER BY timestamp
+            """
+        else:
+            query = """
+                SELECT timestamp, rate 
+                FROM twd_exchange_rates 
+                WHERE currency = ? 
+                AND timestamp >= ? 
+                AND timestamp <= ?
+                ORDER BY timestamp
+            """
+        
+        try:
+            with metrics.DB_OPERATION_SECONDS.time(operation='query'):
+                df = pd.read_sql_query(
+                    query, 
+                    conn, 
+                    params=(currency, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+                )
+        except Exception:
+            return None
+        finally:
+            conn.close()
+        
+        if not df.empty:
+            df['timestamp'] = pd.to_datetime(df['timestamp'])
+            df = df.set_index('timestamp')
+        return df
+
+    def _query_rates(self, currencies: List[str], start_date: datetime, end_date: datetime
+                     ) -> Optional["pd.DataFrame"]:
+        """Rates of several currencies from one query, as a timestamp x currency frame with gaps as NaN"""
+        wide = self.query_cache.get(
+            ('rates', tuple(currencies), start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")),
+            currencies,
+            lambda: self._read_rates(currencies, start_date, end_date)
+        )
+        return None if wide is None else wide.copy(deep=False)
+
+    def _read_rates(self, currencies: List[str], start_date: datetime, end_date: datetime
+                    ) -> Optional["pd.DataFrame"]:
+        """_query_rates without the query cache"""
+        import pandas as pd
+        
+        cache = self._history_cache()
+        if cache is not None:
+            return cache.wide(
+                currencies,
+                start_date.replace(hour=0, minute=0, second=0, microsecond=0),
+                end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            )
+        if self.column_store is not None:
+            # Whole-day bounds with the end day excluded, like the SQL string comparison
+            frames = {}
+            for currency in currencies:
+                df = self.column_store.frame(
+                    currency,
+                    start_date.replace(hour=0, minute=0, second=0, microsecond=0),
+                    end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+                )
+                if df is not None and not df.empty:
+                    frames[currency] = df['rate']
+            if frames:
+                return pd.DataFrame(frames).sort_index()
+        
+        conn = sqlite3.connect(self.db_file)
+        try:
+            with metrics.DB_OPERATION_SECONDS.time(operation='query'):
+                df = pd.read_sql_query(
+                    f"""
+                        SELECT timestamp, currency, rate
+                        FROM twd_exchange_rates
+                        WHERE currency IN ({','.join('?' * len(currencies))})
+                        AND timestamp >= ?
+                        AND timestamp <= ?
+                    """,
+                    conn,
+                    params=(*currencies, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+                )
+        except Exception:
+            return None
+        finally:
+            conn.close()
+        
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        return df.pivot(index='timestamp', columns='currency', values='rate').sort_index()
+
+    def _rates_frame(self, currencies: List[str], days: int) -> "pd.DataFrame":
+        """TWD rates of ``currencies`` (TWD itself left out) on the union of their timestamps, NaN between ticks
+        
+        Stored series come from one query; currencies without stored rows
+        use get_historical_data, like the single-currency charts.
+        """
+        import pandas as pd
+        
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        currencies = [c for c in dict.fromkeys(currencies) if c != crosses.HOME_CURRENCY]
+        wide = (self._query_rates(currencies, start_date, end_date) if currencies else None)
+        if wide is None:
+            wide = pd.DataFrame()
+        for currency in currencies:
+            if currency not in wide.columns or wide[currency].isna().all():
+                history = self.get_historical_data(currency, days)
+                if history.empty:
+                    continue
+                wide = wide.drop(columns=currency, errors='ignore').join(history['rate'].rename(currency), how='outer')
+        return wide.sort_index()
+
+    def _aligned_rates(self, currencies: List[str], days: int) -> "pd.DataFrame":
+        """_rates_frame with each rate carried forward to the later timestamps"""
+        return self._rates_frame(currencies, days).ffill()
+
+    def get_previous_rates(self, currencies: List[str], base: str = crosses.HOME_CURRENCY) -> Dict[str, float]:
+        """Each currency's rate at its previous tick of the last two days, priced in ``base``
+        
+        One bulk read for all currencies, instead of a history query each;
+        currencies with fewer than two ticks are left out.
+        """
+        wide = self._rates_frame([*currencies, base], 2)
+        previous = {}
+        for currency, column in wide.items():
+            ticks = column.dropna()
+            if len(ticks) > 1:
+                previous[currency] = float(ticks.iloc[-2])
+        rebased = crosses.rebase_rates(previous, base)
+        return {currency: rebased[currency] for currency in currencies if currency in rebased}
+
+    def get_pair_history(self, base: str, quote: str, days: int) -> "pd.DataFrame":
+        """History of ``quote`` per unit of ``base`` (e.g. EUR/USD), as a 'rate' column
+        
+        Both TWD series are aligned by _aligned_rates; the pair is their
+        ratio (crosses.pair) from the first time both exist.
+        """
+        import pandas as pd
+        
+        wide = self._aligned_rates([base, quote], days).dropna()
+        if wide.empty or not all(c in wide.columns for c in (base, quote) if c != crosses.HOME_CURRENCY):
+            return pd.DataFrame(columns=['rate'])
+        return crosses.pair(wide, base, quote).rename('rate').to_frame()
+
+    def get_history_in(self, currency: str, days: int, base: str = crosses.HOME_CURRENCY) -> "pd.DataFrame":
+        """get_historical_data priced in ``base``; other bases keep only the 'rate' column"""
+        if base == crosses.HOME_CURRENCY:
+            return self.get_historical_data(currency, days)
+        return self.get_pair_history(currency, base, days)
+
+    def get_rebased_history(self, currencies: List[str], days: int, base: str) -> "pd.DataFrame":
+        """History of several currencies priced in ``base`` (timestamp x currency), rebased in one division"""
+        wide = self._aligned_rates([*currencies, base], days)
+        if base != crosses.HOME_CURRENCY:
+            if base not in wide.columns:
+                return wide.reindex(columns=list(currencies))
+            wide = wide[wide[base].notna()]
+        return crosses.rebase(wide, base).reindex(columns=list(currencies))
+
+    def get_volume_data(self, currency: str, period: str) -> "pd.DataFrame":
+        """Get volume data for specific periods"""
+        days = VOLUME_PERIOD_DAYS.get(period, 7)
+        return self.get_historical_data(currency, days)
+
+    def get_statistics(self, currencies: List[str], days: int,
+                       base: str = crosses.HOME_CURRENCY) -> Dict[str, Dict]:
+        """calculate_statistics for several currencies over the last ``days`` days
+        
+        The analytics backend answers for currencies with complete stored
+        history; the rest go through get_historical_data as before. Other
+        bases are computed from get_rebased_history and have no volumes.
+        Results are served from the query cache until one of the currencies
+        (or ``base``) is written again.
+        """
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        found = self.query_cache.get(
+            ('statistics', tuple(currencies), start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"), base),
+            [*currencies, base],
+            lambda: self._compute_statistics(currencies, days, base)
+        )
+        # Each caller gets its own dicts to annotate
+        return {currency: dict(stats) for currency, stats in found.items()}
+
+    def _compute_statistics(self, currencies: List[str], days: int, base: str) -> Dict[str, Dict]:
+        """get_statistics without the query cache"""
+        if base != crosses.HOME_CURRENCY:
+            rebased = self.get_rebased_history(currencies, days, base)
+            return {
+                currency: self.calculate_statistics(rebased[currency].dropna().rename('rate').to_frame())
+                for currency in currencies
+            }
+        
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        try:
+            found = self.analytics.statistics(
+                currencies,
+                start_date.replace(hour=0, minute=0, second=0, microsecond=0),
+                end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            )
+        except Exception as e:
+            logger.warning("Analytics backend %s failed: %s", self.analytics.name, e)
+            found = {}
+        
+        results = {}
+        for currency in currencies:
+            if currency not in found:
+                found[currency] = self.calculate_statistics(self.get_historical_data(currency, days))
+            results[currency] = found[currency]
+        return results
+
+    def get_daily_closes(self, currencies: List[str], days: int,
+                         base: str = crosses.HOME_CURRENCY) -> "pd.DataFrame":
+        """Forward-filled daily closes (date x currency) over the last ``days`` days, priced in ``base``
+        
+        Stored history comes from the shared rate matrix; currencies with no
+        stored rate in the range use get_historical_data, like the charts.
+        Other bases rebase the TWD closes in one division.
+        """
+        import pandas as pd
+        
+        if base != crosses.HOME_CURRENCY:
+            twd = [c for c in dict.fromkeys([*currencies, base]) if c != crosses.HOME_CURRENCY]
+            return crosses.rebase(self.get_daily_closes(twd, days), base)[list(currencies)]
+        
+        # portfolio imports maintenance, which imports this module
+        import portfolio
+        
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=days)
+        closes = pd.DataFrame(
+            portfolio.rate_matrix(self.db_file).aligned(currencies, start_date, end_date),
+            index=pd.date_range(start_date, end_date, freq='D', name='date'),
+            columns=list(currencies)
+        )
+        for currency in currencies:
+            if closes[currency].isna().all():
+                df = self.get_historical_data(currency, days)
+                if not df.empty:
+                    daily = df['rate'].resample('D').last()
+                    daily.index = daily.index.normalize()
+                    closes[currency] = daily.reindex(closes.index).ffill()
+        return closes
+
+    def get_indicators(self, currency: str, days: int, specs: List[str],
+                       resolution: str = indicators.DEFAULT_RESOLUTION,
+                       history: Optional["pd.DataFrame"] = None,
+                       base: str = crosses.HOME_CURRENCY) -> "pd.DataFrame":
+        """Indicator columns (see indicators.columns) over the last ``days`` days
+        
+        Stored history is computed once and then updated incrementally, so the
+        values are warmed up on everything before the period. Currencies
+        without stored rows, and other bases than TWD, use ``history``, e.g.
+        the frame already on screen, or get_history_in.
+        """
+        frame = None
+        if base == crosses.HOME_CURRENCY:
+            start_date = (datetime.now() - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+            frame = indicators.engine(self.db_file).frame(currency, specs, resolution, start=start_date)
+        if frame is None or frame.empty:
+            if history is None:
+                history = self.get_history_in(currency, days, base)
+            frame = indicators.compute(history, specs, resolution)
+        return frame
+
+    def calculate_statistics(self, df: "pd.DataFrame") -> Dict:
+        """Calculate statistical metrics for the currency including volume"""
+        if df.empty:
+            return {}
+        
+        current_rate = df['rate'].iloc[-1]
+        previous_rate = df['rate'].iloc[0] if len(df) > 1 else current_rate
+        
+        stats = {
+            'current': current_rate,
+            'change': current_rate - previous_rate,
+            'change_percent': ((current_rate - previous_rate) / previous_rate * 100) if previous_rate != 0 else 0,
+            'min': df['rate'].min(),
+            'max': df['rate'].max(),
+            'mean': df['rate'].mean(),
+            'volatility': df['rate'].std(),
+            'trend': 'up' if current_rate > previous_rate else 'down' if current_rate < previous_rate else 'stable'
+        }
+        
+        # Add volume statistics if volume data exists
+        if 'volume' in df.columns and not df['volume'].isnull().all():
+            current_volume = df['volume'].iloc[-1] if len(df) > 0 else 0
+            previous_volume = df['volume'].iloc[0] if len(df) > 1 else current_volume
+            
+            stats.update({
+                'current_volume': current_volume,
+                'total_volume': df['volume'].sum(),
+                'avg_volume': df['volume'].mean(),
+                'max_volume': df['volume'].max(),
+                'min_volume': df['volume'].min(),
+                'volume_change': current_volume - previous_volume,
+                'volume_change_percent': ((current_volume - previous_volume) / previous_volume * 100) if previous_volume != 0 else 0,
+                'volume_trend': 'up' if current_volume > previous_volume else 'down' if current_volume < previous_volume else 'stable'
+            })
+        
+        return stats